@@ -1,10 +1,10 @@
 import os
+import re
 import anyio
 from typing import Union
+import time
 import logging
 import traceback
-from dotenv import load_dotenv
-from mcp.shared.mqtt import configure_logging
 
 from llama_index.core.workflow import (
     Event,
@@ -15,18 +15,30 @@ from llama_index.core.workflow import (
     Context,
 )
 from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.llms import ChatMessage, MessageRole 
-from llama_index.core.agent.workflow import (AgentWorkflow, AgentStream, ToolCallResult)
-from llama_index.llms.openai_like import OpenAILike
-from llama_index.llms.siliconflow import SiliconFlow
-from llama_index.tools.mcp import BasicMCPClient, McpToolSpec
+from llama_index.core.llms import LLM, ChatMessage, MessageRole
 
-from util import load_system_prompt,load_json_prompt,MQTTMCPClient
+from util import load_system_prompt,load_json_prompt,get_prompt_registry,enrich_vehicle_events,McpToolPool,get_mcp_tool_pool
+from util import report_cache_key,cached_report,store_report,replay_chunks,report_cache_stats,get_report_state_store
+from util import ContextBudget,compact_tools,dumps_compact
+from util import get_tracer,record_llm_call,start_metrics_server
 
-configure_logging(level="INFO")
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+_environment_ready = False
+
+def setup_environment(log_level: str = "INFO"):
+    """
+    Load `.env` and configure logging, once. Called by the entry points rather than at import,
+    so importing this module stays cheap and side-effect free.
+    """
+    global _environment_ready
+    if _environment_ready:
+        return
+    from dotenv import load_dotenv
+    from mcp.shared.mqtt import configure_logging
+    load_dotenv()
+    configure_logging(level=log_level)
+    _environment_ready = True
 
 def cprint(text: str, end: str = "", flush: bool = True):
     WORKFLOW_COLOR = '\033[36m'
@@ -42,8 +54,13 @@ class ReportEvent(Event):
 class DriverBehaviorFlow(Workflow):
     def __init__(
             self,
-            llm: OpenAILike,
+            llm: LLM,
             memory: ChatMemoryBuffer = None,
+            direct_enrichment: bool = False,
+            enrichment_concurrency: int = 8,
+            tool_pool: McpToolPool = None,
+            context_budget: int = None,
+            lang: str = None,
             *args,
             **kwargs):
         if memory is None:
@@ -51,97 +68,215 @@ class DriverBehaviorFlow(Workflow):
         self.memory = memory
         self.client = None
         self.llm = llm
+        # Join events with location and weather by calling the tools directly instead of through the agent
+        self.direct_enrichment = direct_enrichment
+        self.enrichment_concurrency = enrichment_concurrency
+        # MCP sessions and tools are shared by all flows of the process
+        self.tool_pool = tool_pool or get_mcp_tool_pool()
+        # Explicit token budget of the report prompt, below the memory limit so that nothing is dropped silently
+        self.context_budget = context_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "24000"))
+        self.lang = lang or os.getenv("PROMPT_LANG", "zh")
+        # Loads and validates all prompt templates once, so template errors surface here rather than mid-run
+        self.prompts = get_prompt_registry()
         super().__init__(*args, **kwargs)
 
     @step
     async def process_input(self, ctx: Context, ev: StartEvent) -> Union[ReportEvent]:
+        mode = "direct" if self.direct_enrichment else "agent"
+        with get_tracer().span("workflow.process_input", labels={"mode": mode}, vehicle_id=ev.get("vehicle_id")) as span:
+            # Parent of the gen_report span, which runs in another task
+            self.trace_span = span
+            return await self._process_input(ctx, ev)
+
+    async def _process_input(self, ctx: Context, ev: StartEvent) -> ReportEvent:
+        self.started = time.perf_counter()
+        self.budget = ContextBudget(max_tokens=self.context_budget)
+        cold = self.tool_pool.stats()["acquires"] == 0
         self.all_tools = await self.init_mcp_server()
         tools_name = [tool.metadata.name for tool in self.all_tools]
         # # Add event showing available tools
-        ctx.write_event_to_stream(ProgressEvent(msg=f"Available tools: {tools_name}\n\n"))
+        ctx.write_event_to_stream(ProgressEvent(msg=f"Available tools ({'cold' if cold else 'warm'} start, {time.perf_counter() - self.started:.2f}s): {tools_name}\n\n"))
 
-        system_prompt=load_system_prompt(prompt_filename="system.txt", lang="zh").format(ev=ev)
+        system_prompt=load_system_prompt(prompt_filename="system.txt", lang=self.lang).format(ev=ev)
         self.memory.put(ChatMessage(role=MessageRole.SYSTEM,content=system_prompt))
-        
+        self.budget.charge("system", system_prompt)
+        # Keep room for the report prompt of gen_report
+        self.budget.charge("gen_report", load_json_prompt("data_analysis.json", self.lang)["gen_report"])
+
+        if self.direct_enrichment:
+            return await self.enrich_directly(ctx, ev)
+
+        # The agent runtime is only loaded by flows that use it
+        from llama_index.core.agent.workflow import AgentWorkflow, AgentStream, ToolCallResult
         query_info = AgentWorkflow.from_tools_or_functions(
-            tools_or_functions=self.all_tools,
+            tools_or_functions=compact_tools(self.all_tools, self.budget),
             llm=self.llm,
             system_prompt=system_prompt,
             verbose=False,
             timeout=180,
             )
         
-        json_prompts = load_json_prompt("data_analysis.json", "zh")
+        json_prompts = load_json_prompt("data_analysis.json", self.lang)
         user_prompt = json_prompts["enrich_data"].format(ev=ev)
         self.memory.put(ChatMessage(role=MessageRole.USER,content=user_prompt))
+        self.budget.charge("process_input", user_prompt)
 
-        handler = query_info.run(user_msg=f'{user_prompt}. \n\n')
-
-        response = ""
-        async for event in handler.stream_events():
-            if isinstance(event, AgentStream):
-                cprint(event.delta, end="", flush=True)
-                # ctx.write_event_to_stream(ProgressEvent(msg=event.delta))
-                response += event.delta
-            elif isinstance(event, ToolCallResult):
-                ctx.write_event_to_stream(ProgressEvent(msg=f'{event.tool_name}: {event.tool_kwargs}\n\n'))
-                ctx.write_event_to_stream(ProgressEvent(msg=f'{event.tool_output}\n'))
+        parts = []
+        first_tool_call = None
+        with get_tracer().span("llm.agent", labels={"model": self.model_name()}) as span:
+            handler = query_info.run(user_msg=f'{user_prompt}. \n\n')
+            first_token, tool_calls = None, 0
+            async for event in handler.stream_events():
+                if isinstance(event, AgentStream):
+                    if first_token is None and event.delta:
+                        first_token = time.perf_counter() - span.started
+                    # Consumers print or forward the tokens; the workflow never writes to stdout
+                    ctx.write_event_to_stream(ProgressEvent(msg=event.delta))
+                    parts.append(event.delta)
+                elif isinstance(event, ToolCallResult):
+                    tool_calls += 1
+                    if first_tool_call is None:
+                        first_tool_call = time.perf_counter() - self.started
+                        ctx.write_event_to_stream(ProgressEvent(msg=f"Time to first tool call: {first_tool_call:.2f}s\n\n"))
+                    ctx.write_event_to_stream(ProgressEvent(msg=f'{event.tool_name}: {event.tool_kwargs}\n\n'))
+                    ctx.write_event_to_stream(ProgressEvent(msg=f'{event.tool_output}\n'))
+            span.set(tool_calls=tool_calls, first_tool_call_sec=round(first_tool_call, 4) if first_tool_call else None)
+            response = "".join(parts)
+            record_llm_call(span, first_token, None, self.budget.count(response), self.model_name())
 
+        response = self.budget.truncate_text(response, self.budget.remaining())
         self.memory.put(ChatMessage(role=MessageRole.ASSISTANT,content=response))
+        self.budget.charge("process_input", response)
+        ctx.write_event_to_stream(ProgressEvent(msg=f"Context tokens: {self.budget.stats()}\n\n"))
+        return ReportEvent(msg=response)
+
+    async def enrich_directly(self, ctx: Context, ev: StartEvent) -> ReportEvent:
+        vehicle_id = ev.get("vehicle_id") or parse_vehicle_id(ev.user_input)
+        ctx.write_event_to_stream(ProgressEvent(msg=f"Enriching driving behaviour data of vehicle {vehicle_id}\n\n"))
+        enriched = await enrich_vehicle_events(
+            {tool.metadata.name: tool for tool in self.all_tools},
+            vehicle_id,
+            start=ev.get("start"),
+            end=ev.get("end"),
+            max_concurrency=self.enrichment_concurrency,
+            # Reports over the whole history only enrich the events added since the previous report
+            state_store=get_report_state_store(),
+        )
+        incremental = enriched.pop("incremental", None)
+        if incremental is not None:
+            ctx.write_event_to_stream(ProgressEvent(msg=f"Incremental enrichment: {incremental['new_events']} new events since {incremental['since'] or 'the start'}\n\n"))
+        user_prompt = load_json_prompt("data_analysis.json", self.lang)["enriched_data"].format(ev=ev)
+        # Down-sample the event table to whatever the budget leaves after the prompts and the summary
+        table_budget = self.budget.remaining() - self.budget.count(user_prompt + dumps_compact(dict(enriched, events=None)))
+        enriched["events"] = self.budget.fit_table(enriched["events"], max(table_budget, 0))
+        response = dumps_compact(enriched)
+        ctx.write_event_to_stream(ProgressEvent(msg=f"Enriched {enriched['locations']['events']} events ({enriched['events'].get('omitted', 0)} sampled out to fit the context) in {time.perf_counter() - self.started:.2f}s, unresolved: {enriched['unresolved']}\n\n"))
+
+        self.memory.put(ChatMessage(role=MessageRole.USER,content=user_prompt + response))
+        self.budget.charge("enrich_directly", user_prompt + response)
+        ctx.write_event_to_stream(ProgressEvent(msg=f"Context tokens: {self.budget.stats()}\n\n"))
         return ReportEvent(msg=response)
 
     @step
     async def gen_report(self, ctx: Context, ev: ReportEvent) -> Union[StopEvent]:
-        user_prompt = load_json_prompt("data_analysis.json", "zh")["gen_report"]
+        with get_tracer().span("workflow.gen_report", parent=getattr(self, "trace_span", None)) as span:
+            return await self._gen_report(ctx, ev, span)
+
+    async def _gen_report(self, ctx: Context, ev: ReportEvent, step_span) -> StopEvent:
+        user_prompt = load_json_prompt("data_analysis.json", self.lang)["gen_report"]
         self.memory.put(ChatMessage(role=MessageRole.USER, content=user_prompt))
-        chat_history = self.memory.get()
-
-        response = ""
-        handle = await self.llm.astream_chat(chat_history)
-        async for token in handle:
-            # cprint(token.delta)
-            ctx.write_event_to_stream(ProgressEvent(msg=token.delta))
-            response += token.delta
+        chat_history = self.budget.enforce(self.memory.get())
+
+        # Identical enriched data, prompts and model produce the same report: replay it instead of calling the LLM
+        cache_key = report_cache_key(
+            chat_history,
+            model=self.model_name(),
+            temperature=getattr(self.llm, "temperature", None),
+            lang=self.lang,
+            max_tokens=getattr(self.llm, "max_tokens", None),
+        )
+        # SQLite lookups run in a worker thread, off the event loop
+        cached = await anyio.to_thread.run_sync(cached_report, cache_key)
+        step_span.set(report_cache_hit=cached is not None)
+        if cached is not None:
+            # Replayed like a fresh completion: the stream carries the report and nothing else
+            for chunk in replay_chunks(cached):
+                ctx.write_event_to_stream(ProgressEvent(msg=chunk))
+            stats = report_cache_stats()
+            step_span.set(report_cache_entries=stats["entries"], report_cache_hit_rate=stats["hit_rate"])
+            logger.info(f"Report served from cache: {stats}")
+            return StopEvent(result=cached)
+
+        parts = []
+        with get_tracer().span("llm.stream_chat", labels={"model": self.model_name()}) as span:
+            first_token = None
+            handle = await self.llm.astream_chat(chat_history)
+            async for token in handle:
+                if first_token is None and token.delta:
+                    first_token = time.perf_counter() - span.started
+                # cprint(token.delta)
+                ctx.write_event_to_stream(ProgressEvent(msg=token.delta))
+                parts.append(token.delta)
+            response = "".join(parts)
+            prompt_tokens = sum(self.budget.count(message.content) for message in chat_history)
+            record_llm_call(span, first_token, prompt_tokens, self.budget.count(response), self.model_name())
+        await anyio.to_thread.run_sync(store_report, cache_key, response)
         return StopEvent(result=response)
 
+    def model_name(self) -> str:
+        return getattr(self.llm, "model", None) or type(self.llm).__name__
+
     async def init_mcp_server(self):
-        servers = [ 
-            {"command_or_url":f"mqtt://{os.getenv('MQTT_BROKER', 'localhost')}:1883", "args":[]},
-            {"command_or_url":f'https://mcp.amap.com/sse?key={os.getenv("GAODE_KEY")}', "args":[]},
-        ]
-        all_tools = []
-        for server in servers:
-            command_or_url = server["command_or_url"]
-            if command_or_url.startswith("mqtt"):
-                mqtt_mcp_client = MQTTMCPClient(
-                    uri=command_or_url,
-                    client_desc="sdv app",
-                    server_name_filter="sdv/#",
-                    max_servers_to_discover=2
-                )
-                client_sessions = await mqtt_mcp_client.connect()
-                for session in client_sessions:
-                    mcp_tool = McpToolSpec(client=session)
-                    tools = await mcp_tool.to_tool_list_async()
-                    all_tools.extend(tools)
-            else:
-                mcp_client = BasicMCPClient(
-                    command_or_url = command_or_url,
-                    args = server["args"]
-                )
-                mcp_tool = McpToolSpec(client=mcp_client)
-                tools = await mcp_tool.to_tool_list_async()
-                all_tools.extend(tools)
-        return all_tools
+        return await self.tool_pool.get_tools()
+
+def parse_vehicle_id(user_input: str) -> str:
+    match = re.search(r"\d+", user_input or "")
+    if match is None:
+        raise ValueError(f"Cannot find a vehicle ID in: {user_input}")
+    return match.group(0)
+
+def create_llm(provider: str = None) -> LLM:
+    """
+    Create the LLM client of `provider` (defaults to `LLM_PROVIDER`, else `siliconflow`).
+    Only the selected provider's package is imported.
+
+    - `siliconflow`: `SFAPI_KEY`, optionally `SFAPI_BASE_URL` pointing at another
+      OpenAI-compatible chat completions endpoint, e.g. bench/fake_llm.py
+    - `openai_like`: any OpenAI-compatible server at `LLM_API_BASE`, with `LLM_API_KEY`
+    - `deepseek`: `DEEPSEEK_API_KEY`
+
+    The model is `MODEL_NAME` for all providers.
+
+    Raises:
+        ValueError: If the provider is unknown
+    """
+    provider = (provider or os.getenv("LLM_PROVIDER", "siliconflow")).lower()
+    options = dict(model=os.getenv("MODEL_NAME"), temperature=0.2, max_tokens=4000, timeout=180)
+    if provider == "siliconflow":
+        from llama_index.llms.siliconflow import SiliconFlow
+        if os.getenv("SFAPI_BASE_URL"):
+            options["base_url"] = os.getenv("SFAPI_BASE_URL")
+        return SiliconFlow(api_key=os.getenv("SFAPI_KEY"), **options)
+    if provider == "openai_like":
+        from llama_index.llms.openai_like import OpenAILike
+        return OpenAILike(api_base=os.getenv("LLM_API_BASE"), api_key=os.getenv("LLM_API_KEY"), is_chat_model=True, is_function_calling_model=True, **options)
+    if provider == "deepseek":
+        from llama_index.llms.deepseek import DeepSeek
+        options["model"] = options["model"] or "deepseek-chat"
+        return DeepSeek(api_key=os.getenv("DEEPSEEK_API_KEY"), **options)
+    raise ValueError(f"Unknown LLM_PROVIDER '{provider}', expected siliconflow, openai_like or deepseek")
 
 async def main():
+    setup_environment()
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
     try:
-        llm = SiliconFlow(api_key=os.getenv("SFAPI_KEY"),model=os.getenv("MODEL_NAME"),temperature=0.2,max_tokens=4000, timeout=180)
-        w = DriverBehaviorFlow(timeout=None, llm=llm, verbose=True)
+        llm = create_llm()
+        w = DriverBehaviorFlow(timeout=None, llm=llm, verbose=True, direct_enrichment=os.getenv("DIRECT_ENRICHMENT", "0") == "1")
         ctx = Context(w)
 
         user_prompt = '''生成车辆编号为 00001 的驾驶行为报告'''
-        handler = w.run(user_input=user_prompt, ctx=ctx)
+        handler = w.run(user_input=user_prompt, vehicle_id="00001", ctx=ctx)
 
         async for ev in handler.stream_events():
             if isinstance(ev, ProgressEvent):
@@ -152,6 +287,8 @@ async def main():
         cprint("Full stack trace:\n")
         cprint(traceback.format_exc())
         raise
+    finally:
+        await get_mcp_tool_pool().aclose()
 
 if __name__ == "__main__":
     anyio.run(main)
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Fake OpenAI-compatible chat completions server with a configurable latency profile.
+
+Time to first token is `ttft + prompt_tokens / prefill_tokens_per_sec`, then `tokens`
+completion tokens are streamed at `tokens_per_sec`. Non-streaming requests get the same
+text in one response after the full generation time.
+
+    python -m bench.fake_llm --port 8081 --ttft 0.5 --tokens-per-sec 50 --tokens 300
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPORT_LINES = [
+    "# 驾驶行为分析报告\n\n",
+    "## 概览\n\n",
+    "分析周期内共记录急加速、急减速与超速事件，整体风险等级为中等。\n\n",
+    "## 详细分析\n\n",
+    "- 急加速事件集中在早晚高峰时段，\n",
+    "- 雨雪天气下的急减速事件占比较高，\n",
+    "- 最高车速出现在城际道路。\n\n",
+    "## 建议\n\n",
+    "保持平稳驾驶，恶劣天气下降低车速并增加跟车距离。\n\n",
+]
+
+
+def completion_tokens(count: int):
+    """`count` short text pieces cycling through a canned report."""
+    text = "".join(REPORT_LINES)
+    for i in range(count):
+        yield text[i * 2 % len(text):i * 2 % len(text) + 2]
+
+
+class FakeLLM:
+    def __init__(self, ttft: float, tokens_per_sec: float, tokens: int, prefill_tokens_per_sec: float):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def prompt_tokens(self, request: dict) -> int:
+        # About two characters per token of mixed Chinese/ASCII text
+        return sum(len(str(message.get("content") or "")) for message in request.get("messages", [])) // 2
+
+    def first_token_delay(self, prompt_tokens: int) -> float:
+        prefill = prompt_tokens / self.prefill_tokens_per_sec if self.prefill_tokens_per_sec > 0 else 0
+        return self.ttft + prefill
+
+
+def make_handler(llm: FakeLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = json.dumps(llm.stats).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("chat/completions"):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt_tokens = llm.prompt_tokens(request)
+            with llm.lock:
+                llm.stats["requests"] += 1
+                llm.stats["prompt_tokens"] += prompt_tokens
+                llm.stats["in_flight"] += 1
+                llm.stats["max_in_flight"] = max(llm.stats["max_in_flight"], llm.stats["in_flight"])
+            try:
+                time.sleep(llm.first_token_delay(prompt_tokens))
+                if request.get("stream"):
+                    self.stream(request)
+                else:
+                    self.complete(request, prompt_tokens)
+            finally:
+                with llm.lock:
+                    llm.stats["in_flight"] -= 1
+                    llm.stats["completion_tokens"] += llm.tokens
+
+        def chunk(self, request: dict, delta: dict, finish_reason=None) -> bytes:
+            payload = {
+                "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "bench"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        def stream(self, request: dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            interval = 1 / llm.tokens_per_sec if llm.tokens_per_sec > 0 else 0
+            first = True
+            for token in completion_tokens(llm.tokens):
+                delta = {"role": "assistant", "content": token} if first else {"content": token}
+                self.wfile.write(self.chunk(request, delta))
+                self.wfile.flush()
+                first = False
+                if interval:
+                    time.sleep(interval)
+            self.wfile.write(self.chunk(request, {"content": ""}, finish_reason="stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def complete(self, request: dict, prompt_tokens: int):
+            if llm.tokens_per_sec > 0:
+                time.sleep(llm.tokens / llm.tokens_per_sec)
+            body = json.dumps({
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "bench"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(completion_tokens(llm.tokens))}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": llm.tokens, "total_tokens": prompt_tokens + llm.tokens},
+            }, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming LLM")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Base time to first token, in seconds")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=5000, help="Prompt tokens processed per second before the first token, 0 to ignore the prompt size")
+    parser.add_argument("--tokens-per-sec", type=float, default=50, help="Completion tokens streamed per second")
+    parser.add_argument("--tokens", type=int, default=300, help="Completion tokens per response")
+    args = parser.parse_args()
+    llm = FakeLLM(args.ttft, args.tokens_per_sec, args.tokens, args.prefill_tokens_per_sec)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(llm))
+    server.daemon_threads = True
+    print(f"Fake LLM listening on {args.host}:{args.port}", flush=True)
+    server.serve_forever()
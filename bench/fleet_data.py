@@ -0,0 +1,48 @@
+"""
+Synthetic vehicle fleets in the format of `data/vehicle_<id>.json`.
+"""
+import os
+import json
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+EVENT_TYPES = ["sudden_acceleration", "max_speed", "sudden_deceleration"]
+
+
+def generate_fleet(data_dir: str, vehicles: int, events_per_vehicle: int, days: int = 90, start: str = "2023-01-01", seed: int = 0) -> List[str]:
+    """
+    Write `vehicles` files of `events_per_vehicle` time-ordered events each into `data_dir`.
+
+    Each vehicle drives around a home city, with a share of its events in a second city,
+    so location clustering and city lookups behave like a real fleet.
+
+    Returns:
+        list: The zero-padded vehicle IDs
+    """
+    with open(os.path.join(DATA_DIR, 'city_centroids.json'), 'r', encoding='utf-8') as f:
+        cities = json.load(f)["cities"]
+    rng = random.Random(seed)
+    first_day = datetime.strptime(start, "%Y-%m-%d")
+    os.makedirs(data_dir, exist_ok=True)
+    vehicle_ids = []
+    for n in range(1, vehicles + 1):
+        vehicle_id = f"{n:05d}"
+        home, away = rng.sample(cities, 2)
+        offsets = sorted(rng.randrange(days * 86400) for _ in range(events_per_vehicle))
+        events = []
+        for offset in offsets:
+            city = home if rng.random() < 0.85 else away
+            event = {
+                "time": (first_day + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S"),
+                "type": rng.choices(EVENT_TYPES, weights=[3, 2, 3])[0],
+                "location": f"{city['lng'] + rng.uniform(-0.05, 0.05):.6f},{city['lat'] + rng.uniform(-0.05, 0.05):.6f}",
+            }
+            if event["type"] == "max_speed":
+                event["speed"] = f"{rng.randint(60, 140)}km/h"
+            events.append(event)
+        with open(os.path.join(data_dir, f"vehicle_{vehicle_id}.json"), "w", encoding="utf-8") as f:
+            json.dump({"data": events}, f, ensure_ascii=False)
+        vehicle_ids.append(vehicle_id)
+    return vehicle_ids
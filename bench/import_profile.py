@@ -0,0 +1,107 @@
+"""
+Import-time profile of the entry points: wall time of importing each module in a fresh
+interpreter (minus the bare interpreter startup), and its most expensive imports from
+`python -X importtime`.
+
+    python -m bench.import_profile
+    python -m bench.import_profile app vehicle --repeat 5 --top 15 --out import_profile.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DEFAULT_MODULES = ["util", "vehicle", "weather", "app", "fleet", "server"]
+
+
+def run_import(statement: str) -> tuple:
+    """Wall time and `-X importtime` output of running `statement` in a fresh interpreter."""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if process.returncode != 0:
+        errors = [line for line in process.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"exit code {process.returncode}")
+    return elapsed, process.stderr
+
+
+def parse_importtime(output: str) -> List[dict]:
+    """Rows of `-X importtime` output: module, self and cumulative time in seconds, nesting depth."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_sec": int(self_us) / 1e6,
+            "cumulative_sec": int(cumulative_us) / 1e6,
+        })
+    return rows
+
+
+def profile_module(module: str, repeat: int, top: int, startup_sec: float) -> Dict:
+    """Best of `repeat` imports of `module`, with its `top` slowest top-level packages and imports."""
+    best, best_rows = None, None
+    for _ in range(repeat):
+        elapsed, output = run_import(f"import {module}")
+        if best is None or elapsed < best:
+            best, best_rows = elapsed, parse_importtime(output)
+    packages: Dict[str, float] = {}
+    for row in best_rows:
+        if row["depth"] == 0:
+            root = row["module"].split(".")[0]
+            packages[root] = packages.get(root, 0) + row["cumulative_sec"]
+    return {
+        "module": module,
+        "wall_sec": round(best, 3),
+        "import_sec": round(max(best - startup_sec, 0), 3),
+        "modules_imported": len(best_rows),
+        "top_packages": [
+            {"package": name, "cumulative_sec": round(sec, 3)}
+            for name, sec in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "top_imports": [
+            {"module": row["module"], "self_sec": round(row["self_sec"], 4), "cumulative_sec": round(row["cumulative_sec"], 3)}
+            for row in sorted(best_rows, key=lambda row: -row["self_sec"])[:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the entry points")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help=f"Modules to import, defaults to {' '.join(DEFAULT_MODULES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module, the fastest one is reported")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages and imports listed per module")
+    parser.add_argument("--out", default=None, help="Write the profile as JSON to this file")
+    args = parser.parse_args()
+
+    startup_sec = min(run_import("pass")[0] for _ in range(args.repeat))
+    print(f"Interpreter startup: {startup_sec:.3f}s")
+    results = []
+    for module in args.modules:
+        try:
+            result = profile_module(module, args.repeat, args.top, startup_sec)
+        except RuntimeError as e:
+            print(f"\n== {module}: import failed: {e}")
+            results.append({"module": module, "error": str(e)})
+            continue
+        results.append(result)
+        print(f"\n== {module}: {result['import_sec']:.3f}s import ({result['wall_sec']:.3f}s wall), {result['modules_imported']} modules")
+        for package in result["top_packages"]:
+            print(f"  {package['package']:<40}{package['cumulative_sec']:>8.3f}s")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"startup_sec": round(startup_sec, 3), "modules": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
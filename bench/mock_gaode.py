@@ -0,0 +1,47 @@
+"""
+Mock of the Gaode (AMap) MCP server over SSE, answering reverse geocoding from the bundled
+city centroids instead of the AMap API.
+
+    python -m bench.mock_gaode --port 8083
+"""
+import json
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+from util.geo_cluster import parse_location
+from util.offline_geocoder import get_offline_geocoder
+
+
+def create_server(host: str, port: int) -> FastMCP:
+    mcp = FastMCP(name="amap-maps-mock", host=host, port=port)
+
+    @mcp.tool()
+    async def maps_regeocode(location: str) -> str:
+        """
+        将一个高德经纬度坐标转换为行政区划地址信息
+
+        Args:
+            location (str): 经纬度，格式为 'lng,lat'
+        """
+        lng, lat = parse_location(location)
+        nearest = get_offline_geocoder().nearest(lng, lat, max_distance_km=200)
+        if nearest is None:
+            return json.dumps({"province": "", "city": "", "district": ""}, ensure_ascii=False)
+        city, _ = nearest
+        return json.dumps({
+            "province": city["province"],
+            "city": city.get("parent") or city["city"],
+            "district": city["city"] if city.get("parent") else "",
+        }, ensure_ascii=False)
+
+    return mcp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Gaode MCP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8083)
+    args = parser.parse_args()
+    get_offline_geocoder()
+    create_server(args.host, args.port).run(transport="sse")
@@ -0,0 +1,103 @@
+"""
+Mock of the Juhe history weather API (`/historyWeather/citys` and `/historyWeather/weather`).
+
+City lists are derived from `data/city_centroids.json`, so every location of a synthetic
+fleet resolves; the weather of a (city, date) pair is deterministic.
+
+    python -m bench.mock_juhe --port 8082 --latency 0.05
+"""
+import os
+import json
+import time
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+WEATHERS = ["晴", "多云", "阴", "小雨", "中雨", "雷阵雨", "小雪", "雾"]
+WINDS = ["北风", "南风", "东风", "西风", "东北风", "西北风"]
+
+
+def build_cities() -> dict:
+    """province_id -> [{"id", "province_id", "city_name"}] for the provinces and cities of the centroid file."""
+    with open(os.path.join(DATA_DIR, 'province_ids.json'), 'r', encoding='utf-8') as f:
+        province_ids = {p["province"]: p["id"] for p in json.load(f)["provinces"]}
+    with open(os.path.join(DATA_DIR, 'city_centroids.json'), 'r', encoding='utf-8') as f:
+        centroids = json.load(f)["cities"]
+    names = {}
+    for city in centroids:
+        province_id = province_ids.get(city["province"])
+        if province_id is None:
+            continue
+        for name in filter(None, (city["city"], city.get("parent"))):
+            names.setdefault(province_id, {})[name] = None
+    cities, next_id = {}, 1
+    for province_id in sorted(names, key=int):
+        cities[province_id] = []
+        for name in names[province_id]:
+            cities[province_id].append({"id": str(next_id), "province_id": province_id, "city_name": name})
+            next_id += 1
+    return cities
+
+
+def weather_of(city_id: str, date: str) -> dict:
+    seed = zlib.crc32(f"{city_id}:{date}".encode("utf-8"))
+    month = int(date[5:7]) if len(date) >= 7 and date[5:7].isdigit() else 6
+    base = 28 - abs(month - 7) * 4
+    return {
+        "city_id": city_id,
+        "weather_date": date,
+        "day_weather": WEATHERS[seed % len(WEATHERS)],
+        "night_weather": WEATHERS[(seed >> 4) % len(WEATHERS)],
+        "day_temp": f"{base + seed % 5}℃",
+        "night_temp": f"{base - 8 + (seed >> 8) % 5}℃",
+        "day_wind": WINDS[(seed >> 12) % len(WINDS)],
+        "day_wind_comp": f"{1 + (seed >> 16) % 4}-{2 + (seed >> 16) % 4}级",
+        "night_wind": WINDS[(seed >> 20) % len(WINDS)],
+        "night_wind_comp": f"{1 + (seed >> 24) % 3}级",
+    }
+
+
+def make_handler(cities: dict, latency: float, stats: dict, lock: threading.Lock):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            time.sleep(latency)
+            with lock:
+                stats[url.path] = stats.get(url.path, 0) + 1
+            if url.path == "/historyWeather/citys":
+                result = cities.get(params.get("province_id"))
+                payload = {"reason": "查询成功", "result": result, "error_code": 0} if result else {"reason": "暂无数据", "result": None, "error_code": 207301}
+            elif url.path == "/historyWeather/weather":
+                payload = {"reason": "查询成功", "result": weather_of(params.get("city_id", ""), params.get("weather_date", "")), "error_code": 0}
+            elif url.path == "/stats":
+                payload = stats
+            else:
+                self.send_error(404)
+                return
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Juhe history weather API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every request")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(build_cities(), args.latency, {}, threading.Lock()))
+    server.daemon_threads = True
+    print(f"Mock Juhe API listening on {args.host}:{args.port}", flush=True)
+    server.serve_forever()
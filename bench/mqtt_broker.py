@@ -0,0 +1,414 @@
+"""
+Minimal MQTT 3.1.1 / 5.0 broker for benchmarks, so that the MCP servers and the app can
+talk over MQTT without an EMQX container.
+
+Supported: QoS 0/1 (QoS 2 is accepted and delivered as QoS 1), retained messages, `+`/`#`
+wildcards, `$share/<group>/` subscriptions, will messages, and the MQTT 5 no-local,
+retain-as-published and retain-handling options and properties, which are forwarded
+unchanged. Sessions are not persisted.
+
+    python -m bench.mqtt_broker --port 1883
+"""
+import asyncio
+import argparse
+import itertools
+import struct
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+# MQTT 5 property identifiers by value type
+_BYTE_PROPS = {0x01, 0x17, 0x19, 0x24, 0x25, 0x28, 0x29, 0x2A}
+_INT16_PROPS = {0x13, 0x21, 0x22, 0x23}
+_INT32_PROPS = {0x02, 0x11, 0x18, 0x27}
+_STRING_PROPS = {0x03, 0x08, 0x12, 0x15, 0x1A, 0x1C, 0x1F}
+_BINARY_PROPS = {0x09, 0x16}
+SUBSCRIPTION_IDENTIFIER = 0x0B
+TOPIC_ALIAS = 0x23
+ASSIGNED_CLIENT_IDENTIFIER = 0x12
+USER_PROPERTY = 0x26
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, value = value % 128, value // 128
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+def decode_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value += (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_string(value) -> bytes:
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def decode_string(buf: bytes, pos: int) -> Tuple[bytes, int]:
+    (length,) = struct.unpack_from("!H", buf, pos)
+    return buf[pos + 2:pos + 2 + length], pos + 2 + length
+
+
+def decode_properties(buf: bytes, pos: int) -> Tuple[List[Tuple[int, bytes]], int]:
+    """Properties as `(identifier, encoded value)` pairs, kept encoded so they can be forwarded as is."""
+    length, pos = decode_varint(buf, pos)
+    end = pos + length
+    props = []
+    while pos < end:
+        prop, pos = decode_varint(buf, pos)
+        start = pos
+        if prop in _BYTE_PROPS:
+            pos += 1
+        elif prop in _INT16_PROPS:
+            pos += 2
+        elif prop in _INT32_PROPS:
+            pos += 4
+        elif prop in _STRING_PROPS or prop in _BINARY_PROPS:
+            _, pos = decode_string(buf, pos)
+        elif prop == SUBSCRIPTION_IDENTIFIER:
+            _, pos = decode_varint(buf, pos)
+        elif prop == USER_PROPERTY:
+            _, pos = decode_string(buf, pos)
+            _, pos = decode_string(buf, pos)
+        else:
+            raise ValueError(f"Unknown MQTT property 0x{prop:02x}")
+        props.append((prop, buf[start:pos]))
+    return props, end
+
+
+def encode_properties(props: List[Tuple[int, bytes]]) -> bytes:
+    body = b"".join(encode_varint(prop) + value for prop, value in props)
+    return encode_varint(len(body)) + body
+
+
+def packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + encode_varint(len(body)) + body
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_levels, topic_levels = topic_filter.split("/"), topic.split("/")
+    # Wildcards do not match topics starting with '$'
+    if topic.startswith("$") and filter_levels[0] in ("+", "#"):
+        return False
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or (level != "+" and level != topic_levels[i]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class Subscription:
+    def __init__(self, session, topic_filter: str, qos: int, no_local: bool, retain_as_published: bool, identifier: Optional[int], group: Optional[str]):
+        self.session = session
+        self.topic_filter = topic_filter
+        self.qos = qos
+        self.no_local = no_local
+        self.retain_as_published = retain_as_published
+        self.identifier = identifier
+        self.group = group
+
+
+class Session:
+    def __init__(self, broker, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.version = 4
+        self.will = None
+        self.packet_ids = itertools.cycle(range(1, 65536))
+        self.closed = False
+
+    def send(self, data: bytes):
+        if not self.closed:
+            self.writer.write(data)
+
+    async def run(self):
+        clean = False
+        try:
+            while True:
+                first = await self.reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await self.reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await self.reader.readexactly(length) if length else b""
+                packet_type, flags = first[0] >> 4, first[0] & 0x0F
+                if packet_type == DISCONNECT:
+                    reason = body[0] if body else 0
+                    # 0x04: disconnect with will message
+                    clean = reason != 0x04
+                    break
+                self.handle(packet_type, flags, body)
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.closed = True
+            self.broker.remove(self)
+            if self.will is not None and not clean:
+                self.broker.publish(self, *self.will)
+            self.writer.close()
+
+    def handle(self, packet_type: int, flags: int, body: bytes):
+        if packet_type == CONNECT:
+            self.on_connect(body)
+        elif packet_type == PUBLISH:
+            self.on_publish(flags, body)
+        elif packet_type == PUBREL:
+            self.send(packet(PUBCOMP, 0, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            self.on_subscribe(body)
+        elif packet_type == UNSUBSCRIBE:
+            self.on_unsubscribe(body)
+        elif packet_type == PINGREQ:
+            self.send(packet(PINGRESP, 0, b""))
+        # PUBACK/PUBREC/PUBCOMP for messages we delivered need no action
+
+    def on_connect(self, body: bytes):
+        _, pos = decode_string(body, 0)
+        self.version = body[pos]
+        connect_flags = body[pos + 1]
+        pos += 4
+        if self.version == 5:
+            _, pos = decode_properties(body, pos)
+        client_id, pos = decode_string(body, pos)
+        connack_props = []
+        self.client_id = client_id.decode("utf-8")
+        if not self.client_id:
+            self.client_id = f"bench-{uuid.uuid4().hex[:12]}"
+            connack_props.append((ASSIGNED_CLIENT_IDENTIFIER, encode_string(self.client_id)))
+        if connect_flags & 0x04:
+            will_props = []
+            if self.version == 5:
+                will_props, pos = decode_properties(body, pos)
+            will_topic, pos = decode_string(body, pos)
+            will_payload, pos = decode_string(body, pos)
+            will_qos, will_retain = (connect_flags >> 3) & 0x03, bool(connect_flags & 0x20)
+            self.will = (will_topic.decode("utf-8"), will_payload, min(will_qos, 1), will_retain, will_props)
+        self.broker.add(self)
+        if self.version == 5:
+            self.send(packet(CONNACK, 0, b"\x00\x00" + encode_properties(connack_props)))
+        else:
+            self.send(packet(CONNACK, 0, b"\x00\x00"))
+
+    def on_publish(self, flags: int, body: bytes):
+        qos, retain = (flags >> 1) & 0x03, bool(flags & 0x01)
+        topic, pos = decode_string(body, 0)
+        packet_id = None
+        if qos:
+            packet_id = body[pos:pos + 2]
+            pos += 2
+        props = []
+        if self.version == 5:
+            props, pos = decode_properties(body, pos)
+            props = [(prop, value) for prop, value in props if prop != TOPIC_ALIAS]
+        self.broker.publish(self, topic.decode("utf-8"), body[pos:], min(qos, 1), retain, props)
+        if qos == 1:
+            self.send(packet(PUBACK, 0, packet_id))
+        elif qos == 2:
+            self.send(packet(PUBREC, 0, packet_id))
+
+    def on_subscribe(self, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        identifier = None
+        if self.version == 5:
+            props, pos = decode_properties(body, pos)
+            for prop, value in props:
+                if prop == SUBSCRIPTION_IDENTIFIER:
+                    identifier, _ = decode_varint(value, 0)
+        granted = []
+        while pos < len(body):
+            topic_filter, pos = decode_string(body, pos)
+            options = body[pos]
+            pos += 1
+            qos = min(options & 0x03, 1)
+            granted.append(qos)
+            self.broker.subscribe(self, topic_filter.decode("utf-8"), qos, options, identifier)
+        reason_codes = bytes(granted)
+        if self.version == 5:
+            self.send(packet(SUBACK, 0, packet_id + encode_properties([]) + reason_codes))
+        else:
+            self.send(packet(SUBACK, 0, packet_id + reason_codes))
+
+    def on_unsubscribe(self, body: bytes):
+        packet_id = body[:2]
+        pos = 2
+        if self.version == 5:
+            _, pos = decode_properties(body, pos)
+        count = 0
+        while pos < len(body):
+            topic_filter, pos = decode_string(body, pos)
+            self.broker.unsubscribe(self, topic_filter.decode("utf-8"))
+            count += 1
+        if self.version == 5:
+            self.send(packet(UNSUBACK, 0, packet_id + encode_properties([]) + bytes(count)))
+        else:
+            self.send(packet(UNSUBACK, 0, packet_id))
+
+    def deliver(self, topic: str, payload: bytes, qos: int, retain: bool, props: List[Tuple[int, bytes]], identifier: Optional[int]):
+        body = encode_string(topic)
+        if qos:
+            body += struct.pack("!H", next(self.packet_ids))
+        if self.version == 5:
+            if identifier is not None:
+                props = props + [(SUBSCRIPTION_IDENTIFIER, encode_varint(identifier))]
+            body += encode_properties(props)
+        self.send(packet(PUBLISH, qos << 1 | int(retain), body + payload))
+
+
+class MqttBroker:
+    """
+    In-memory MQTT broker serving on `host:port`.
+
+    Args:
+        host (str): Listen address
+        port (int): Listen port, 0 for any free port (see `port` after `start`)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1883):
+        self.host = host
+        self.port = port
+        self.sessions: Dict[str, Session] = {}
+        self.subscriptions: List[Subscription] = []
+        self.retained: Dict[str, tuple] = {}
+        self._shared_turns: Dict[tuple, int] = {}
+        self.stats = {"connections": 0, "published": 0, "delivered": 0}
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    def add(self, session: Session):
+        previous = self.sessions.get(session.client_id)
+        if previous is not None and previous is not session:
+            # Session takeover: the old connection is closed
+            previous.closed = True
+            previous.writer.close()
+            self.remove(previous)
+        self.sessions[session.client_id] = session
+        self.stats["connections"] += 1
+
+    def remove(self, session: Session):
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        self.subscriptions = [sub for sub in self.subscriptions if sub.session is not session]
+
+    def subscribe(self, session: Session, topic_filter: str, qos: int, options: int, identifier: Optional[int]):
+        group = None
+        if topic_filter.startswith("$share/"):
+            _, group, topic_filter = topic_filter.split("/", 2)
+        existed = any(sub.session is session and sub.topic_filter == topic_filter and sub.group == group for sub in self.subscriptions)
+        self.subscriptions = [
+            sub for sub in self.subscriptions if not (sub.session is session and sub.topic_filter == topic_filter and sub.group == group)
+        ]
+        subscription = Subscription(
+            session, topic_filter, qos,
+            no_local=bool(options & 0x04) and session.version == 5,
+            retain_as_published=bool(options & 0x08) and session.version == 5,
+            identifier=identifier, group=group,
+        )
+        self.subscriptions.append(subscription)
+        retain_handling = (options >> 4) & 0x03 if session.version == 5 else 0
+        if group is None and (retain_handling == 0 or (retain_handling == 1 and not existed)):
+            for topic, (payload, retained_qos, props) in list(self.retained.items()):
+                if topic_matches(topic_filter, topic):
+                    session.deliver(topic, payload, min(retained_qos, qos), True, props, identifier)
+
+    def unsubscribe(self, session: Session, topic_filter: str):
+        group = None
+        if topic_filter.startswith("$share/"):
+            _, group, topic_filter = topic_filter.split("/", 2)
+        self.subscriptions = [
+            sub for sub in self.subscriptions if not (sub.session is session and sub.topic_filter == topic_filter and sub.group == group)
+        ]
+
+    def publish(self, sender: Optional[Session], topic: str, payload: bytes, qos: int, retain: bool, props: List[Tuple[int, bytes]]):
+        self.stats["published"] += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos, props)
+            else:
+                self.retained.pop(topic, None)
+        shared: Dict[tuple, List[Subscription]] = {}
+        for sub in self.subscriptions:
+            if not topic_matches(sub.topic_filter, topic):
+                continue
+            if sub.group is not None:
+                shared.setdefault((sub.group, sub.topic_filter), []).append(sub)
+                continue
+            if sub.no_local and sub.session is sender:
+                continue
+            sub.session.deliver(topic, payload, min(qos, sub.qos), retain and sub.retain_as_published, props, sub.identifier)
+            self.stats["delivered"] += 1
+        for key, members in shared.items():
+            # Round robin over the members of a shared subscription group
+            turn = self._shared_turns.get(key, 0)
+            self._shared_turns[key] = turn + 1
+            sub = members[turn % len(members)]
+            sub.session.deliver(topic, payload, min(qos, sub.qos), False, props, sub.identifier)
+            self.stats["delivered"] += 1
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await Session(self, reader, writer).run()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "MqttBroker":
+        """Serve from a daemon thread with its own event loop; returns once the port is bound."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+
+            async def main():
+                self._server = await asyncio.start_server(self._handle, self.host, self.port)
+                self.port = self._server.sockets[0].getsockname()[1]
+                ready.set()
+                async with self._server:
+                    await self._server.serve_forever()
+
+            try:
+                self._loop.run_until_complete(main())
+            except asyncio.CancelledError:
+                pass
+
+        self._thread = threading.Thread(target=run, name="mqtt-broker", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minimal MQTT broker for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    broker = MqttBroker(args.host, args.port)
+    print(f"MQTT broker listening on {args.host}:{args.port}", flush=True)
+    asyncio.run(broker.serve())
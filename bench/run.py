@@ -0,0 +1,316 @@
+"""
+End-to-end benchmark of the report pipeline on a plain Linux box.
+
+Each scenario runs in a fresh worker process with a fresh temporary directory: it starts
+the local MQTT broker, the fake LLM, the mock Juhe and Gaode servers, `vehicle.py` and
+`weather.py`, generates a synthetic fleet, and reports on it with `fleet.run_fleet` in
+direct enrichment mode. Results hold throughput, report latency, per-stage span latency
+and peak memory per process; with `--baseline` the run fails on regressions.
+
+    python -m bench.run --fleet-sizes 10,100 --events 500 --baseline bench/baseline.json
+    python -m bench.run --fleet-sizes 10,100 --save-baseline bench/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from typing import Dict, List, Optional
+
+import anyio
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Regression metrics: name -> True if higher is better
+REGRESSION_METRICS = {
+    "reports_per_min": True,
+    "report_latency_p50": False,
+    "report_latency_p99": False,
+    "stage.workflow.process_input.p50": False,
+    "stage.workflow.gen_report.p50": False,
+    "memory_mb.app": False,
+    "memory_mb.vehicle": False,
+    "memory_mb.weather": False,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 4)
+
+
+class Service:
+    """A stand-in or MCP server running as a child process, with its output in `<log_dir>/<name>.log`."""
+
+    def __init__(self, name: str, args: List[str], env: dict, log_dir: str, port: Optional[int] = None, timeout: float = 30):
+        self.name = name
+        self.log_path = os.path.join(log_dir, f"{name}.log")
+        self._log = open(self.log_path, "w", encoding="utf-8")
+        self.process = subprocess.Popen([sys.executable, *args], cwd=REPO_DIR, env=env, stdout=self._log, stderr=subprocess.STDOUT)
+        if port is not None:
+            self.wait_for_port(port, timeout)
+
+    def wait_for_port(self, port: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.process.returncode}, see {self.log_path}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"{self.name} did not listen on port {port} within {timeout}s, see {self.log_path}")
+
+    def peak_rss_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.process.pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+
+def load_spans(path: str, since_ns: int = 0) -> List[dict]:
+    """Spans of an OTLP/JSON lines trace file that started at or after `since_ns`."""
+    spans = []
+    if not os.path.exists(path):
+        return spans
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for span in scope_spans["spans"]:
+                        if int(span["startTimeUnixNano"]) >= since_ns:
+                            span["attributes"] = {a["key"]: next(iter(a["value"].values())) for a in span["attributes"]}
+                            spans.append(span)
+    return spans
+
+
+def stage_stats(spans: List[dict]) -> Dict[str, dict]:
+    """Latency percentiles per span name; tool calls and Juhe requests are split by tool and endpoint."""
+    durations: Dict[str, List[float]] = {}
+    for span in spans:
+        key = span["name"]
+        if "tool" in span["attributes"]:
+            key += f"[{span['attributes']['tool']}]"
+        elif "endpoint" in span["attributes"]:
+            key += f"[{span['attributes']['endpoint']}]"
+        durations.setdefault(key, []).append((int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9)
+    return {
+        key: {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95), "mean": round(sum(values) / len(values), 4)}
+        for key, values in sorted(durations.items())
+    }
+
+
+async def run_worker(args) -> dict:
+    """Run one scenario with fresh services and data, in this process."""
+    from bench.fleet_data import generate_fleet
+
+    tmp = tempfile.mkdtemp(prefix="sdv-bench-")
+    for sub in ("data", "store", "cache", "traces", "logs", "reports"):
+        os.makedirs(os.path.join(tmp, sub))
+    vehicle_ids = generate_fleet(os.path.join(tmp, "data"), args.vehicles, args.events, seed=args.seed)
+
+    ports = {name: free_port() for name in ("mqtt", "llm", "juhe", "gaode")}
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_DIR,
+        MQTT_BROKER="127.0.0.1",
+        MQTT_PORT=str(ports["mqtt"]),
+        JUHE_API_BASE=f"http://127.0.0.1:{ports['juhe']}",
+        JUHE_API_KEY="bench",
+        GAODE_MCP_URL=f"http://127.0.0.1:{ports['gaode']}/sse",
+        SFAPI_BASE_URL=f"http://127.0.0.1:{ports['llm']}/v1/chat/completions",
+        SFAPI_KEY="bench",
+        MODEL_NAME="bench-model",
+        VEHICLE_DATA_DIR=os.path.join(tmp, "data"),
+        VEHICLE_STORE_DIR=os.path.join(tmp, "store"),
+        VEHICLE_EVENTS_TOPIC="",
+        WEATHER_CACHE_PATH=os.path.join(tmp, "cache", "weather.sqlite"),
+        CITY_CACHE_DIR=os.path.join(tmp, "cache", "cities"),
+        REPORT_CACHE="0",
+        MCP_DISCOVERY_TIMEOUT="60",
+        VEHICLE_SHARD_COUNT=str(args.vehicle_shards),
+        METRICS_PORT="",
+    )
+    logs = os.path.join(tmp, "logs")
+    services: Dict[str, Service] = {}
+    try:
+        services["broker"] = Service("broker", ["-m", "bench.mqtt_broker", "--port", str(ports["mqtt"])], env, logs, port=ports["mqtt"])
+        services["llm"] = Service("llm", [
+            "-m", "bench.fake_llm", "--port", str(ports["llm"]), "--ttft", str(args.llm_ttft),
+            "--tokens-per-sec", str(args.llm_tokens_per_sec), "--tokens", str(args.llm_tokens),
+        ], env, logs, port=ports["llm"])
+        services["juhe"] = Service("juhe", ["-m", "bench.mock_juhe", "--port", str(ports["juhe"]), "--latency", str(args.juhe_latency)], env, logs, port=ports["juhe"])
+        services["gaode"] = Service("gaode", ["-m", "bench.mock_gaode", "--port", str(ports["gaode"])], env, logs, port=ports["gaode"])
+        for index in range(args.vehicle_shards):
+            name = "vehicle" if args.vehicle_shards == 1 else f"vehicle_{index}"
+            shard_env = dict(env, VEHICLE_SHARD_INDEX=str(index), TRACE_FILE=os.path.join(tmp, "traces", f"{name}.jsonl"))
+            services[name] = Service(name, ["vehicle.py"], shard_env, logs)
+        services["weather"] = Service("weather", ["weather.py"], dict(env, TRACE_FILE=os.path.join(tmp, "traces", "weather.jsonl")), logs)
+
+        # This process is the app: configure it like the services before importing it
+        os.environ.update(env, TRACE_FILE=os.path.join(tmp, "traces", "app.jsonl"))
+        from fleet import run_fleet
+        from util import McpToolPool
+
+        pool = McpToolPool()
+        try:
+            started = time.perf_counter()
+            tools = await pool.get_tools()
+            mcp_connect_sec = round(time.perf_counter() - started, 3)
+            missing = {"query_vehicle_driving_behaviour_data", "query_city_ids_by_locations", "query_history_weather_batch"} - {t.metadata.name for t in tools}
+            if missing:
+                raise RuntimeError(f"MCP tools {sorted(missing)} not available, see the logs in {logs}")
+
+            since_ns = time.time_ns()
+            summary = await run_fleet(vehicle_ids, os.path.join(tmp, "reports"), args.concurrency, direct_enrichment=True, tool_pool=pool)
+        finally:
+            await pool.aclose()
+        spans = load_spans(os.path.join(tmp, "traces", "app.jsonl"), since_ns) + load_spans(os.path.join(tmp, "traces", "weather.jsonl"), since_ns)
+        ttfts = [span["attributes"]["ttft_sec"] for span in spans if span["name"] == "llm.stream_chat" and "ttft_sec" in span["attributes"]]
+        with urllib.request.urlopen(f"http://127.0.0.1:{ports['llm']}/") as response:
+            llm_stats = json.loads(response.read())
+
+        memory = {name: service.peak_rss_mb() for name, service in services.items()}
+        memory["app"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        stages = stage_stats(spans)
+        return {
+            "scenario": f"fleet_{args.vehicles}",
+            "vehicles": args.vehicles,
+            "events_per_vehicle": args.events,
+            "concurrency": args.concurrency,
+            "vehicle_shards": args.vehicle_shards,
+            "mcp_connect_sec": mcp_connect_sec,
+            "fleet": summary,
+            "llm": {"ttft_p50": percentile(ttfts, 0.5), "ttft_p95": percentile(ttfts, 0.95), **llm_stats},
+            "stages": stages,
+            "memory_mb": memory,
+            "metrics": {
+                "reports_per_min": summary["reports_per_min"],
+                "report_latency_p50": summary["latency_sec"]["p50"],
+                "report_latency_p99": summary["latency_sec"]["p99"],
+                **{f"stage.{name}.p50": stats["p50"] for name, stats in stages.items()},
+                **{f"memory_mb.{name}": mb for name, mb in memory.items() if mb is not None},
+            },
+        }
+    finally:
+        for service in reversed(list(services.values())):
+            service.stop()
+        if args.keep:
+            print(f"Kept the scenario directory {tmp}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline` beyond `tolerance` (relative)."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["scenario"])
+        if previous is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            old, new = previous["metrics"].get(metric), result["metrics"].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{result['scenario']} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: List[dict]):
+    for result in results:
+        fleet = result["fleet"]
+        print(f"\n== {result['scenario']}: {result['vehicles']} vehicles x {result['events_per_vehicle']} events, concurrency {result['concurrency']}, {result['vehicle_shards']} vehicle shards")
+        print(f"reports/min {fleet['reports_per_min']}  latency p50 {fleet['latency_sec']['p50']}s p99 {fleet['latency_sec']['p99']}s  "
+              f"failed {fleet['failed']}  mcp connect {result['mcp_connect_sec']}s  llm ttft p50 {result['llm']['ttft_p50']}s")
+        print(f"peak memory MB: {result['memory_mb']}")
+        print(f"{'stage':<64}{'count':>8}{'p50':>10}{'p95':>10}")
+        for name, stats in result["stages"].items():
+            print(f"{name:<64}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the report pipeline")
+    parser.add_argument("--fleet-sizes", default="10,50", help="Comma separated fleet sizes, one scenario each")
+    parser.add_argument("--events", type=int, default=500, help="Events per vehicle")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vehicle-shards", type=int, default=1, help="Replicas of the vehicle MCP server")
+    parser.add_argument("--llm-ttft", type=float, default=0.5)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=50)
+    parser.add_argument("--llm-tokens", type=int, default=300)
+    parser.add_argument("--juhe-latency", type=float, default=0.05)
+    parser.add_argument("--out", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Fail on regressions against this results file")
+    parser.add_argument("--save-baseline", default=None, help="Write the results as the new baseline to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative change tolerated before a metric counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the scenario directories with data, logs and traces")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        args.vehicles = args.worker
+        result = anyio.run(run_worker, args)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    results = []
+    for vehicles in (int(n) for n in args.fleet_sizes.split(",")):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            result_path = f.name
+        worker_args = [a for a in sys.argv[1:]] + ["--worker", str(vehicles), "--result", result_path]
+        subprocess.run([sys.executable, "-m", "bench.run", *worker_args], cwd=REPO_DIR, check=True)
+        with open(result_path, "r", encoding="utf-8") as f:
+            results.append(json.load(f))
+        os.remove(result_path)
+
+    print_results(results)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({result["scenario"]: result for result in results}, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import argparse
+import traceback
+from typing import List
+
+import anyio
+
+from app import DriverBehaviorFlow, cprint, create_llm, setup_environment
+from util import McpToolPool, get_mcp_tool_pool, start_metrics_server
+
+
+def parse_vehicle_ids(spec: str) -> List[str]:
+    """
+    Parse a vehicle ID list: '00001,00002', a range '00001-01000' (zero padding is kept),
+    a mix of both, or '@file' with one ID per line. Only two numbers of the same width
+    make a range, other IDs may contain '-', e.g. 'truck-7'.
+
+    Raises:
+        ValueError: If a range is reversed or no vehicle ID is given
+    """
+    if spec.startswith("@"):
+        with open(spec[1:], "r", encoding="utf-8") as f:
+            vehicle_ids = [line.strip() for line in f if line.strip()]
+    else:
+        vehicle_ids = []
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            bounds = re.fullmatch(r"(\d+)-(\d+)", part)
+            if bounds and len(bounds.group(1)) == len(bounds.group(2)):
+                first, last = bounds.groups()
+                if int(first) > int(last):
+                    raise ValueError(f"Vehicle ID range '{part}' is reversed, did you mean '{last}-{first}'?")
+                vehicle_ids.extend(str(i).zfill(len(first)) for i in range(int(first), int(last) + 1))
+            else:
+                vehicle_ids.append(part)
+    if not vehicle_ids:
+        raise ValueError(f"No vehicle IDs in '{spec}'")
+    return list(dict.fromkeys(vehicle_ids))
+
+
+class Checkpoint:
+    """
+    Append-only log of finished vehicles in `<out_dir>/checkpoint.jsonl`, so that an
+    interrupted run resumes with the vehicles that have no report yet.
+    """
+
+    def __init__(self, out_dir: str):
+        self.path = os.path.join(out_dir, "checkpoint.jsonl")
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line of an interrupted run
+                        continue
+                    if record["status"] == "ok":
+                        self.done.add(record["vehicle_id"])
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def record(self, vehicle_id: str, status: str, latency_sec: float, error: str = None):
+        entry = {"vehicle_id": vehicle_id, "status": status, "latency_sec": round(latency_sec, 3), "finished_at": time.time()}
+        if error:
+            entry["error"] = error
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if status == "ok":
+            self.done.add(vehicle_id)
+
+    def close(self):
+        self._file.close()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 3)
+
+
+async def generate_report(llm, vehicle_id: str, direct_enrichment: bool, tool_pool: McpToolPool = None) -> str:
+    w = DriverBehaviorFlow(timeout=None, llm=llm, direct_enrichment=direct_enrichment, tool_pool=tool_pool or get_mcp_tool_pool())
+    handler = w.run(user_input=f"生成车辆编号为 {vehicle_id} 的驾驶行为报告", vehicle_id=vehicle_id)
+    async for ev in handler.stream_events():
+        # Drain the stream; only the final report is kept
+        pass
+    return await handler
+
+
+async def run_fleet(vehicle_ids: List[str], out_dir: str, concurrency: int, direct_enrichment: bool, tool_pool: McpToolPool = None) -> dict:
+    """
+    Generate reports for many vehicles concurrently, writing each report to
+    `<out_dir>/vehicle_<id>.md` as soon as it is done.
+
+    All flows share the LLM client and the MCP tool pool (`tool_pool`, defaults to the
+    process-wide pool). Vehicles already reported in the checkpoint are skipped.
+
+    Returns:
+        dict: Throughput, latency percentiles and failure count of the run
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(out_dir)
+    pending = [v for v in vehicle_ids if v not in checkpoint.done]
+    cprint(f"{len(vehicle_ids) - len(pending)} of {len(vehicle_ids)} vehicles already reported, {len(pending)} to go\n")
+
+    llm = create_llm()
+    limiter = anyio.CapacityLimiter(concurrency)
+    latencies, failures = [], []
+    started = time.perf_counter()
+
+    async def run_one(vehicle_id: str):
+        async with limiter:
+            t0 = time.perf_counter()
+            try:
+                report = await generate_report(llm, vehicle_id, direct_enrichment, tool_pool)
+                path = os.path.join(out_dir, f"vehicle_{vehicle_id}.md")
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    f.write(str(report))
+                os.replace(f"{path}.tmp", path)
+            except Exception as e:
+                latency = time.perf_counter() - t0
+                failures.append(vehicle_id)
+                checkpoint.record(vehicle_id, "failed", latency, error=str(e))
+                cprint(f"[{vehicle_id}] failed after {latency:.1f}s: {str(e)}\n")
+                return
+            latency = time.perf_counter() - t0
+            latencies.append(latency)
+            checkpoint.record(vehicle_id, "ok", latency)
+            finished = len(latencies) + len(failures)
+            cprint(f"[{vehicle_id}] done in {latency:.1f}s ({finished}/{len(pending)})\n")
+
+    try:
+        async with anyio.create_task_group() as tg:
+            for vehicle_id in pending:
+                tg.start_soon(run_one, vehicle_id)
+    finally:
+        checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "vehicles": len(vehicle_ids),
+        "skipped": len(vehicle_ids) - len(pending),
+        "succeeded": len(latencies),
+        "failed": len(failures),
+        "failed_vehicles": failures,
+        "elapsed_sec": round(elapsed, 3),
+        "reports_per_min": round(len(latencies) * 60 / elapsed, 2) if elapsed else None,
+        "latency_sec": {"p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99), "max": percentile(latencies, 1.0)},
+        "concurrency": concurrency,
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+async def main():
+    setup_environment()
+    parser = argparse.ArgumentParser(description="Generate driving behaviour reports for a fleet of vehicles.")
+    parser.add_argument("vehicles", help="Vehicle IDs: '00001,00002', '00001-01000' or '@file'")
+    parser.add_argument("--out", default="reports", help="Output directory for reports and the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("FLEET_CONCURRENCY", "8")))
+    parser.add_argument("--agent", action="store_true", help="Let the agent enrich the data instead of calling the tools directly")
+    args = parser.parse_args()
+    try:
+        vehicle_ids = parse_vehicle_ids(args.vehicles)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+    try:
+        summary = await run_fleet(vehicle_ids, args.out, args.concurrency, direct_enrichment=not args.agent)
+        cprint(json.dumps(summary, ensure_ascii=False, indent=2) + "\n")
+    except Exception as e:
+        cprint(f"An error occurred: {str(e)}\n")
+        cprint("Full stack trace:\n")
+        cprint(traceback.format_exc())
+        raise
+    finally:
+        await get_mcp_tool_pool().aclose()
+
+if __name__ == "__main__":
+    anyio.run(main)
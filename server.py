@@ -0,0 +1,175 @@
+"""
+HTTP service generating driver behaviour reports, streamed over SSE.
+
+One warm process shares the LLM client and the MCP connections across all requests, so a
+report no longer pays interpreter startup and tool discovery:
+
+    uv run server.py --port 8000
+    curl -N http://localhost:8000/reports/00001
+    curl http://localhost:8000/reports/00001?stream=false
+"""
+import os
+import json
+import time
+import argparse
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import anyio
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sse_starlette import EventSourceResponse, ServerSentEvent
+
+from app import DriverBehaviorFlow, ProgressEvent, create_llm, setup_environment
+from util import ChunkCoalescer, get_metrics, get_mcp_tool_pool
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Also when served as `uvicorn server:app`, which never runs `__main__`
+    setup_environment()
+    app.state.llm = create_llm()
+    # Reports generated at once; further requests wait for a slot
+    app.state.limiter = anyio.CapacityLimiter(int(os.getenv("REPORT_SERVER_CONCURRENCY", "8")))
+    # Connect the MCP servers before the first request rather than during it
+    tools = await get_mcp_tool_pool().get_tools()
+    logger.info(f"Report service ready with {len(tools)} tools")
+    yield
+    await get_mcp_tool_pool().aclose()
+
+
+app = FastAPI(title="SDV driver behaviour reports", lifespan=lifespan)
+
+
+def new_flow(request: Request, direct: Optional[bool], lang: Optional[str]) -> DriverBehaviorFlow:
+    if direct is None:
+        direct = os.getenv("DIRECT_ENRICHMENT", "0") == "1"
+    return DriverBehaviorFlow(timeout=None, llm=request.app.state.llm, direct_enrichment=direct, lang=lang)
+
+
+def record_request(stream: bool, status: str, started: float):
+    labels = {"stream": str(stream).lower(), "status": status}
+    get_metrics().inc("sdv_report_requests_total", labels=labels, help="Report requests by outcome")
+    get_metrics().observe("sdv_report_request_duration_seconds", time.perf_counter() - started, labels=labels, help="Report request duration, including the wait for a slot")
+
+
+@app.get("/reports/{vehicle_id}")
+async def report(
+        request: Request,
+        vehicle_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        direct: Optional[bool] = None,
+        lang: Optional[str] = None,
+        stream: bool = True):
+    """
+    Generate the report of a vehicle, optionally limited to events between `start` and `end`.
+
+    The SSE stream carries `progress` events with the text printed by the CLI, coalesced into
+    chunks, then a `done` event with the report size and timings, or an `error` event.
+    With `stream=false` the finished report is returned as JSON.
+    """
+    started = time.perf_counter()
+    limiter: anyio.CapacityLimiter = request.app.state.limiter
+    flow = new_flow(request, direct, lang)
+    run_args = dict(user_input=f"生成车辆编号为 {vehicle_id} 的驾驶行为报告", vehicle_id=vehicle_id, start=start, end=end)
+
+    if not stream:
+        async with limiter:
+            try:
+                result = await flow.run(**run_args)
+            except Exception as e:
+                record_request(False, "error", started)
+                logger.exception(f"Report of vehicle {vehicle_id} failed")
+                raise HTTPException(status_code=500, detail=str(e))
+        record_request(False, "ok", started)
+        return {"vehicle_id": vehicle_id, "report": str(result), "elapsed_sec": round(time.perf_counter() - started, 3)}
+
+    send_stream, receive_stream = anyio.create_memory_object_stream(int(os.getenv("REPORT_SSE_BUFFER", "16")))
+
+    async def produce():
+        status = "cancelled"
+        handler = None
+        async with send_stream, anyio.create_task_group() as tg:
+            coalescer = ChunkCoalescer(
+                send_stream,
+                min_chars=int(os.getenv("REPORT_SSE_MIN_CHARS", "256")),
+                max_delay=float(os.getenv("REPORT_SSE_MAX_DELAY", "0.05")),
+            )
+            # Sends held text, e.g. a tool result, without waiting for the next delta
+            tg.start_soon(coalescer.flush_on_timer)
+            try:
+                if limiter.available_tokens == 0:
+                    await send_stream.send(f"Waiting for a free slot ({limiter.borrowed_tokens} reports in progress)\n\n")
+                async with limiter:
+                    queued = time.perf_counter() - started
+                    handler = flow.run(**run_args)
+                    async for ev in handler.stream_events():
+                        if isinstance(ev, ProgressEvent):
+                            coalescer.push(ev.msg)
+                    result = str(await handler)
+                await coalescer.flush()
+                await send_stream.send(ServerSentEvent(event="done", data=json.dumps({
+                    "vehicle_id": vehicle_id,
+                    "report_chars": len(result),
+                    "queued_sec": round(queued, 3),
+                    "elapsed_sec": round(time.perf_counter() - started, 3),
+                    "chunks": coalescer.chunks,
+                    "deltas": coalescer.deltas,
+                })))
+                status = "ok"
+            except Exception as e:
+                status = "error"
+                logger.exception(f"Report of vehicle {vehicle_id} failed")
+                await coalescer.flush()
+                await send_stream.send(ServerSentEvent(event="error", data=json.dumps({"vehicle_id": vehicle_id, "error": str(e)})))
+            finally:
+                # The client went away or was too slow: stop the workflow instead of finishing a report nobody reads
+                if handler is not None and not handler.done():
+                    with anyio.CancelScope(shield=True):
+                        await handler.cancel_run()
+                record_request(True, status, started)
+                tg.cancel_scope.cancel()
+
+    async def events():
+        async with receive_stream:
+            async for item in receive_stream:
+                yield item if isinstance(item, ServerSentEvent) else ServerSentEvent(event="progress", data=item)
+
+    return EventSourceResponse(
+        events(),
+        data_sender_callable=produce,
+        ping=15,
+        # Disconnect clients that do not read for this long, which also cancels their report
+        send_timeout=float(os.getenv("REPORT_SSE_SEND_TIMEOUT", "30")),
+    )
+
+
+@app.get("/healthz")
+async def healthz(request: Request):
+    limiter: anyio.CapacityLimiter = request.app.state.limiter
+    return {
+        "status": "ok",
+        "in_progress": limiter.borrowed_tokens,
+        "waiting": limiter.statistics().tasks_waiting,
+        "concurrency": limiter.total_tokens,
+        "mcp_pool": get_mcp_tool_pool().stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    setup_environment()
+    parser = argparse.ArgumentParser(description="Driver behaviour report service")
+    parser.add_argument("--host", default=os.getenv("REPORT_SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("REPORT_SERVER_PORT", "8000")))
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,35 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from util import driver_behavior
+
+
+@pytest.fixture
+def event_store(tmp_path, monkeypatch):
+    """A process-wide event store rooted in a temporary directory, with no JSON data files."""
+    monkeypatch.setenv("VEHICLE_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setenv("VEHICLE_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(driver_behavior, "_store", None)
+    return driver_behavior.get_event_store()
+
+
+def make_event(time: str, type: str = "max_speed", speed="80km/h", location: str = "116.400000,39.900000") -> dict:
+    event = {"time": time, "type": type, "location": location}
+    if speed is not None:
+        event["speed"] = speed
+    return event
+
+
+class FakeTool:
+    """Stands in for a llama_index MCP tool: `fn(**kwargs)` returns the tool's text result or raises."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.calls = []
+
+    async def acall(self, **kwargs):
+        self.calls.append(kwargs)
+        result = self.fn(**kwargs)
+        return SimpleNamespace(content=result if isinstance(result, str) else json.dumps(result, ensure_ascii=False), raw_output=None)
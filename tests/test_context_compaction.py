@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from util.context_compaction import ContextBudget, compact_tool_output, dumps_compact, records_to_table
+
+
+def char_budget(max_tokens: int) -> ContextBudget:
+    # One token per character, so sizes are exact
+    return ContextBudget(max_tokens=max_tokens, tokenizer=list)
+
+
+def message(role: MessageRole, size: int, fill: str = "x") -> ChatMessage:
+    return ChatMessage(role=role, content="\n".join(fill * 9 for _ in range(size // 10)))
+
+
+def total(budget: ContextBudget, messages) -> int:
+    return sum(budget.count(m.content) for m in messages)
+
+
+def test_history_within_budget_is_untouched():
+    budget = char_budget(1000)
+    messages = [message(MessageRole.SYSTEM, 100), message(MessageRole.USER, 300), message(MessageRole.USER, 50)]
+    contents = [m.content for m in messages]
+    assert [m.content for m in budget.enforce(messages)] == contents
+    assert budget.trimmed_tokens == 0
+
+
+def test_largest_message_is_truncated_first():
+    budget = char_budget(1000)
+    system, prompt, data, final = (message(MessageRole.SYSTEM, 200), message(MessageRole.USER, 100),
+                                   message(MessageRole.USER, 2000), message(MessageRole.USER, 100))
+    trimmed = budget.enforce([system, prompt, data, final])
+    assert [m.content for m in trimmed[:2]] + [trimmed[3].content] == [system.content, prompt.content, final.content]
+    assert "tokens omitted" in trimmed[2].content
+    assert total(budget, trimmed) <= 1000
+
+
+def test_final_prompt_survives_an_oversized_system_prompt():
+    budget = char_budget(1000)
+    system, data, final = message(MessageRole.SYSTEM, 1500), message(MessageRole.USER, 800), message(MessageRole.USER, 300, "y")
+    trimmed = budget.enforce([system, data, final])
+    assert trimmed[2].content == final.content
+    assert "tokens omitted" in trimmed[0].content and "tokens omitted" in trimmed[1].content
+    assert budget.count(trimmed[0].content) <= 700
+    assert total(budget, trimmed) <= 1000 + budget.count(trimmed[1].content)
+
+
+def test_fit_table_samples_evenly():
+    budget = char_budget(200)
+    table = {"columns": ["time", "type"], "rows": [[f"2024-03-{day:02d}", "max_speed"] for day in range(1, 31)]}
+    fitted = budget.fit_table(table, 200)
+    assert budget.count(dumps_compact(fitted)) <= 200
+    assert fitted["omitted"] == 30 - len(fitted["rows"])
+    assert fitted["rows"][0][0] == "2024-03-01" and fitted["rows"][-1][0] >= "2024-03-20"
+
+
+def test_compact_tool_output():
+    events = {"data": [{"time": "t1", "type": "max_speed", "speed": "90km/h"}, {"time": "t2", "type": "max_speed"}]}
+    assert compact_tool_output("query_vehicle_driving_behaviour_data", events) == {
+        "columns": ["time", "type", "speed"], "rows": [["t1", "max_speed", "90km/h"], ["t2", "max_speed", None]],
+    }
+    weather = {"error_code": 0, "result": {"day_weather": "晴", "day_temp": "5℃", "sunrise": "06:30"}}
+    compacted = compact_tool_output("query_history_weather_by_city_id_and_date", weather, {"city_id": "3", "date_to_query": "2024-03-01"})
+    assert compacted["day_weather"] == "晴" and "sunrise" not in compacted
+    assert records_to_table([]) == {"columns": [], "rows": []}
@@ -0,0 +1,24 @@
+from util.disk_cache import DiskCache
+
+
+def test_replacing_a_key_does_not_grow_the_cache(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_entries=3)
+    for _ in range(5):
+        cache.put("a", "1")
+    cache.put("a", "2")
+    assert cache.get("a") == "2"
+    assert cache.stats()["entries"] == 1
+    assert cache.evictions == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    # The size is recounted from the database on open
+    assert len(DiskCache(cache.path, max_entries=2)) == 2
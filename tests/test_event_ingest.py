@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+from util.driver_behavior import query_driver_behavior_data
+from util.event_ingest import EventIngestor
+
+from conftest import make_event
+
+
+def test_flush_writes_and_aggregates(event_store):
+    ingestor = EventIngestor(store=event_store)
+    ingestor.ingest("00001", [make_event("2024-03-01 00:00:01", speed="90km/h"), make_event("2024-03-01 00:00:00", "sudden_acceleration")])
+    assert ingestor.flush() == 2
+    assert event_store.count("00001") == 2
+    aggregates = ingestor.aggregates("00001")
+    assert aggregates["events"] == 2
+    assert aggregates["max_speed_kmh"] == 90
+    assert aggregates["by_type"] == {"max_speed": 1, "sudden_acceleration": 1}
+
+
+def test_invalid_vehicle_id_is_rejected_alone(event_store):
+    ingestor = EventIngestor(store=event_store)
+    event = make_event("2024-03-01 00:00:00")
+    ingestor.ingest("00001", [event])
+    ingestor.ingest("bad id!", [event, event])
+    ingestor.ingest("00002", [event])
+    assert ingestor.flush() == 2
+    assert event_store.vehicles() == ["00001", "00002"]
+    stats = ingestor.stats()
+    assert stats["rejected_total"] == 2
+    assert stats["buffered"] == 0
+
+
+def test_malformed_events_are_dropped(event_store):
+    ingestor = EventIngestor(store=event_store)
+    ingestor.ingest("00001", [make_event("2024-03-01 00:00:00"), make_event("2024-03-01 00:00:01", "drifting"), {"time": "x"}])
+    assert ingestor.flush() == 1
+    assert ingestor.stats()["rejected_total"] == 2
+
+
+def test_failed_vehicle_is_kept_for_the_next_flush(event_store, monkeypatch):
+    ingestor = EventIngestor(store=event_store)
+    append = event_store.append
+
+    def failing_append(vehicle_id, events):
+        if vehicle_id == "00001":
+            raise OSError("No space left on device")
+        return append(vehicle_id, events)
+
+    monkeypatch.setattr(event_store, "append", failing_append)
+    ingestor.ingest("00001", [make_event("2024-03-01 00:00:00")])
+    ingestor.ingest("00002", [make_event("2024-03-01 00:00:00")])
+    assert ingestor.flush() == 1
+    assert ingestor.stats()["buffered"] == 1
+
+    monkeypatch.setattr(event_store, "append", append)
+    assert ingestor.flush() == 1
+    assert event_store.vehicles() == ["00001", "00002"]
+
+
+def test_ingested_events_survive_a_newer_json_file(event_store, tmp_path):
+    json_path = tmp_path / "data" / "vehicle_00001.json"
+    json_path.parent.mkdir()
+    json_path.write_text(json.dumps({"data": [make_event("2024-03-01 00:00:00")]}))
+    ingestor = EventIngestor(store=event_store)
+    ingestor.ingest("00001", [make_event("2024-03-02 00:00:00")])
+    assert ingestor.flush() == 1
+
+    # A deploy or checkout touching the JSON must not drop the ingested event
+    later = time.time() + 60
+    os.utime(json_path, (later, later))
+    assert len(query_driver_behavior_data("00001")["data"]) == 2
+    assert ingestor.aggregates("00001")["events"] == 2
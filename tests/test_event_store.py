@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from util.event_store import RECORD, decode_event, encode_event, parse_event_time
+
+from conftest import make_event
+
+
+def test_record_round_trip():
+    event = make_event("2024-03-01 08:15:30", "sudden_deceleration", "42.5km/h", "121.473700,31.230400")
+    assert decode_event(*RECORD.unpack(encode_event(event))) == event
+
+
+def test_record_without_speed():
+    event = make_event("2024-03-01 08:15:30", "sudden_acceleration", speed=None)
+    assert decode_event(*RECORD.unpack(encode_event(event))) == event
+
+
+def test_encode_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        encode_event(make_event("2024-03-01 08:15:30", "drifting"))
+
+
+def test_end_of_day():
+    assert parse_event_time("2024-03-01", end_of_day=True) - parse_event_time("2024-03-01") == 86399
+    assert parse_event_time("2024-03-01 10:00:00", end_of_day=True) == parse_event_time("2024-03-01 10:00:00")
+
+
+def test_build_sorts_and_queries_ranges(event_store):
+    events = [make_event(f"2024-03-{day:02d} 12:00:00") for day in (5, 1, 3, 2, 4)]
+    assert event_store.build("00001", events) == 5
+
+    assert [e["time"][:10] for e in event_store.query("00001")] == [f"2024-03-0{d}" for d in range(1, 6)]
+    # Both bounds are inclusive, a date-only end covers the whole day
+    assert [e["time"][:10] for e in event_store.query("00001", "2024-03-02", "2024-03-04")] == ["2024-03-02", "2024-03-03", "2024-03-04"]
+    assert event_store.count("00001", "2024-03-02 12:00:00", "2024-03-02 12:00:00") == 1
+    assert event_store.count("00001", start="2024-03-06") == 0
+    assert event_store.count("00001", end="2024-02-28") == 0
+    assert event_store.count("00001") == 5
+
+
+def test_query_filters_types_and_limit(event_store):
+    types = ["max_speed", "sudden_acceleration", "sudden_deceleration"]
+    event_store.build("00001", [make_event(f"2024-03-01 00:00:{i:02d}", types[i % 3]) for i in range(9)])
+    assert len(event_store.query("00001", types=["sudden_acceleration"])) == 3
+    assert len(event_store.query("00001", limit=4)) == 4
+    with pytest.raises(ValueError):
+        event_store.query("00001", types=["drifting"])
+
+
+def test_append_in_order_and_backfill(event_store):
+    event_store.build("00001", [make_event("2024-03-02 00:00:00")])
+    assert event_store.append("00001", [make_event("2024-03-03 00:00:00")]) == 1
+    # Reaching back before the last stored event merges instead of appending
+    assert event_store.append("00001", [make_event("2024-03-01 00:00:00")]) == 1
+    assert [e["time"][:10] for e in event_store.query("00001")] == ["2024-03-01", "2024-03-02", "2024-03-03"]
+    assert event_store.count("00001", "2024-03-02", "2024-03-03") == 2
+
+
+def test_append_creates_vehicle(event_store):
+    assert not event_store.has_vehicle("00002")
+    event_store.append("00002", [make_event("2024-03-01 00:00:00")])
+    assert event_store.vehicles() == ["00002"]
+
+
+def test_record_slice_matches_query(event_store):
+    event_store.build("00001", [make_event(f"2024-03-01 00:00:{i:02d}", speed=f"{i}km/h") for i in range(10)])
+    records = np.frombuffer(event_store.record_slice("00001", "2024-03-01 00:00:03", "2024-03-01 00:00:06"), dtype=np.dtype([
+        ("time", "<i8"), ("type", "u1"), ("pad", "V3"), ("speed", "<f4"), ("lng", "<f8"), ("lat", "<f8"),
+    ]))
+    assert records["speed"].tolist() == [3, 4, 5, 6]
+
+
+def test_unknown_and_invalid_vehicles(event_store):
+    with pytest.raises(ValueError, match="not found"):
+        event_store.query("00009")
+    with pytest.raises(ValueError, match="Invalid vehicle id"):
+        event_store.path("../etc/passwd")
@@ -0,0 +1,48 @@
+import anyio
+import pytest
+
+pytest.importorskip("mcp.client.mqtt")
+
+import fleet
+from fleet import parse_vehicle_ids
+
+
+def test_ranges_keep_zero_padding():
+    assert parse_vehicle_ids("00008-00011") == ["00008", "00009", "00010", "00011"]
+
+
+def test_lists_ranges_and_duplicates():
+    assert parse_vehicle_ids("00001, 00003-00004,00001,") == ["00001", "00003", "00004"]
+
+
+@pytest.mark.parametrize("spec", ["truck-7", "A1-B2", "2024-03-001", "12-345", "-5", "00001-"])
+def test_ids_with_dashes_are_not_ranges(spec):
+    assert parse_vehicle_ids(spec) == [spec]
+
+
+def test_id_file(tmp_path):
+    path = tmp_path / "ids.txt"
+    path.write_text("00001\n\ntruck-7\n", encoding="utf-8")
+    assert parse_vehicle_ids(f"@{path}") == ["00001", "truck-7"]
+
+
+@pytest.mark.parametrize("spec", ["00011-00008", "", " , ", "00011-00008,00001"])
+def test_reversed_ranges_and_empty_lists_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_vehicle_ids(spec)
+
+
+def test_empty_id_file_is_rejected(tmp_path):
+    path = tmp_path / "ids.txt"
+    path.write_text("\n\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="No vehicle IDs"):
+        parse_vehicle_ids(f"@{path}")
+
+
+def test_cli_reports_a_reversed_range(monkeypatch, capsys):
+    monkeypatch.setattr(fleet, "setup_environment", lambda: None)
+    monkeypatch.setattr("sys.argv", ["fleet.py", "00011-00008"])
+    with pytest.raises(SystemExit) as exit_info:
+        anyio.run(fleet.main)
+    assert exit_info.value.code == 2
+    assert "reversed" in capsys.readouterr().err
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from conftest import make_event
+from util import geo_cluster
+from util.geo_cluster import METERS_PER_DEGREE, GridClusterIndex, cluster_vehicle_locations, haversine_m
+
+
+def offset(lng: float, lat: float, east_m: float, north_m: float):
+    return lng + east_m / (METERS_PER_DEGREE * math.cos(math.radians(lat))), lat + north_m / METERS_PER_DEGREE
+
+
+def test_points_within_the_radius_collapse():
+    index = GridClusterIndex(200)
+    assert index.add(116.4, 39.9) == 0
+    for east, north in ((150, 0), (-150, 0), (0, 190), (0, -190), (100, 100), (-120, -120)):
+        assert index.add(*offset(116.4, 39.9, east, north)) == 0
+    assert index.add(*offset(116.4, 39.9, 450, 0)) == 1
+    assert len(index.anchors) == 2
+
+
+@pytest.mark.parametrize("lat", [0.0, 39.9, 60.0])
+def test_points_across_cell_boundaries_merge(lat):
+    index = GridClusterIndex(200)
+    # Just west of a cell boundary, then 150 m east of it at this latitude
+    boundary = 700 * index.cell_deg
+    west = (boundary - 1e-9, lat)
+    east = offset(*west, 150, 0)
+    assert index._cell(*west) != index._cell(*east)
+    assert haversine_m(*west, *east) < 200
+    assert index.add(*west) == index.add(*east) == 0
+    # And across a latitude boundary
+    south = (boundary / 2, 300 * index.cell_deg - 1e-9)
+    north = offset(*south, 0, 150)
+    assert index._cell(*south)[1] != index._cell(*north)[1]
+    assert index.add(*south) == index.add(*north) == 1
+
+
+def test_collapse_ratio_of_a_vehicle(event_store, monkeypatch):
+    monkeypatch.setattr(geo_cluster, "_metrics", {"points": 0, "clusters": 0, "calls": 0})
+    sites = [(116.4, 39.9), (116.45, 39.92), (117.2, 39.13)]
+    events = []
+    for day, (lng, lat) in enumerate(sites, start=1):
+        for i in range(10):
+            location = "{:.6f},{:.6f}".format(*offset(lng, lat, 10 * i, -5 * i))
+            events.append(make_event(f"2024-03-{day:02d} 08:{i:02d}:00", location=location))
+    event_store.build("00001", events)
+
+    result = cluster_vehicle_locations("00001", radius_m=200)
+    assert result["events"] == 30
+    assert [cluster["events"] for cluster in result["clusters"]] == [10, 10, 10]
+    assert result["collapse_ratio"] == 10.0
+    assert result["clusters"][2]["dates"] == ["2024-03-03"]
+    assert result["totals"] == {"points": 30, "clusters": 3, "calls": 1, "collapse_ratio": 10.0}
@@ -0,0 +1,118 @@
+from contextlib import AsyncExitStack, asynccontextmanager
+
+import anyio
+import pytest
+
+pytest.importorskip("mcp.client.mqtt")
+
+from mcp import types
+
+from util import mcp_pool
+from util.mcp_pool import McpToolPool
+
+
+class FakeSession:
+    def __init__(self):
+        self.fail = False
+
+    async def list_tools(self):
+        if self.fail:
+            raise ConnectionError("session lost")
+        return types.ListToolsResult(tools=[types.Tool(name="ping", description="Ping", inputSchema={"type": "object", "properties": {}})])
+
+
+@asynccontextmanager
+async def background_tasks():
+    # Like the MQTT transport: a task group that must be exited by the task that entered it
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(anyio.sleep_forever)
+        yield
+        tg.cancel_scope.cancel()
+
+
+class FakeMqttClient:
+    instances = []
+    connect_delay = 0
+
+    def __init__(self, **kwargs):
+        self.exit_stack = AsyncExitStack()
+        self.session = FakeSession()
+        self.closed = False
+        self.on_server_added = kwargs["on_server_added"]
+        FakeMqttClient.instances.append(self)
+
+    async def connect(self):
+        await self.exit_stack.enter_async_context(background_tasks())
+        await anyio.sleep(self.connect_delay)
+
+    async def aclose(self):
+        await self.exit_stack.aclose()
+        self.closed = True
+
+    def named_sessions(self):
+        return [("sdv/test", self.session)]
+
+    def server_stats(self):
+        return []
+
+
+@pytest.fixture
+def fake_mqtt(monkeypatch):
+    FakeMqttClient.instances = []
+    FakeMqttClient.connect_delay = 0
+    monkeypatch.setattr(mcp_pool, "MQTTMCPClient", FakeMqttClient)
+    return FakeMqttClient
+
+
+SERVERS = [{"command_or_url": "mqtt://localhost:1883", "args": []}]
+
+
+def test_aclose_closes_the_connection(fake_mqtt):
+    async def main():
+        pool = McpToolPool(SERVERS)
+        assert [tool.metadata.name for tool in await pool.get_tools()] == ["ping"]
+        await pool.aclose()
+
+    anyio.run(main)
+    assert [client.closed for client in fake_mqtt.instances] == [True]
+
+
+def test_connect_timeout_closes_the_client(fake_mqtt):
+    fake_mqtt.connect_delay = 10
+
+    async def main():
+        pool = McpToolPool(SERVERS, connect_timeout=0.1)
+        with pytest.raises(RuntimeError, match="No MCP server"):
+            await pool.get_tools()
+        assert pool.stats()["servers"]["mqtt://localhost:1883"]["healthy"] is False
+
+    anyio.run(main)
+    assert [client.closed for client in fake_mqtt.instances] == [True]
+
+
+def test_reconnect_closes_the_old_client(fake_mqtt):
+    async def main():
+        pool = McpToolPool(SERVERS, health_check_interval=0)
+        await pool.get_tools()
+        fake_mqtt.instances[0].session.fail = True
+        assert [tool.metadata.name for tool in await pool.get_tools()] == ["ping"]
+        assert pool.stats()["reconnects"] == 1
+        await pool.aclose()
+
+    anyio.run(main)
+    assert [client.closed for client in fake_mqtt.instances] == [True, True]
+
+
+def test_late_servers_do_not_duplicate_tools(fake_mqtt):
+    async def main():
+        pool = McpToolPool(SERVERS)
+        await pool.get_tools()
+        client = fake_mqtt.instances[0]
+        # The server restarts, and another server offers a tool of the same name
+        await client.on_server_added("sdv/test", FakeSession())
+        await client.on_server_added("sdv/other", FakeSession())
+        assert [tool.metadata.name for tool in await pool.get_tools()] == ["ping"]
+        assert sorted(pool._entries["mqtt://localhost:1883"]["clients"]) == ["sdv/other", "sdv/test"]
+        await pool.aclose()
+
+    anyio.run(main)
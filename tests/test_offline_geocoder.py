@@ -0,0 +1,90 @@
+import json
+import asyncio
+
+import pytest
+
+from util.enrichment import enrich_vehicle_events
+from util.offline_geocoder import OfflineGeocoder, get_offline_geocoder
+from util.region_index import normalize_region_name
+
+from conftest import FakeTool, make_event
+
+
+def test_locate_bundled_centroids():
+    geocoder = get_offline_geocoder()
+    city, distance_km, error = geocoder.locate(116.397, 39.909)
+    assert (city["province"], city["city"], error) == ("北京", "北京", None)
+    assert distance_km < 2
+    # Langfang, Hebei: 38 km from Beijing's Daxing centroid, nearer than any Hebei centroid
+    city, _, error = geocoder.locate(116.70, 39.52)
+    assert city is None and "No known city" in error
+
+
+@pytest.fixture
+def border_geocoder(tmp_path):
+    path = tmp_path / "centroids.json"
+    path.write_text(json.dumps({"cities": [
+        {"province": "甲", "city": "东", "lng": 0.0, "lat": 0.0},
+        {"province": "甲", "city": "东郊", "parent": "东", "lng": 0.05, "lat": 0.0},
+        {"province": "乙", "city": "西", "lng": 0.3, "lat": 0.0},
+    ]}), encoding="utf-8")
+    return OfflineGeocoder(str(path))
+
+
+def test_locate_requires_a_clear_margin(border_geocoder):
+    # 2.2 km from 东郊, 31 km from 西
+    city, _, error = border_geocoder.locate(0.07, 0.0)
+    assert city["city"] == "东郊" and error is None
+    # 7.8 km from 东郊, 20 km from 西
+    assert border_geocoder.locate(0.12, 0.0)[0]["city"] == "东郊"
+    # 13.3 km from 东郊, 14.5 km from 西
+    city, _, error = border_geocoder.locate(0.17, 0.0)
+    assert city is None and error.startswith("Ambiguous location")
+
+
+def test_districts_of_one_city_are_not_ambiguous(border_geocoder):
+    # Halfway between 东 and its district 东郊: both are the weather city 东
+    assert border_geocoder.locate(0.025, 0.0)[0]["province"] == "甲"
+
+
+def test_enrichment_falls_back_to_online_geocoding():
+    events = [make_event("2024-03-01 08:00:00", location="116.400000,39.900000"), make_event("2024-03-01 09:00:00", location="116.700000,39.520000")]
+
+    def cities(locations):
+        return {"cities": [
+            {"location": loc, "province": "北京", "city": "北京", "city_id": "3"} if loc.startswith("116.4")
+            else {"location": loc, "error": "No known city within 25 km"}
+            for loc in locations
+        ]}
+
+    def city_id(province_id, city_name):
+        if normalize_region_name(city_name) != "廊坊":
+            raise ValueError(f"City '{city_name}' cannot be found")
+        return "1201"
+
+    def weather(queries):
+        return {"columns": ["city_id", "date", "day_weather"], "rows": [[q["city_id"], q["date"], "晴"] for q in queries]}
+
+    tools = {
+        "query_vehicle_driving_behaviour_data": FakeTool(lambda vehicle_id: {"data": events}),
+        "query_city_ids_by_locations": FakeTool(cities),
+        "query_history_weather_batch": FakeTool(weather),
+        "maps_regeocode": FakeTool(lambda location: {"province": "河北省", "city": "廊坊市", "district": "广阳区"}),
+        "query_by_province_id": FakeTool(lambda province: "10"),
+        "query_by_city_id": FakeTool(city_id),
+    }
+    result = asyncio.run(enrich_vehicle_events(tools, "00001"))
+    assert [row[3:6] for row in result["events"]["rows"]] == [["北京", "北京", "晴"], ["河北省", "廊坊市", "晴"]]
+    assert result["unresolved"] == {"location": 0, "weather": 0}
+    assert tools["maps_regeocode"].calls == [{"location": "116.700000,39.520000"}]
+
+
+def test_enrichment_keeps_location_unresolved_without_map_service():
+    events = [make_event("2024-03-01 09:00:00", location="116.700000,39.520000")]
+    tools = {
+        "query_vehicle_driving_behaviour_data": FakeTool(lambda vehicle_id: {"data": events}),
+        "query_city_ids_by_locations": FakeTool(lambda locations: {"cities": [{"location": loc, "error": "x"} for loc in locations]}),
+        "query_history_weather_batch": FakeTool(lambda queries: {"columns": [], "rows": []}),
+    }
+    result = asyncio.run(enrich_vehicle_events(tools, "00001"))
+    assert result["unresolved"] == {"location": 1, "weather": 1}
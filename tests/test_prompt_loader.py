@@ -0,0 +1,63 @@
+import json
+import os
+import time
+
+import pytest
+
+from util.prompt_loader import PromptRegistry, validate_template
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    for lang, text in (("en", "Report on {ev.vehicle_id}"), ("zh", "车辆 {ev.vehicle_id} 的报告"), ("ja", "{ev.vehicle_id} のレポート")):
+        (tmp_path / lang).mkdir()
+        (tmp_path / lang / "system.txt").write_text(text, encoding="utf-8")
+        (tmp_path / lang / "data_analysis.json").write_text(json.dumps({"gen_report": text}), encoding="utf-8")
+    return tmp_path
+
+
+def edit(path, text: str):
+    path.write_text(text, encoding="utf-8")
+    # Some filesystems keep the mtime within one write of the load
+    later = time.time() + 10
+    os.utime(path, (later, later))
+
+
+def test_validate_template_accepts_only_ev_placeholders():
+    assert validate_template("{ev.user_input} {ev[start]} {{literal}}", "t") == ["ev.user_input", "ev[start]"]
+    with pytest.raises(ValueError, match="Unsupported placeholder"):
+        validate_template("{vehicle_id}", "t")
+    with pytest.raises(ValueError, match="Malformed"):
+        validate_template("{ev.vehicle_id", "t")
+
+
+def test_invalid_placeholder_fails_at_startup(prompts):
+    (prompts / "en" / "data_analysis.json").write_text(json.dumps({"gen_report": "Report on {vehicle}"}), encoding="utf-8")
+    with pytest.raises(ValueError, match="Unsupported placeholder"):
+        PromptRegistry(str(prompts))
+
+
+def test_edited_file_is_reloaded_after_the_interval(prompts):
+    registry = PromptRegistry(str(prompts), reload_interval=0.05)
+    version = registry.version("system.txt", "en")
+    edit(prompts / "en" / "system.txt", "New report on {ev.vehicle_id}")
+    # Within the interval the file is not even checked
+    assert registry.get("system.txt", "en") == "Report on {ev.vehicle_id}"
+    time.sleep(0.1)
+    assert registry.get("system.txt", "en") == "New report on {ev.vehicle_id}"
+    assert registry.version("system.txt", "en") != version
+
+
+def test_invalid_reload_keeps_the_last_good_version(prompts):
+    registry = PromptRegistry(str(prompts), reload_interval=0)
+    edit(prompts / "zh" / "system.txt", "车辆 {vehicle_id}")
+    assert registry.get("system.txt", "zh") == "车辆 {ev.vehicle_id} 的报告"
+    edit(prompts / "zh" / "system.txt", "车辆 {ev.vehicle_id}")
+    assert registry.get("system.txt", "zh") == "车辆 {ev.vehicle_id}"
+
+
+def test_languages_follow_the_prompt_directories(prompts):
+    registry = PromptRegistry(str(prompts))
+    assert registry.get("system.txt", "JA") == "{ev.vehicle_id} のレポート"
+    assert registry.get("system.txt", "fr") == "Report on {ev.vehicle_id}"
+    assert registry.get("data_analysis.json", "zh") == {"gen_report": "车辆 {ev.vehicle_id} 的报告"}
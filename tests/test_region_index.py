@@ -0,0 +1,53 @@
+import json
+import asyncio
+
+import pytest
+
+from util.region_index import RegionIndex, normalize_region_name
+
+
+@pytest.fixture
+def regions(tmp_path):
+    province_file = tmp_path / "province_ids.json"
+    province_file.write_text(json.dumps({"provinces": [{"id": "3", "province": "北京"}, {"id": "10", "province": "河北"}]}), encoding="utf-8")
+    fetched = []
+
+    async def fetch_cities(province_id):
+        fetched.append(province_id)
+        await asyncio.sleep(0.01)
+        return [{"id": "1001", "city_name": "海淀", "province": "北京"}, {"id": "1002", "city_name": "延庆"}]
+
+    index = RegionIndex(str(province_file), str(tmp_path / "cities"), fetch_cities)
+    index.fetched = fetched
+    return index
+
+
+def test_normalize_region_name():
+    assert normalize_region_name("北京市") == "北京"
+    assert normalize_region_name("新疆维吾尔自治区") == "新疆"
+    assert normalize_region_name("海淀区") == "海淀"
+
+
+def test_province_id(regions):
+    assert regions.province_id("北京市") == "3"
+    with pytest.raises(ValueError):
+        regions.province_id("火星")
+
+
+def test_cities_are_fetched_once_and_persisted(regions, tmp_path):
+    async def lookups():
+        return await asyncio.gather(*(regions.city_id("3", name) for name in ("北京市海淀区", "延庆县", "海淀")))
+
+    assert asyncio.run(lookups()) == ["1001", "1002", "1001"]
+    assert regions.fetched == ["3"]
+    assert json.loads((tmp_path / "cities" / "3.json").read_text(encoding="utf-8")) == [
+        {"id": "1001", "city_name": "海淀"}, {"id": "1002", "city_name": "延庆"},
+    ]
+
+
+@pytest.mark.parametrize("province_id", ["99", "../../etc/passwd", "3/../3", ""])
+def test_unknown_province_id_is_rejected(regions, tmp_path, province_id):
+    with pytest.raises(ValueError, match="Unknown province_id"):
+        asyncio.run(regions.city_id(province_id, "海淀"))
+    assert regions.fetched == []
+    assert not (tmp_path / "cities").exists()
@@ -0,0 +1,37 @@
+import pytest
+
+from util import report_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_cache, "_report_cache", None)
+    monkeypatch.setenv("REPORT_CACHE_PATH", str(tmp_path / "reports.sqlite"))
+    monkeypatch.delenv("REPORT_CACHE", raising=False)
+
+
+def test_replay_chunks_rebuild_the_report():
+    report = "驾驶行为报告\n" * 50
+    chunks = list(report_cache.replay_chunks(report, chunk_size=64))
+    assert "".join(chunks) == report
+    assert max(len(chunk) for chunk in chunks) == 64
+
+
+def test_key_depends_on_messages_model_and_options():
+    history = [{"role": "system", "content": "s"}, {"role": "user", "content": "u"}]
+    key = report_cache.report_cache_key(history, model="m", temperature=0.1)
+    assert key == report_cache.report_cache_key([dict(m) for m in history], model="m", temperature=0.1)
+    assert key != report_cache.report_cache_key(history, model="n", temperature=0.1)
+    assert key != report_cache.report_cache_key(history, model="m", temperature=0.2)
+    assert key != report_cache.report_cache_key(history[:1], model="m", temperature=0.1)
+
+
+def test_store_and_lookup(cache, monkeypatch):
+    assert report_cache.cached_report("k") is None
+    report_cache.store_report("k", "report")
+    assert report_cache.cached_report("k") == "report"
+    # Empty reports are never cached, and the cache can be switched off
+    report_cache.store_report("empty", "")
+    assert report_cache.cached_report("empty") is None
+    monkeypatch.setenv("REPORT_CACHE", "0")
+    assert report_cache.cached_report("k") is None
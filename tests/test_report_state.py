@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from conftest import FakeTool, make_event
+from util.behavior_features import frame_from_events, summarize_events, summary_from_aggregates, update_aggregates
+from util.enrichment import enrich_vehicle_events
+from util.report_state import ReportStateStore, StaleReportState
+
+
+def history(days: int = 3) -> list:
+    events = []
+    for day in range(1, days + 1):
+        for minute in (0, 2, 4, 30, 31, 33, 90):
+            events.append(make_event(f"2024-03-{day:02d} {8 + minute // 60:02d}:{minute % 60:02d}:00", speed=f"{60 + 7 * minute % 80}km/h"))
+        events.append(make_event(f"2024-03-{day:02d} 12:00:00", type="sudden_acceleration", speed=None))
+    return events
+
+
+class Source:
+    """Vehicle data, city and weather tools over a mutable event list."""
+
+    def __init__(self, events: list):
+        self.events = events
+        self.unresolvable = set()
+        self.tools = {
+            "query_vehicle_driving_behaviour_data": FakeTool(self.data),
+            "query_vehicle_event_count": FakeTool(self.count),
+            "query_city_ids_by_locations": FakeTool(self.cities),
+            "query_history_weather_batch": FakeTool(self.weather),
+        }
+
+    def data(self, vehicle_id, start=None):
+        return {"data": [e for e in self.events if start is None or e["time"] >= start]}
+
+    def count(self, vehicle_id, end):
+        return {"events": sum(1 for e in self.events if e["time"] <= end)}
+
+    def cities(self, locations):
+        return {"cities": [
+            {"location": loc, "error": "x"} if loc in self.unresolvable else {"location": loc, "province": "北京", "city": "北京", "city_id": "3"}
+            for loc in locations
+        ]}
+
+    def weather(self, queries):
+        return {"columns": ["city_id", "date", "day_weather"], "rows": [[q["city_id"], q["date"], "晴"] for q in queries]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStateStore(str(tmp_path / "state.sqlite"))
+
+
+def test_folded_aggregates_match_the_full_summary():
+    events = history()
+    aggregates = None
+    # Split inside a burst and between events with the same time
+    for chunk in (events[:2], events[2:9], events[9:10], events[10:]):
+        aggregates = update_aggregates(aggregates, frame_from_events(chunk))
+    assert summary_from_aggregates(aggregates) == summarize_events(frame_from_events(events))
+
+
+def test_incremental_report_matches_a_full_one(store):
+    events = history()
+    source = Source(events[:10])
+    asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    source.events = events
+    result = asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    full = asyncio.run(enrich_vehicle_events(Source(events).tools, "00001"))
+
+    assert result["incremental"]["new_events"] == len(events) - 10
+    assert result["events"]["rows"] == full["events"]["rows"]
+    assert result["summary"] == {"vehicle_id": "00001", **summarize_events(frame_from_events(events))}
+
+
+def test_concurrent_reports_count_new_events_once(store):
+    events = history()
+    source = Source(events[:10])
+    asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    source.events = events
+
+    async def both():
+        return await asyncio.gather(*(enrich_vehicle_events(source.tools, "00001", state_store=store) for _ in range(2)))
+
+    for result in asyncio.run(both()):
+        assert result["summary"]["events"] == len(events)
+        assert len(result["events"]["rows"]) == len(events)
+    assert store.load("00001")["events"] == len(events)
+    assert len(store.rows("00001")) == len(events)
+
+
+def test_save_refuses_a_stale_state(store):
+    state = {"last_time": "2024-03-01 08:00:00", "at_last_time": 1, "events": 1, "aggregates": {}, "unresolved": {"location": 0, "weather": 0}}
+    store.save("00001", state, [["row"]])
+    with pytest.raises(StaleReportState):
+        store.save("00001", {**state, "events": 2}, [["row"]], expected=None)
+    with pytest.raises(StaleReportState):
+        store.save("00001", {**state, "events": 2}, [["row"]], expected={**state, "events": 0})
+    assert store.save("00001", {**state, "events": 2}, [["row"]], expected=state) == [["row"], ["row"]]
+
+
+def test_unresolved_rows_are_enriched_again(store):
+    events = history(1)
+    offshore = "122.000000,30.000000"
+    events[3]["location"] = offshore
+    source = Source(events)
+    source.unresolvable.add(offshore)
+    first = asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    assert first["unresolved"] == {"location": 1, "weather": 1}
+    assert first["events"]["rows"][3][4] is None
+
+    # Still unresolved: the row stays pending and is not counted twice
+    again = asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    assert again["unresolved"] == {"location": 1, "weather": 1}
+
+    source.unresolvable.clear()
+    source.events = events + [make_event("2024-03-01 20:00:00")]
+    resolved = asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    assert resolved["unresolved"] == {"location": 0, "weather": 0}
+    assert resolved["events"]["rows"][3][3:6] == ["北京", "北京", "晴"]
+    assert len(resolved["events"]["rows"]) == len(events) + 1
+    assert store.pending("00001") == []
+
+    calls = len(source.tools["query_city_ids_by_locations"].calls)
+    asyncio.run(enrich_vehicle_events(source.tools, "00001", state_store=store))
+    assert len(source.tools["query_city_ids_by_locations"].calls) == calls
@@ -0,0 +1,38 @@
+import os
+
+import anyio
+import pytest
+
+pytest.importorskip("mcp.client.mqtt")
+
+import app as app_module
+import server
+
+
+class FakePool:
+    def __init__(self):
+        self.closed = False
+
+    async def get_tools(self):
+        return []
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_lifespan_sets_up_the_environment(monkeypatch):
+    # As under `uvicorn server:app`, where `__main__` never runs
+    monkeypatch.setattr(app_module, "_environment_ready", False)
+    monkeypatch.setenv("REPORT_SERVER_TEST_SETTING", "")
+    monkeypatch.setattr("dotenv.load_dotenv", lambda: monkeypatch.setenv("REPORT_SERVER_TEST_SETTING", "from .env"))
+    pool = FakePool()
+    monkeypatch.setattr(server, "get_mcp_tool_pool", lambda: pool)
+    monkeypatch.setattr(server, "create_llm", lambda: "llm")
+
+    async def main():
+        async with server.lifespan(server.app):
+            assert os.environ["REPORT_SERVER_TEST_SETTING"] == "from .env"
+            assert app_module._environment_ready
+
+    anyio.run(main)
+    assert pool.closed
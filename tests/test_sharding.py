@@ -0,0 +1,84 @@
+import json
+from types import SimpleNamespace
+from typing import Optional
+
+import anyio
+import pytest
+from llama_index.core.tools import ToolMetadata
+from pydantic import BaseModel
+
+from util.enrichment import tool_output_json
+from util.sharding import route_sharded_tools, shard_of, shard_server_name
+
+
+class VehicleArgs(BaseModel):
+    vehicle_id: str
+
+
+class NoArgs(BaseModel):
+    pass
+
+
+class ShardTool:
+    """An MCP tool of one server, answering `{"served_by": ...}` or an MCP error result."""
+
+    def __init__(self, name: str, server: str, fn_schema=VehicleArgs, error: Optional[str] = None):
+        self.metadata = ToolMetadata(name=name, description=name, fn_schema=fn_schema)
+        self.server = server
+        self.error = error
+
+    async def acall(self, **kwargs):
+        text = self.error or json.dumps({"served_by": self.server, **kwargs})
+        return SimpleNamespace(content=text, raw_output=SimpleNamespace(content=[SimpleNamespace(text=text)], isError=self.error is not None))
+
+
+def shards(name: str, count: int, fn_schema=VehicleArgs, **errors):
+    servers = [shard_server_name("sdv/devices/vehicle", index, count) for index in range(count)]
+    return [(server, ShardTool(name, server, fn_schema, errors.get(f"shard{index}"))) for index, server in enumerate(servers)]
+
+
+def call(tool, **kwargs):
+    async def main():
+        return await tool.acall(**kwargs)
+    return anyio.run(main)
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert shard_of("00001", 4) == shard_of("00001", 4)
+    assert {shard_of(f"{i:05d}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_vehicle_tools_are_routed_to_the_owning_shard():
+    (router,) = route_sharded_tools(shards("query_vehicle_driving_behaviour_data", 3))
+    for vehicle_id in ("00001", "00002", "00003"):
+        result = tool_output_json(call(router, vehicle_id=vehicle_id))
+        assert result["served_by"].endswith(f"/shard/{shard_of(vehicle_id, 3)}-of-3")
+
+
+def test_vehicle_router_names_a_missing_vehicle_id():
+    (router,) = route_sharded_tools(shards("query_vehicle_driving_behaviour_data", 2))
+    with pytest.raises(ValueError, match="Missing argument 'vehicle_id'"):
+        call(router)
+
+
+def test_fan_out_merges_every_shard():
+    (router,) = route_sharded_tools(shards("ingest_stats", 2, fn_schema=NoArgs))
+    result = json.loads(call(router).content)
+    assert result == {"shards": {
+        "0-of-2": {"served_by": "sdv/devices/vehicle/shard/0-of-2"},
+        "1-of-2": {"served_by": "sdv/devices/vehicle/shard/1-of-2"},
+    }}
+
+
+def test_fan_out_raises_on_a_shard_error():
+    (router,) = route_sharded_tools(shards("ingest_stats", 2, fn_schema=NoArgs, shard1="store unavailable"))
+    with pytest.raises(RuntimeError, match="store unavailable"):
+        call(router)
+
+
+def test_complete_shards_take_over_from_an_unsharded_server():
+    single = ShardTool("query_vehicle_driving_behaviour_data", "sdv/devices/vehicle")
+    partial = shards("query_vehicle_driving_behaviour_data", 2)[:1]
+    assert route_sharded_tools([("sdv/devices/vehicle", single)] + partial) == [single]
+    (router,) = route_sharded_tools([("sdv/devices/vehicle", single)] + shards("query_vehicle_driving_behaviour_data", 2))
+    assert router is not single
@@ -0,0 +1,76 @@
+import anyio
+
+from util.streaming import ChunkCoalescer
+
+
+def test_small_deltas_are_coalesced():
+    async def main():
+        send, receive = anyio.create_memory_object_stream(16)
+        coalescer = ChunkCoalescer(send, min_chars=10, max_delay=60)
+        for _ in range(25):
+            coalescer.push("abcd")
+        await coalescer.flush()
+        send.close()
+        return [chunk async for chunk in receive], coalescer
+
+    chunks, coalescer = anyio.run(main)
+    assert "".join(chunks) == "abcd" * 25
+    assert all(len(chunk) >= 10 for chunk in chunks[:-1])
+    assert (coalescer.chunks, coalescer.deltas) == (len(chunks), 25)
+
+
+def test_full_stream_accumulates_without_joining():
+    async def main():
+        send, receive = anyio.create_memory_object_stream(1)
+        coalescer = ChunkCoalescer(send, min_chars=1, max_delay=0)
+        attempts = []
+        send_nowait = send.send_nowait
+        send.send_nowait = lambda item: attempts.append(len(item)) or send_nowait(item)
+        coalescer.push("first")
+        # The stream is full: these deltas wait in the buffer, without a join and send attempt each
+        for _ in range(1000):
+            coalescer.push("x")
+        assert attempts == [5]
+        assert await receive.receive() == "first"
+        await coalescer.flush()
+        assert await receive.receive() == "x" * 1000
+        return coalescer
+
+    coalescer = anyio.run(main)
+    assert coalescer.chunks == 2
+
+
+def test_held_delta_is_sent_by_the_timer():
+    async def main():
+        send, receive = anyio.create_memory_object_stream(16)
+        coalescer = ChunkCoalescer(send, min_chars=256, max_delay=0.05)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(coalescer.flush_on_timer)
+            # Within max_delay of the last send and below min_chars: held, and nothing else arrives
+            coalescer.push("query_vehicle_driving_behaviour_data: {'vehicle_id': '00001'}")
+            started = anyio.current_time()
+            with anyio.fail_after(1):
+                chunk = await receive.receive()
+            tg.cancel_scope.cancel()
+        return chunk, anyio.current_time() - started
+
+    chunk, waited = anyio.run(main)
+    assert chunk.startswith("query_vehicle_driving_behaviour_data")
+    assert waited < 0.5
+
+
+def test_timer_sends_text_held_while_the_stream_was_full():
+    async def main():
+        send, receive = anyio.create_memory_object_stream(1)
+        coalescer = ChunkCoalescer(send, min_chars=1, max_delay=0.01)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(coalescer.flush_on_timer)
+            coalescer.push("first")
+            coalescer.push("second")
+            coalescer.push("third")
+            with anyio.fail_after(1):
+                chunks = [await receive.receive(), await receive.receive()]
+            tg.cancel_scope.cancel()
+        return chunks
+
+    assert anyio.run(main) == ["first", "secondthird"]
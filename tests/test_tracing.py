@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from util import tracing
+from util.tracing import MetricsRegistry
+
+
+def test_histogram_buckets_render_cumulatively():
+    metrics = MetricsRegistry()
+    for value in (0.2, 0.2, 1, 400):
+        metrics.observe("sdv_report_seconds", value, {"mode": "direct"}, buckets=(0.1, 0.25, 1, 10), help="Report latency")
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ["# HELP sdv_report_seconds Report latency", "# TYPE sdv_report_seconds histogram"]
+    assert lines[2:] == [
+        'sdv_report_seconds_bucket{mode="direct",le="0.1"} 0',
+        'sdv_report_seconds_bucket{mode="direct",le="0.25"} 2',
+        'sdv_report_seconds_bucket{mode="direct",le="1"} 3',
+        'sdv_report_seconds_bucket{mode="direct",le="10"} 3',
+        'sdv_report_seconds_bucket{mode="direct",le="+Inf"} 4',
+        'sdv_report_seconds_sum{mode="direct"} 401.400000',
+        'sdv_report_seconds_count{mode="direct"} 4',
+    ]
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_FILE", str(tmp_path / "traces" / "spans.jsonl"))
+    monkeypatch.setattr(tracing, "_metrics", None)
+    monkeypatch.setattr(tracing, "_tracer", None)
+    tracer = tracing.get_tracer()
+    yield tracer
+    tracer._file.close()
+
+
+def test_finished_span_is_one_otlp_json_line(tracer):
+    with tracer.span("workflow.gen_report", labels={"mode": "direct"}, vehicle_id="00001") as span:
+        span.set(report_cache_hit=False, prompt_tokens=1200)
+
+    with open(tracer.trace_file, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1
+    (resource_spans,) = json.loads(lines[0])["resourceSpans"]
+    assert resource_spans["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "sdv-mcp-demo"}}]
+    (exported,) = resource_spans["scopeSpans"][0]["spans"]
+    assert exported["name"] == "workflow.gen_report"
+    assert len(exported["traceId"]) == 32 and len(exported["spanId"]) == 16
+    assert "parentSpanId" not in exported
+    assert int(exported["endTimeUnixNano"]) >= int(exported["startTimeUnixNano"])
+    assert exported["status"] == {"code": 1}
+    assert {a["key"]: a["value"] for a in exported["attributes"]} == {
+        "mode": {"stringValue": "direct"},
+        "vehicle_id": {"stringValue": "00001"},
+        "report_cache_hit": {"boolValue": False},
+        "prompt_tokens": {"intValue": "1200"},
+    }
+    assert 'sdv_span_duration_seconds_count{mode="direct",span="workflow.gen_report",status="ok"} 1' in tracing.get_metrics().render()
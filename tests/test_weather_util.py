@@ -0,0 +1,65 @@
+import asyncio
+import gc
+
+import anyio
+
+import pytest
+
+from util import http_client, weather_util
+
+
+@pytest.fixture
+def weather(tmp_path, monkeypatch):
+    monkeypatch.setattr(weather_util, "_weather_cache", None)
+    monkeypatch.setenv("WEATHER_CACHE_PATH", str(tmp_path / "weather.sqlite"))
+    calls = []
+
+    async def fetch_weather(city_id, date):
+        calls.append((city_id, date))
+        await asyncio.sleep(0.01)
+        return {"error_code": 0, "result": {"day_weather": "晴", "day_temp": "5℃"}}
+
+    monkeypatch.setattr(weather_util, "_fetch_weather", fetch_weather)
+    return calls
+
+
+def test_http_client_per_event_loop():
+    async def two_lookups():
+        return http_client.get_http_client(), http_client.get_http_client()
+
+    first, again = asyncio.run(two_lookups())
+    second, _ = asyncio.run(two_lookups())
+    assert first is again
+    assert second is not first
+
+
+def test_weather_is_coalesced_and_cached_across_event_loops(weather):
+    async def lookups():
+        return await asyncio.gather(*(weather_util.query_weather_by_city_id("3", "2024-03-01") for _ in range(5)))
+
+    assert len(asyncio.run(lookups())) == 5
+    assert weather == [("3", "2024-03-01")]
+    # A second loop, as in fleet and benchmark runs, is served from the cache
+    assert asyncio.run(weather_util.query_weather_by_city_id("3", "2024-03-01"))["result"]["day_weather"] == "晴"
+    assert weather == [("3", "2024-03-01")]
+
+
+def test_weather_batch(weather):
+    table = asyncio.run(weather_util.query_weather_batch([
+        {"city_id": "3", "date": "2024-03-01"}, {"city_id": 3, "date": "2024-03-01"}, {"city_id": "4", "date": "2024-03-02"},
+    ]))
+    assert [row[:3] for row in table["rows"]] == [["3", "2024-03-01", "晴"], ["4", "2024-03-02", "晴"]]
+    assert table["errors"] == []
+
+
+def test_http_client_is_closed_with_its_event_loop():
+    async def lookup():
+        client = http_client.get_http_client()
+        gc.collect()
+        await asyncio.sleep(0)
+        # Open for as long as the loop runs
+        assert not client._client.is_closed
+        return client
+
+    assert asyncio.run(lookup())._client.is_closed
+    assert anyio.run(lookup)._client.is_closed
@@ -1,6 +1,62 @@
-from .driver_behavior import query_driver_behavior_data
-from .weather_util import query_weather_by_city_id, query_province_id, query_city_id
-from .prompt_loader import load_json_prompt, load_system_prompt
-from .mqtt_mcp_client import MQTTMCPClient
+"""
+Submodules are imported on first use of one of their names (PEP 562), so a process only
+pays for what it calls: the vehicle server never loads the MQTT client or httpx, the app
+never loads the weather server's caches.
+"""
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = ["query_driver_behavior_data", "query_weather_by_city_id", "query_city_id", "query_province_id", "load_json_prompt", "load_system_prompt", "MQTTMCPClient"]
\ No newline at end of file
+_EXPORTS = {
+    "driver_behavior": ["query_driver_behavior_data", "count_driver_behavior_events"],
+    "behavior_features": ["summarize_vehicle_events", "update_aggregates", "summary_from_aggregates"],
+    "event_ingest": ["EventIngestor"],
+    "geo_cluster": ["cluster_vehicle_locations"],
+    "weather_util": ["query_weather_by_city_id", "query_weather_batch", "compact_weather", "query_province_id", "query_city_id", "weather_cache_stats", "get_region_index"],
+    "offline_geocoder": ["resolve_city_ids", "get_offline_geocoder"],
+    "enrichment": ["enrich_vehicle_events"],
+    "mcp_pool": ["McpToolPool", "get_mcp_tool_pool"],
+    "prompt_loader": ["load_json_prompt", "load_system_prompt", "get_prompt_registry", "PromptRegistry"],
+    "mqtt_mcp_client": ["MQTTMCPClient"],
+    "context_compaction": ["ContextBudget", "compact_tools", "compact_tool_output", "dumps_compact"],
+    "tracing": ["get_tracer", "get_metrics", "record_llm_call", "traced_tool", "start_metrics_server"],
+    "streaming": ["ChunkCoalescer"],
+    "sharding": ["shard_of", "vehicle_shard", "shard_server_name", "check_vehicle_shard", "route_sharded_tools"],
+    "report_state": ["ReportStateStore", "get_report_state_store"],
+    "report_cache": ["report_cache_key", "cached_report", "store_report", "replay_chunks", "report_cache_stats"],
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_OF)
+
+
+def __getattr__(name: str):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cache on the package, so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
+
+if TYPE_CHECKING:
+    from .driver_behavior import query_driver_behavior_data, count_driver_behavior_events
+    from .behavior_features import summarize_vehicle_events, update_aggregates, summary_from_aggregates
+    from .event_ingest import EventIngestor
+    from .geo_cluster import cluster_vehicle_locations
+    from .weather_util import query_weather_by_city_id, query_weather_batch, compact_weather, query_province_id, query_city_id, weather_cache_stats, get_region_index
+    from .offline_geocoder import resolve_city_ids, get_offline_geocoder
+    from .enrichment import enrich_vehicle_events
+    from .mcp_pool import McpToolPool, get_mcp_tool_pool
+    from .prompt_loader import load_json_prompt, load_system_prompt, get_prompt_registry, PromptRegistry
+    from .mqtt_mcp_client import MQTTMCPClient
+    from .context_compaction import ContextBudget, compact_tools, compact_tool_output, dumps_compact
+    from .tracing import get_tracer, get_metrics, record_llm_call, traced_tool, start_metrics_server
+    from .streaming import ChunkCoalescer
+    from .sharding import shard_of, vehicle_shard, shard_server_name, check_vehicle_shard, route_sharded_tools
+    from .report_state import ReportStateStore, get_report_state_store
+    from .report_cache import report_cache_key, cached_report, store_report, replay_chunks, report_cache_stats
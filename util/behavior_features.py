@@ -0,0 +1,332 @@
+import json
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .driver_behavior import ensure_vehicle_indexed
+from .event_store import EVENT_TYPES, RECORD_SIZE
+
+# numpy view of `event_store.RECORD`
+RECORD_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("type", "u1"),
+    ("_pad", "V3"),
+    ("speed", "<f4"),
+    ("lng", "<f8"),
+    ("lat", "<f8"),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+SPEED_BINS = (0, 40, 60, 80, 100, 120, np.inf)
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def frame_from_records(buffer) -> pd.DataFrame:
+    """
+    Build a typed event frame straight from raw event store records, without any string parsing.
+
+    Args:
+        buffer: Bytes-like object of `event_store.RECORD` records (see `EventStore.record_slice`)
+
+    Returns:
+        pd.DataFrame: Columns `time` (datetime64), `type` (category), `speed_kmh`, `lng`, `lat`
+    """
+    records = np.frombuffer(buffer, dtype=RECORD_DTYPE)
+    return pd.DataFrame({
+        "time": pd.to_datetime(records["time"], unit="s"),
+        "type": pd.Categorical.from_codes(records["type"], categories=EVENT_TYPES),
+        "speed_kmh": records["speed"].astype(np.float64),
+        "lng": records["lng"],
+        "lat": records["lat"],
+    })
+
+
+def frame_from_events(events: List[dict]) -> pd.DataFrame:
+    """
+    Build a typed event frame from raw event rows, parsing `"70km/h"` speeds and `"lng,lat"`
+    locations once, column-wise.
+
+    Args:
+        events (list): Events as returned by `query_driver_behavior_data`
+
+    Returns:
+        pd.DataFrame: Same columns as `frame_from_records`, sorted by time
+    """
+    df = pd.DataFrame(events, columns=["time", "type", "location", "speed"])
+    location = df["location"].astype(str).str.split(",", n=1, expand=True).reindex(columns=[0, 1])
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(df["time"]),
+        "type": pd.Categorical(df["type"], categories=EVENT_TYPES),
+        "speed_kmh": pd.to_numeric(df["speed"].astype(str).str.extract(r"([\d.]+)", expand=False), errors="coerce"),
+        "lng": pd.to_numeric(location[0], errors="coerce"),
+        "lat": pd.to_numeric(location[1], errors="coerce"),
+    })
+    return frame.sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def summarize_events(
+    df: pd.DataFrame,
+    speed_bins: Sequence[float] = SPEED_BINS,
+    burst_gap_sec: int = 300,
+    min_burst_events: int = 3,
+    top_n: int = 10,
+) -> dict:
+    """
+    Compute a compact, fixed-size summary of driving behaviour events.
+
+    The output size depends only on `speed_bins` and `top_n`, never on the number of events,
+    so it can be handed to the LLM for any history length.
+
+    Args:
+        df (pd.DataFrame): Event frame from `frame_from_records` or `frame_from_events`
+        speed_bins (sequence): Bin edges (km/h) of the max speed histogram
+        burst_gap_sec (int): Events closer than this belong to the same burst
+        min_burst_events (int): Minimum number of events for a run to count as a burst
+        top_n (int): Number of busiest days and largest bursts to list
+
+    Returns:
+        dict: Period, per-type counts, speed statistics and histogram, events per hour and
+        weekday, busiest days and event bursts.
+    """
+    if df.empty:
+        return {"events": 0}
+    df = df.sort_values("time", kind="stable")
+    times = df["time"]
+
+    speeds = df.loc[df["type"] == "max_speed", "speed_kmh"].dropna().to_numpy()
+    labels = [_bin_label(lo, hi) for lo, hi in zip(speed_bins[:-1], speed_bins[1:])]
+    histogram, _ = np.histogram(speeds, bins=np.asarray(speed_bins, dtype=np.float64))
+
+    per_day = df.groupby([times.dt.strftime("%Y-%m-%d"), "type"], observed=True).size().unstack(fill_value=0)
+    per_day["total"] = per_day.sum(axis=1)
+    busiest = per_day.sort_values("total", ascending=False, kind="stable").head(top_n)
+
+    seconds = times.to_numpy().astype("datetime64[s]").astype(np.int64)
+    burst_ids = np.concatenate(([0], np.cumsum(np.diff(seconds) > burst_gap_sec)))
+    bursts = df.assign(burst=burst_ids).groupby("burst").agg(
+        start=("time", "min"),
+        end=("time", "max"),
+        events=("type", "size"),
+        lng=("lng", "mean"),
+        lat=("lat", "mean"),
+    )
+    bursts = bursts[bursts["events"] >= min_burst_events]
+
+    return {
+        "events": int(len(df)),
+        "period": {"start": _fmt(times.iloc[0]), "end": _fmt(times.iloc[-1])},
+        "active_days": int(len(per_day)),
+        "by_type": {str(k): int(v) for k, v in df["type"].value_counts(sort=False).items() if v},
+        "speed_kmh": {
+            "max": _num(speeds.max()) if speeds.size else None,
+            "mean": _num(speeds.mean()) if speeds.size else None,
+            "p90": _num(np.percentile(speeds, 90)) if speeds.size else None,
+            "histogram": dict(zip(labels, (int(n) for n in histogram))),
+        },
+        "by_hour": [int(n) for n in np.bincount(times.dt.hour.to_numpy(), minlength=24)],
+        "by_weekday": dict(zip(WEEKDAYS, (int(n) for n in np.bincount(times.dt.weekday.to_numpy(), minlength=7)))),
+        "busiest_days": [
+            {"date": day, **{str(k): int(v) for k, v in row.items() if v}}
+            for day, row in busiest.iterrows()
+        ],
+        "bursts": {
+            "count": int(len(bursts)),
+            "gap_sec": burst_gap_sec,
+            "largest": [
+                {
+                    "start": _fmt(b.start),
+                    "end": _fmt(b.end),
+                    "events": int(b.events),
+                    "location": f"{b.lng:.6f},{b.lat:.6f}",
+                }
+                for b in bursts.sort_values("events", ascending=False, kind="stable").head(top_n).itertuples()
+            ],
+        },
+    }
+
+
+def update_aggregates(
+    aggregates: Optional[dict],
+    df: pd.DataFrame,
+    burst_gap_sec: int = 300,
+    min_burst_events: int = 3,
+    top_n: int = 10,
+) -> dict:
+    """
+    Fold new events into the running aggregates of a vehicle.
+
+    Running aggregates hold everything `summarize_events` needs in a mergeable form (per-day
+    counts, a speed value histogram, the still-open burst), so `summary_from_aggregates`
+    of the folded aggregates equals `summarize_events` over the whole history, while the
+    cost of an update only depends on the number of new events.
+
+    Args:
+        aggregates (dict, optional): Aggregates from a previous call, None to start over
+        df (pd.DataFrame): Event frame of events not older than the last aggregated event
+        burst_gap_sec (int): See `summarize_events`
+        min_burst_events (int): See `summarize_events`
+        top_n (int): See `summarize_events`
+
+    Returns:
+        dict: The updated aggregates (JSON serializable); `aggregates` is not modified
+    """
+    aggregates = json.loads(json.dumps(aggregates)) if aggregates else {
+        "events": 0,
+        "first_time": None,
+        "last_time": None,
+        "by_type": {},
+        "speeds": {},
+        "by_hour": [0] * 24,
+        "by_weekday": [0] * 7,
+        "days": {},
+        "bursts": {"count": 0, "largest": [], "open": None},
+        "burst_gap_sec": burst_gap_sec,
+        "min_burst_events": min_burst_events,
+    }
+    if df.empty:
+        return aggregates
+    df = df.sort_values("time", kind="stable")
+    times = df["time"]
+
+    aggregates["events"] += int(len(df))
+    aggregates["first_time"] = aggregates["first_time"] or _fmt(times.iloc[0])
+    aggregates["last_time"] = _fmt(times.iloc[-1])
+    for key, n in df["type"].value_counts(sort=False).items():
+        if n:
+            aggregates["by_type"][str(key)] = aggregates["by_type"].get(str(key), 0) + int(n)
+    speeds = df.loc[df["type"] == "max_speed", "speed_kmh"].dropna()
+    for value, n in speeds.value_counts(sort=False).items():
+        aggregates["speeds"][str(float(value))] = aggregates["speeds"].get(str(float(value)), 0) + int(n)
+    for counts, new in ((aggregates["by_hour"], np.bincount(times.dt.hour.to_numpy(), minlength=24)),
+                        (aggregates["by_weekday"], np.bincount(times.dt.weekday.to_numpy(), minlength=7))):
+        for i, n in enumerate(new):
+            counts[i] += int(n)
+    per_day = df.groupby([times.dt.strftime("%Y-%m-%d"), "type"], observed=True).size()
+    for (day, key), n in per_day.items():
+        day_counts = aggregates["days"].setdefault(day, {})
+        day_counts[str(key)] = day_counts.get(str(key), 0) + int(n)
+
+    # Bursts: the last burst may continue with the next batch, so it stays open
+    seconds = times.to_numpy().astype("datetime64[s]").astype(np.int64)
+    bursts = aggregates["bursts"]
+    current = bursts["open"]
+    lngs, lats = df["lng"].to_numpy(), df["lat"].to_numpy()
+    for i, ts in enumerate(seconds):
+        if current is None or ts - current["end_ts"] > burst_gap_sec:
+            if current is not None:
+                _close_burst(bursts, current, min_burst_events, top_n)
+            current = {"start": _fmt(times.iloc[i]), "start_ts": int(ts), "events": 0, "lngs": [], "lats": []}
+        current["end"] = _fmt(times.iloc[i])
+        current["end_ts"] = int(ts)
+        current["events"] += 1
+        if not (np.isnan(lngs[i]) or np.isnan(lats[i])):
+            current["lngs"].append(float(lngs[i]))
+            current["lats"].append(float(lats[i]))
+    bursts["open"] = current
+    return aggregates
+
+
+def summary_from_aggregates(aggregates: dict, speed_bins: Sequence[float] = SPEED_BINS, top_n: int = 10) -> dict:
+    """
+    Render running aggregates (see `update_aggregates`) in the format of `summarize_events`.
+    """
+    if not aggregates or not aggregates["events"]:
+        return {"events": 0}
+    values = np.array([float(v) for v in aggregates["speeds"]], dtype=np.float64)
+    counts = np.array(list(aggregates["speeds"].values()), dtype=np.int64)
+    order = np.argsort(values, kind="stable")
+    values, counts = values[order], counts[order]
+    labels = [_bin_label(lo, hi) for lo, hi in zip(speed_bins[:-1], speed_bins[1:])]
+    histogram, _ = np.histogram(values, bins=np.asarray(speed_bins, dtype=np.float64), weights=counts)
+    n_speeds = int(counts.sum())
+
+    days = []
+    for day in sorted(aggregates["days"]):
+        row = {key: aggregates["days"][day][key] for key in EVENT_TYPES if aggregates["days"][day].get(key)}
+        days.append({"date": day, **row, "total": sum(row.values())})
+    busiest = sorted(days, key=lambda d: -d["total"])[:top_n]
+
+    bursts = aggregates["bursts"]
+    largest = list(bursts["largest"])
+    count = bursts["count"]
+    if bursts["open"] is not None and bursts["open"]["events"] >= aggregates["min_burst_events"]:
+        largest.append(bursts["open"])
+        count += 1
+
+    return {
+        "events": aggregates["events"],
+        "period": {"start": aggregates["first_time"], "end": aggregates["last_time"]},
+        "active_days": len(aggregates["days"]),
+        "by_type": {key: aggregates["by_type"][key] for key in EVENT_TYPES if aggregates["by_type"].get(key)},
+        "speed_kmh": {
+            "max": _num(values[-1]) if n_speeds else None,
+            "mean": _num((values * counts).sum() / n_speeds) if n_speeds else None,
+            "p90": _num(_weighted_percentile(values, counts, 90)) if n_speeds else None,
+            "histogram": dict(zip(labels, (int(n) for n in histogram))),
+        },
+        "by_hour": list(aggregates["by_hour"]),
+        "by_weekday": dict(zip(WEEKDAYS, aggregates["by_weekday"])),
+        "busiest_days": busiest,
+        "bursts": {
+            "count": count,
+            "gap_sec": aggregates["burst_gap_sec"],
+            "largest": [_burst_summary(b) for b in sorted(largest, key=lambda b: -b["events"])[:top_n]],
+        },
+    }
+
+
+def summarize_vehicle_events(vehicle_id: str, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    """
+    Summarize the stored driving behaviour events of a vehicle (see `summarize_events`).
+
+    Raises:
+        ValueError: If the vehicle is unknown or an argument is invalid
+    """
+    store = ensure_vehicle_indexed(vehicle_id)
+    summary = summarize_events(frame_from_records(store.record_slice(vehicle_id, start=start, end=end)))
+    return {"vehicle_id": vehicle_id, **summary}
+
+
+def _close_burst(bursts: dict, burst: dict, min_burst_events: int, top_n: int):
+    if burst["events"] < min_burst_events:
+        return
+    bursts["count"] += 1
+    burst = _burst_summary(burst) | {"start_ts": burst["start_ts"]}
+    # Keep the top_n largest closed bursts, earliest first among equals, in time order
+    largest = sorted(bursts["largest"] + [burst], key=lambda b: (-b["events"], b["start_ts"]))[:top_n]
+    bursts["largest"] = sorted(largest, key=lambda b: b["start_ts"])
+
+
+def _burst_summary(burst: dict) -> dict:
+    if "location" in burst:
+        return {key: burst[key] for key in ("start", "end", "events", "location")}
+    located = len(burst["lngs"]) or np.nan
+    return {
+        "start": burst["start"],
+        "end": burst["end"],
+        "events": burst["events"],
+        "location": f"{math.fsum(burst['lngs']) / located:.6f},{math.fsum(burst['lats']) / located:.6f}",
+    }
+
+
+def _weighted_percentile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """`np.percentile(np.repeat(values, counts), q)` without expanding the values; `values` must be sorted."""
+    cumulative = np.cumsum(counts)
+    position = q / 100 * (cumulative[-1] - 1)
+    lower = values[np.searchsorted(cumulative, np.floor(position), side="right")]
+    upper = values[np.searchsorted(cumulative, np.ceil(position), side="right")]
+    return lower + (upper - lower) * (position - np.floor(position))
+
+
+def _bin_label(lo: float, hi: float) -> str:
+    return f">={lo:g}" if np.isinf(hi) else f"{lo:g}-{hi:g}"
+
+
+def _fmt(ts: pd.Timestamp) -> str:
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _num(value) -> float:
+    return round(float(value), 1)
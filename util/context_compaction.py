@@ -0,0 +1,196 @@
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from .enrichment import VEHICLE_DATA_TOOL, tool_output_json
+from .weather_util import compact_weather
+
+WEATHER_TOOL = "query_history_weather_by_city_id_and_date"
+
+
+def _default_tokenizer() -> Callable[[str], list]:
+    try:
+        from llama_index.core.utils import get_tokenizer
+        return get_tokenizer()
+    except Exception:
+        # Roughly one token per two characters of mixed Chinese/ASCII text
+        return lambda text: range((len(text) + 1) // 2)
+
+
+def dumps_compact(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def records_to_table(records: List[dict]) -> dict:
+    """Turn a list of dicts into `{"columns": [...], "rows": [[...], ...]}`, so keys are sent once instead of per record."""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    return {"columns": columns, "rows": [[record.get(column) for column in columns] for record in records]}
+
+
+def compact_tool_output(tool_name: str, data: Any, kwargs: Optional[dict] = None) -> Any:
+    """
+    Schema-aware compaction of a decoded MCP tool result.
+
+    Behaviour events become a table, Juhe weather payloads keep only `WEATHER_FIELDS`,
+    and any other list of records becomes a table. Everything else is returned as is.
+    """
+    kwargs = kwargs or {}
+    if tool_name == WEATHER_TOOL and isinstance(data, dict) and "error_code" in data:
+        return {"city_id": kwargs.get("city_id"), "date": kwargs.get("date_to_query"), **compact_weather(data)}
+    if tool_name == VEHICLE_DATA_TOOL and isinstance(data, dict) and isinstance(data.get("data"), list):
+        return records_to_table(data["data"])
+    records = data.get("data") if isinstance(data, dict) and len(data) == 1 else data
+    if isinstance(records, list) and records and all(isinstance(item, dict) for item in records):
+        return records_to_table(records)
+    return data
+
+
+class ContextBudget:
+    """
+    Token accounting and an explicit token budget for the prompt of one report.
+
+    Every message added to the workflow memory is charged to the step that added it.
+    Oversized tables are down-sampled to fit (evenly across time, so the report still
+    covers the whole period), and `enforce` trims a chat history that would still
+    exceed the budget before it is sent to the LLM.
+
+    Args:
+        max_tokens (int): Token budget of the prompt sent to `gen_report`
+        max_tool_tokens (int): Token budget of a single tool output seen by the agent
+        tokenizer (callable, optional): `tokenizer(text) -> tokens`, defaults to the llama_index tokenizer
+    """
+
+    def __init__(self, max_tokens: int = 24000, max_tool_tokens: int = 4000, tokenizer: Optional[Callable[[str], list]] = None):
+        self.max_tokens = max_tokens
+        self.max_tool_tokens = max_tool_tokens
+        self.tokenizer = tokenizer or _default_tokenizer()
+        self.steps: Dict[str, int] = {}
+        self.tool_calls = {"calls": 0, "raw_tokens": 0, "compact_tokens": 0}
+        self.trimmed_tokens = 0
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer(text or ""))
+
+    def charge(self, step: str, text: str) -> int:
+        tokens = self.count(text)
+        self.steps[step] = self.steps.get(step, 0) + tokens
+        return tokens
+
+    @property
+    def used(self) -> int:
+        return sum(self.steps.values())
+
+    def remaining(self) -> int:
+        return max(self.max_tokens - self.used, 0)
+
+    def fit_table(self, table: dict, max_tokens: int) -> dict:
+        """
+        Down-sample the rows of a `{"columns", "rows"}` table to at most `max_tokens` tokens,
+        keeping evenly spaced rows; the number of dropped rows is reported in `omitted`.
+        """
+        rows = table["rows"]
+        tokens = self.count(dumps_compact(table))
+        if tokens <= max_tokens or not rows:
+            return table
+        keep = max(int(len(rows) * max_tokens / tokens), 1)
+        while True:
+            stride = len(rows) / keep
+            fitted = dict(table, rows=[rows[int(i * stride)] for i in range(keep)], omitted=len(rows) - keep)
+            fitted_tokens = self.count(dumps_compact(fitted))
+            if fitted_tokens <= max_tokens or keep == 1:
+                self.trimmed_tokens += tokens - fitted_tokens
+                return fitted
+            keep = max(int(keep * max_tokens / fitted_tokens) - 1, 1)
+
+    def truncate_text(self, text: str, max_tokens: int) -> str:
+        tokens = self.count(text)
+        if tokens <= max_tokens:
+            return text
+        # Cut at a line boundary, by the share of characters that fits next to the omission marker
+        keep = max(max_tokens - self.count(f"\n[... {tokens} tokens omitted]"), 0)
+        cut = text[:int(len(text) * keep / tokens)]
+        cut = cut[:cut.rfind("\n")] if "\n" in cut else cut
+        self.trimmed_tokens += tokens - self.count(cut)
+        return f"{cut}\n[... {tokens - self.count(cut)} tokens omitted]"
+
+    def compact_output(self, tool_name: str, output, kwargs: dict) -> str:
+        """Compact and budget the result of one tool call, for the agent's context."""
+        raw = str(getattr(output, "content", output))
+        try:
+            data = compact_tool_output(tool_name, tool_output_json(output), kwargs)
+        except (ValueError, TypeError, RuntimeError):
+            # Not JSON, or a tool error: pass the text through
+            text = raw
+        else:
+            if isinstance(data, dict) and isinstance(data.get("rows"), list):
+                data = self.fit_table(data, self.max_tool_tokens)
+            text = dumps_compact(data)
+        text = self.truncate_text(text, self.max_tool_tokens)
+        self.tool_calls["calls"] += 1
+        self.tool_calls["raw_tokens"] += self.count(raw)
+        self.tool_calls["compact_tokens"] += self.count(text)
+        return text
+
+    def enforce(self, messages: List) -> List:
+        """
+        Trim a chat history to the budget. The last message, the instruction the LLM
+        answers, is never trimmed. The messages before it are capped at a common size, so
+        the largest ones are truncated first and the smaller ones (prompts) stay intact.
+        System messages are kept, unless they alone exceed what the last message leaves;
+        then they are capped as well and the rest of the history is cut.
+        """
+        sizes = [self.count(message.content) for message in messages]
+        if sum(sizes) <= self.max_tokens or len(messages) < 2:
+            return messages
+        earlier = range(len(messages) - 1)
+        system = [i for i in earlier if str(getattr(messages[i].role, "value", messages[i].role)) == "system"]
+        history = [i for i in earlier if i not in system]
+        available = max(self.max_tokens - sizes[-1], 0)
+        system_tokens = sum(sizes[i] for i in system)
+        if system_tokens > available:
+            self._cap(messages, sizes, system, available)
+            self._cap(messages, sizes, history, 0)
+        else:
+            self._cap(messages, sizes, history, available - system_tokens)
+        return messages
+
+    def _cap(self, messages: List, sizes: List[int], indices: List[int], available: int):
+        """Truncate `messages[indices]` to the largest common size at which they fit `available` tokens."""
+        remaining = sorted(sizes[i] for i in indices)
+        cap = None
+        # Water-fill: messages smaller than their share of what is left are kept whole
+        for n, size in enumerate(remaining):
+            share = available // (len(remaining) - n)
+            if size > share:
+                cap = share
+                break
+            available -= size
+        if cap is None:
+            return
+        for i in indices:
+            if sizes[i] > cap:
+                message = messages[i]
+                messages[i] = type(message)(role=message.role, content=self.truncate_text(message.content, cap))
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.max_tokens,
+            "used": self.used,
+            "steps": dict(self.steps),
+            "tool_calls": dict(self.tool_calls),
+            "trimmed_tokens": self.trimmed_tokens,
+        }
+
+
+def compact_tools(tools: list, budget: ContextBudget) -> list:
+    """
+    Wrap MCP tools so the agent sees compacted, budgeted outputs instead of the raw JSON.
+    The wrapped tools keep the name, description and schema of the originals.
+    """
+    from llama_index.core.tools import FunctionTool
+
+    def wrap(tool):
+        async def call(**kwargs):
+            return budget.compact_output(tool.metadata.name, await tool.acall(**kwargs), kwargs)
+        return FunctionTool.from_defaults(async_fn=call, tool_metadata=tool.metadata)
+
+    return [wrap(tool) for tool in tools]
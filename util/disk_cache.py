@@ -0,0 +1,73 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+
+class DiskCache:
+    """
+    Persistent key/value cache backed by SQLite, with size-bounded LRU eviction.
+
+    Args:
+        path (str): Database file, created if missing
+        max_entries (int): Least recently used entries are evicted beyond this size
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            now = time.time()
+            # Replacing a key leaves the size as is; only new keys count towards eviction
+            if not self._conn.execute("UPDATE cache SET value = ?, accessed = ? WHERE key = ?", (value, now, key)).rowcount:
+                self._conn.execute("INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)", (key, value, now))
+                self._size += 1
+            if self._size > self.max_entries:
+                self._size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+                excess = self._size - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,)
+                    )
+                    self._size -= excess
+                    self.evictions += excess
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
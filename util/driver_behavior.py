@@ -1,22 +1,82 @@
 import os
 import json
+from typing import List, Optional
 
+from .event_store import EventStore, import_json_file
 
-def query_driver_behavior_data(vehicle_id:str) -> str:
+_store = None
+
+
+def get_event_store() -> EventStore:
+    """
+    Return the process-wide event store, rooted at `VEHICLE_STORE_DIR` (defaults to `data/store`).
+    """
+    global _store
+    if _store is None:
+        default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'store')
+        _store = EventStore(os.getenv('VEHICLE_STORE_DIR', default_dir))
+    return _store
+
+
+def ensure_vehicle_indexed(vehicle_id: str) -> EventStore:
+    """
+    Make sure the event store holds the history of `vehicle_id`.
+
+    The store is built from `vehicle_<vehicle_id>.json` in `VEHICLE_DATA_DIR` (defaults
+    to `data/`) when it has no copy of the vehicle yet. An existing copy is never rebuilt
+    from the JSON, as it may hold events ingested since; delete the vehicle's `.evt` file
+    to import an edited JSON file.
+
+    Raises:
+        ValueError: If there is no data for the vehicle
     """
-    Retrieves driver behavior data from a JSON file for a given vehicle ID.
+    store = get_event_store()
+    store_path = store.path(vehicle_id)
+    data_dir = os.getenv('VEHICLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+    json_path = os.path.join(data_dir, f"vehicle_{vehicle_id}.json")
+    if os.path.exists(store_path):
+        return store
+    if not os.path.exists(json_path):
+        raise ValueError(f"Vehicle '{vehicle_id}' not found")
+    import_json_file(store, vehicle_id, json_path)
+    return store
+
+
+def query_driver_behavior_data(
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    types: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> dict:
+    """
+    Retrieves driver behavior data of a vehicle from the event store.
     
     Args:
         vehicle_id (str): The unique identifier for the vehicle
+        start (str, optional): Only return events at or after this time ('YYYY-MM-DD[ HH:MM:SS]')
+        end (str, optional): Only return events at or before this time; a bare date covers the whole day
+        types (list, optional): Only return events of these types
+        limit (int, optional): Maximum number of events to return
         
     Returns:
-        str: JSON data containing the driver's behavior information
-        
-    Note:
-        Currently returns hardcoded 'vehicle_00001.json' data regardless of vehicle_id.
-        This may need to be updated to use the actual vehicle_id parameter.
+        dict: `{"data": [...]}` with the matching events in time order
+
+    Raises:
+        ValueError: If the vehicle is unknown or an argument is invalid
+    """
+    store = ensure_vehicle_indexed(vehicle_id)
+    return {"data": store.query(vehicle_id, start=start, end=end, types=types, limit=limit)}
+
+def count_driver_behavior_events(vehicle_id: str, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    """
+    Count the stored events of a vehicle within [start, end] without reading them.
+
+    Raises:
+        ValueError: If the vehicle is unknown or an argument is invalid
     """
-    return load_json_file("vehicle_00001.json")
+    store = ensure_vehicle_indexed(vehicle_id)
+    return {"vehicle_id": vehicle_id, "events": store.count(vehicle_id, start=start, end=end)}
 
 def load_json_file(file_name: str ="") -> str:
     try:
@@ -41,7 +101,7 @@ def load_json_file(file_name: str ="") -> str:
 def main():
     try:
         # Load the vehicle data
-        vehicle_data = load_json_file("vehicle_00001.json")
+        vehicle_data = query_driver_behavior_data("00001")
         print("Successfully loaded vehicle data:")
         print(json.dumps(vehicle_data, indent=2))
     except Exception as e:
@@ -0,0 +1,297 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import anyio
+
+from .geo_cluster import GridClusterIndex, parse_location
+from .report_state import ReportStateStore, StaleReportState
+
+logger = logging.getLogger(__name__)
+
+VEHICLE_DATA_TOOL = "query_vehicle_driving_behaviour_data"
+VEHICLE_SUMMARY_TOOL = "query_vehicle_driving_behaviour_summary"
+VEHICLE_COUNT_TOOL = "query_vehicle_event_count"
+CITY_IDS_TOOL = "query_city_ids_by_locations"
+WEATHER_BATCH_TOOL = "query_history_weather_batch"
+# Online fallback for locations the offline geocoder cannot place with confidence
+GEOCODE_TOOL = "maps_regeocode"
+PROVINCE_ID_TOOL = "query_by_province_id"
+CITY_ID_TOOL = "query_by_city_id"
+
+# Attempts of an incremental report when other reports of the same vehicle keep saving first
+SAVE_ATTEMPTS = 5
+
+EVENT_COLUMNS = ["time", "type", "speed", "province", "city", "day_weather", "night_weather", "day_temp", "night_temp", "day_wind"]
+
+
+def tool_output_text(output) -> str:
+    """
+    The text result of an MCP tool called through a llama_index tool.
+
+    Raises:
+        RuntimeError: If the tool reported an error
+    """
+    raw = getattr(output, "raw_output", None)
+    content = getattr(raw, "content", None)
+    if content is None:
+        return str(getattr(output, "content", output))
+    text = "".join(getattr(block, "text", "") for block in content)
+    if getattr(raw, "isError", False):
+        raise RuntimeError(text)
+    return text
+
+
+def tool_output_json(output) -> Any:
+    """
+    Decode the JSON result of an MCP tool called through a llama_index tool.
+
+    Raises:
+        RuntimeError: If the tool reported an error
+    """
+    return json.loads(tool_output_text(output))
+
+
+async def call_tool(tools: Dict[str, Any], name: str, **kwargs) -> Any:
+    tool = tools.get(name)
+    if tool is None:
+        raise ValueError(f"Tool '{name}' is not available, is its MCP server running?")
+    return tool_output_json(await tool.acall(**kwargs))
+
+
+async def call_tool_text(tools: Dict[str, Any], name: str, **kwargs) -> str:
+    tool = tools.get(name)
+    if tool is None:
+        raise ValueError(f"Tool '{name}' is not available, is its MCP server running?")
+    return tool_output_text(await tool.acall(**kwargs))
+
+
+def _chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def enrich_vehicle_events(
+    tools: Dict[str, Any],
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    radius_m: float = 200,
+    max_concurrency: int = 8,
+    chunk_size: int = 100,
+    state_store: Optional[ReportStateStore] = None,
+) -> dict:
+    """
+    Join the driving behaviour events of a vehicle with their city and weather by calling
+    the MCP tools directly, without an agent in the loop.
+
+    Event locations are clustered first, so that each cluster is resolved to a city once;
+    the city lookups and weather lookups are sent in concurrent batches under `max_concurrency`.
+    Clusters the offline geocoder cannot place are reverse geocoded with the map service,
+    when its tool is available.
+
+    Args:
+        tools (dict): llama_index tools by name, from the MCP servers
+        vehicle_id (str): The vehicle to report on
+        start (str, optional): Only enrich events at or after this time
+        end (str, optional): Only enrich events at or before this time
+        radius_m (float): Radius of the location clusters, in metres
+        max_concurrency (int): Maximum number of tool calls in flight
+        chunk_size (int): Locations or (city, date) pairs per batch tool call
+        state_store (ReportStateStore, optional): Enrich the whole history incrementally,
+            only fetching and enriching the events added since the previous report
+
+    Returns:
+        dict: `summary` (see `summarize_events`) and the enriched `events` as a table
+        with `columns` and `rows`; locations or weather that could not be resolved are
+        left empty and counted in `unresolved`. Incremental runs also return `incremental`,
+        with the previous watermark and the number of new events.
+    """
+    limiter = anyio.CapacityLimiter(max_concurrency)
+    window = {k: v for k, v in (("start", start), ("end", end)) if v}
+    results: Dict[str, Any] = {}
+
+    async def run(key: str, name: str, kwargs: dict, text: bool = False):
+        async with limiter:
+            results[key] = await (call_tool_text if text else call_tool)(tools, name, **kwargs)
+
+    online = all(name in tools for name in (GEOCODE_TOOL, PROVINCE_ID_TOOL, CITY_ID_TOOL))
+    if state_store is not None and not window and VEHICLE_COUNT_TOOL in tools:
+        return await _enrich_incrementally(run, results, state_store, vehicle_id, radius_m, chunk_size, online)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(run, "data", VEHICLE_DATA_TOOL, {"vehicle_id": vehicle_id, **window})
+        if VEHICLE_SUMMARY_TOOL in tools:
+            tg.start_soon(run, "summary", VEHICLE_SUMMARY_TOOL, {"vehicle_id": vehicle_id, **window})
+    events = results["data"]["data"]
+    rows, missing, clusters = await _join_city_and_weather(run, results, events, radius_m, chunk_size, online)
+
+    return {
+        "vehicle_id": vehicle_id,
+        "summary": results.get("summary"),
+        "events": {"columns": EVENT_COLUMNS, "rows": rows},
+        "locations": {"events": len(events), "clusters": clusters},
+        "unresolved": _count_unresolved(missing),
+    }
+
+
+def _count_unresolved(missing: List[List[str]]) -> Dict[str, int]:
+    return {key: sum(key in keys for keys in missing) for key in ("location", "weather")}
+
+
+async def _join_city_and_weather(run, results: Dict[str, Any], events: List[dict], radius_m: float, chunk_size: int, online: bool = False):
+    """
+    Enriched rows of `events`, what could not be resolved for each of them (a list with
+    "location" and/or "weather"), and the number of location clusters.
+    """
+    # Cluster event locations, so nearby events share one city lookup
+    index = GridClusterIndex(radius_m)
+    event_clusters = [index.add(*parse_location(e["location"])) for e in events]
+    anchors = [f"{lng:.6f},{lat:.6f}" for lng, lat in index.anchors]
+
+    async with anyio.create_task_group() as tg:
+        for i, chunk in enumerate(_chunks(anchors, chunk_size)):
+            tg.start_soon(run, f"cities_{i}", CITY_IDS_TOOL, {"locations": chunk})
+    cities = [c for i in range(len(_chunks(anchors, chunk_size))) for c in results[f"cities_{i}"]["cities"]]
+    if online:
+        async with anyio.create_task_group() as tg:
+            for i, city in enumerate(cities):
+                if not city.get("city_id"):
+                    tg.start_soon(_resolve_online, run, results, cities, i)
+
+    pairs = list(dict.fromkeys(
+        (cities[cluster].get("city_id"), event["time"][:10])
+        for event, cluster in zip(events, event_clusters)
+        if cities[cluster].get("city_id")
+    ))
+    queries = [{"city_id": city_id, "date": date} for city_id, date in pairs]
+    async with anyio.create_task_group() as tg:
+        for i, chunk in enumerate(_chunks(queries, chunk_size)):
+            tg.start_soon(run, f"weather_{i}", WEATHER_BATCH_TOOL, {"queries": chunk})
+    weather = {}
+    for i in range(len(_chunks(queries, chunk_size))):
+        table = results[f"weather_{i}"]
+        for row in table["rows"]:
+            record = dict(zip(table["columns"], row))
+            weather[(record["city_id"], record["date"])] = record
+
+    rows, missing = [], []
+    for event, cluster in zip(events, event_clusters):
+        city = cities[cluster]
+        keys = [] if city.get("city_id") else ["location"]
+        day = weather.get((city.get("city_id"), event["time"][:10]))
+        if day is None:
+            keys.append("weather")
+            day = {}
+        missing.append(keys)
+        rows.append([
+            event["time"], event["type"], event.get("speed"), city.get("province"), city.get("city"),
+            day.get("day_weather"), day.get("night_weather"), day.get("day_temp"), day.get("night_temp"), day.get("day_wind"),
+        ])
+    return rows, missing, len(anchors)
+
+
+async def _resolve_online(run, results: Dict[str, Any], cities: List[dict], i: int):
+    """Resolve `cities[i]` with the map service's reverse geocoding, keeping the offline error if that fails too."""
+    location = cities[i]["location"]
+    try:
+        await run(f"geocode_{i}", GEOCODE_TOOL, {"location": location})
+        region = results[f"geocode_{i}"]
+        # Municipalities have no city level: `city` is then empty or []
+        names = [name for name in (region.get("district"), region.get("city"), region.get("province")) if name and isinstance(name, str)]
+        await run(f"province_id_{i}", PROVINCE_ID_TOOL, {"province": region.get("province") or ""}, text=True)
+        province_id = results[f"province_id_{i}"]
+    except Exception as e:
+        logger.warning(f"Failed to resolve location {location} online: {str(e)}")
+        return
+    for name in names:
+        try:
+            await run(f"city_id_{i}", CITY_ID_TOOL, {"province_id": province_id, "city_name": name}, text=True)
+        except Exception:
+            continue
+        cities[i] = {"location": location, "province": region["province"], "city": name, "city_id": results[f"city_id_{i}"]}
+        return
+    logger.warning(f"No weather city matches location {location} ({region})")
+
+
+async def _enrich_incrementally(run, results: Dict[str, Any], state_store: ReportStateStore, vehicle_id: str, radius_m: float, chunk_size: int, online: bool = False) -> dict:
+    """
+    Enrich only the events after the vehicle's watermark, then merge them with the stored
+    rows and running aggregates. The history up to the watermark is checked with an event
+    count; if events were inserted behind it or the history was rebuilt, everything is
+    enriched again. Stored rows whose location or weather was unresolved are enriched again
+    with the new events. If another report of the vehicle saved first, the run starts over
+    from the state that report saved.
+    """
+    for attempt in range(SAVE_ATTEMPTS):
+        try:
+            return await _enrich_once(run, results, state_store, vehicle_id, radius_m, chunk_size, online)
+        except StaleReportState:
+            logger.info(f"Report state of vehicle {vehicle_id} was saved by another report, enriching again (attempt {attempt + 1})")
+    raise StaleReportState(f"Report state of vehicle {vehicle_id} kept changing, gave up after {SAVE_ATTEMPTS} attempts")
+
+
+async def _enrich_once(run, results: Dict[str, Any], state_store: ReportStateStore, vehicle_id: str, radius_m: float, chunk_size: int, online: bool) -> dict:
+    # pandas is only needed here, keep it out of the import of this module
+    from .behavior_features import frame_from_events, summary_from_aggregates, update_aggregates
+
+    state = loaded = await anyio.to_thread.run_sync(state_store.load, vehicle_id)
+    replace = state is None
+    async with anyio.create_task_group() as tg:
+        if state is None:
+            tg.start_soon(run, "data", VEHICLE_DATA_TOOL, {"vehicle_id": vehicle_id})
+        else:
+            tg.start_soon(run, "data", VEHICLE_DATA_TOOL, {"vehicle_id": vehicle_id, "start": state["last_time"]})
+            tg.start_soon(run, "count", VEHICLE_COUNT_TOOL, {"vehicle_id": vehicle_id, "end": state["last_time"]})
+    events = results["data"]["data"]
+    if state is not None:
+        # Events at the watermark time were partly enriched already; later ones with the same time are new
+        at_watermark = sum(1 for e in events if e["time"] == state["last_time"])
+        if results["count"]["events"] != state["events"] - state["at_last_time"] + at_watermark or at_watermark < state["at_last_time"]:
+            logger.info(f"History of vehicle {vehicle_id} changed behind the report watermark, enriching it again")
+            state, replace = None, True
+            await run("data", VEHICLE_DATA_TOOL, {"vehicle_id": vehicle_id})
+            events = results["data"]["data"]
+        else:
+            events = events[state["at_last_time"]:]
+
+    # Unresolved rows behind the watermark are enriched again along with the new events
+    pending = [] if replace else await anyio.to_thread.run_sync(state_store.pending, vehicle_id)
+    rows, missing, clusters = await _join_city_and_weather(
+        run, results, [p["event"] for _, p in pending] + events, radius_m, chunk_size, online
+    )
+    retried = {
+        seq: (row, {"event": p["event"], "unresolved": keys} if keys else None)
+        for (seq, p), row, keys in zip(pending, rows, missing)
+    }
+    new_rows, new_missing = rows[len(pending):], missing[len(pending):]
+    aggregates = update_aggregates(state and state["aggregates"], frame_from_events(events))
+    unresolved = _count_unresolved(missing)
+    for key, n in _count_unresolved([p["unresolved"] for _, p in pending]).items():
+        unresolved[key] += (state["unresolved"][key] if state else 0) - n
+
+    if events:
+        last_time = events[-1]["time"]
+        at_last_time = sum(1 for e in events if e["time"] == last_time)
+        if state is not None and last_time == state["last_time"]:
+            at_last_time += state["at_last_time"]
+        new_state = {"last_time": last_time, "at_last_time": at_last_time, "events": (state["events"] if state else 0) + len(events),
+                     "aggregates": aggregates, "unresolved": unresolved}
+    else:
+        new_state = {**(state or {"last_time": None, "at_last_time": 0, "events": 0}), "aggregates": aggregates, "unresolved": unresolved}
+    if events or pending:
+        new_pending = [{"event": event, "unresolved": keys} if keys else None for event, keys in zip(events, new_missing)]
+        rows = await anyio.to_thread.run_sync(
+            lambda: state_store.save(vehicle_id, new_state, new_rows, replace=replace, expected=loaded, pending=new_pending, retried=retried)
+        )
+    else:
+        rows = [] if replace else await anyio.to_thread.run_sync(state_store.rows, vehicle_id)
+
+    return {
+        "vehicle_id": vehicle_id,
+        "summary": {"vehicle_id": vehicle_id, **summary_from_aggregates(aggregates)},
+        "events": {"columns": EVENT_COLUMNS, "rows": rows},
+        "locations": {"events": new_state["events"]},
+        "unresolved": unresolved,
+        # Run metadata, not part of the report data
+        "incremental": {"since": None if replace else state["last_time"], "new_events": len(events), "clusters": clusters},
+    }
@@ -0,0 +1,265 @@
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Optional
+
+from .driver_behavior import ensure_vehicle_indexed, get_event_store
+from .event_store import EventStore, encode_event, validate_vehicle_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENTS_TOPIC = "sdv/vehicles/+/events"
+
+
+class EventIngestor:
+    """
+    Ingests vehicle behaviour events published over MQTT into the event store.
+
+    Messages are published on `sdv/vehicles/<vehicle_id>/events` (configurable) with
+    either a single event or `{"data": [...]}` as payload, in the same shape as
+    `data/vehicle_*.json`. An optional `sent_at` field (epoch seconds) is used to
+    measure end-to-end freshness lag. Events are buffered and appended to the store
+    in batches, and running per-vehicle aggregates are kept in memory.
+
+    Args:
+        store (EventStore): Destination store, defaults to the process-wide store
+        host (str): MQTT broker host
+        port (int): MQTT broker port
+        topic (str): Topic filter to subscribe to
+        batch_size (int): Flush as soon as this many events are buffered
+        flush_interval (float): Flush at least this often, in seconds
+        accept_vehicle (callable, optional): `accept_vehicle(vehicle_id)`, False for vehicles
+            owned by another shard, whose messages are skipped
+    """
+
+    def __init__(
+        self,
+        store: Optional[EventStore] = None,
+        host: str = "localhost",
+        port: int = 1883,
+        topic: str = DEFAULT_EVENTS_TOPIC,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        accept_vehicle: Optional[Callable[[str], bool]] = None,
+    ):
+        self.store = store or get_event_store()
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.accept_vehicle = accept_vehicle
+        self.mqtt_client = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: Dict[str, List[tuple]] = defaultdict(list)
+        self._buffered = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = None
+
+        self._aggregates: Dict[str, dict] = {}
+        self._started_at = time.time()
+        self._events_total = 0
+        self._batches_total = 0
+        self._rejected_total = 0
+        self._skipped_total = 0
+        self._recent = deque()
+        self._lags = deque(maxlen=1000)
+
+    def start(self):
+        """Connect to the broker and start the subscriber and flusher threads."""
+        import paho.mqtt.client as mqtt
+
+        client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        client.connect_async(self.host, self.port)
+        client.loop_start()
+        self.mqtt_client = client
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="event-ingest-flusher", daemon=True)
+        self._flusher.start()
+        logger.info(f"Ingesting vehicle events from mqtt://{self.host}:{self.port}/{self.topic}")
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self.mqtt_client is not None:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"Failed to connect to MQTT broker: {reason_code}")
+            return
+        client.subscribe(self.topic, qos=1)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload)
+            events = payload["data"] if "data" in payload else [payload]
+            vehicle_id = payload.get("vehicle_id") or msg.topic.split("/")[-2]
+            if self.accept_vehicle is not None and not self.accept_vehicle(vehicle_id):
+                self._skipped_total += len(events)
+                return
+            self.ingest(vehicle_id, events, sent_at=payload.get("sent_at"))
+        except Exception as e:
+            self._rejected_total += 1
+            logger.warning(f"Dropping malformed message on {msg.topic}: {str(e)}")
+
+    def ingest(self, vehicle_id: str, events: List[dict], sent_at: Optional[float] = None):
+        """
+        Buffer events of one vehicle for the next batch append.
+
+        Events that cannot be encoded, or all events of an invalid vehicle id, are counted
+        as rejected and dropped.
+        """
+        try:
+            validate_vehicle_id(vehicle_id)
+        except ValueError as e:
+            self._rejected_total += len(events)
+            logger.warning(f"Dropping {len(events)} events: {str(e)}")
+            return
+        received_at = time.time()
+        accepted = []
+        for event in events:
+            try:
+                encode_event(event)
+            except (KeyError, ValueError, AttributeError) as e:
+                self._rejected_total += 1
+                logger.warning(f"Dropping event of vehicle {vehicle_id}: {str(e)}")
+                continue
+            accepted.append((event, sent_at or received_at))
+        if not accepted:
+            return
+        with self._lock:
+            self._buffer[vehicle_id].extend(accepted)
+            self._buffered += len(accepted)
+            if self._buffered >= self.batch_size:
+                self._wakeup.set()
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush vehicle events: {str(e)}")
+
+    def flush(self) -> int:
+        """
+        Append all buffered events to the store and update the aggregates.
+
+        Returns:
+            int: Number of events written
+        """
+        with self._flush_lock:
+            with self._lock:
+                buffer, self._buffer = self._buffer, defaultdict(list)
+                self._buffered = 0
+            written = 0
+            for vehicle_id, items in buffer.items():
+                try:
+                    written += self._write(vehicle_id, items)
+                except ValueError as e:
+                    self._rejected_total += len(items)
+                    logger.warning(f"Dropping {len(items)} events of vehicle {vehicle_id}: {str(e)}")
+                except Exception as e:
+                    # E.g. a full disk: keep the events for the next flush, the other vehicles are written
+                    logger.error(f"Failed to write the events of vehicle {vehicle_id}, retrying: {str(e)}")
+                    with self._lock:
+                        self._buffer[vehicle_id][:0] = items
+                        self._buffered += len(items)
+            if written:
+                self._events_total += written
+                self._batches_total += 1
+                self._recent.append((time.time(), written))
+            return written
+
+    def _write(self, vehicle_id: str, items: List[tuple]) -> int:
+        events = [event for event, _ in items]
+        if not self.store.has_vehicle(vehicle_id):
+            try:
+                ensure_vehicle_indexed(vehicle_id)
+            except ValueError:
+                # First events of a vehicle we have no history for
+                pass
+        aggregate = self._aggregate(vehicle_id)
+        self.store.append(vehicle_id, events)
+        _update_aggregate(aggregate, events)
+        committed_at = time.time()
+        self._lags.extend(committed_at - sent_at for _, sent_at in items)
+        return len(events)
+
+    def _aggregate(self, vehicle_id: str) -> dict:
+        aggregate = self._aggregates.get(vehicle_id)
+        if aggregate is None:
+            aggregate = _new_aggregate()
+            if self.store.has_vehicle(vehicle_id):
+                _update_aggregate(aggregate, self.store.query(vehicle_id))
+            self._aggregates[vehicle_id] = aggregate
+        return aggregate
+
+    def aggregates(self, vehicle_id: str) -> dict:
+        """
+        Running aggregates of a vehicle: event count per type, max speed and time span.
+
+        Raises:
+            ValueError: If the vehicle is unknown
+        """
+        with self._flush_lock:
+            ensure_vehicle_indexed(vehicle_id)
+            return dict(self._aggregate(vehicle_id), vehicle_id=vehicle_id)
+
+    def stats(self, window: float = 60.0) -> dict:
+        """
+        Ingest metrics: totals, throughput over the last `window` seconds and freshness lag.
+
+        Freshness lag is the time from `sent_at` (or receipt) of an event until it is
+        queryable in the store.
+        """
+        now = time.time()
+        while self._recent and self._recent[0][0] < now - window:
+            self._recent.popleft()
+        span = max(min(window, now - self._started_at), 1.0)
+        lags = sorted(self._lags)
+        return {
+            "events_total": self._events_total,
+            "batches_total": self._batches_total,
+            "rejected_total": self._rejected_total,
+            "skipped_total": self._skipped_total,
+            "buffered": self._buffered,
+            "events_per_sec": round(sum(n for _, n in self._recent) / span, 2),
+            "freshness_lag_sec": {
+                "p50": round(lags[len(lags) // 2], 3) if lags else None,
+                "p99": round(lags[int(len(lags) * 0.99)], 3) if lags else None,
+                "max": round(lags[-1], 3) if lags else None,
+            },
+            "vehicles_tracked": len(self._aggregates),
+        }
+
+
+def _new_aggregate() -> dict:
+    return {"events": 0, "by_type": {}, "max_speed_kmh": None, "first_time": None, "last_time": None}
+
+
+def _update_aggregate(aggregate: dict, events: List[dict]):
+    for event in events:
+        aggregate["events"] += 1
+        aggregate["by_type"][event["type"]] = aggregate["by_type"].get(event["type"], 0) + 1
+        if event.get("speed"):
+            speed = float(str(event["speed"]).lower().removesuffix("km/h"))
+            if aggregate["max_speed_kmh"] is None or speed > aggregate["max_speed_kmh"]:
+                aggregate["max_speed_kmh"] = speed
+        if aggregate["first_time"] is None or event["time"] < aggregate["first_time"]:
+            aggregate["first_time"] = event["time"]
+        if aggregate["last_time"] is None or event["time"] > aggregate["last_time"]:
+            aggregate["last_time"] = event["time"]
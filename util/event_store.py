@@ -0,0 +1,282 @@
+import os
+import re
+import mmap
+import json
+import time
+import struct
+import calendar
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+
+# Each vehicle is stored in its own file, `<vehicle_id>.evt`, holding a small
+# header followed by fixed-width records sorted by event time:
+#   time (int64, seconds since epoch) | type (uint8) | pad | speed (float32, NaN if absent) | lng (float64) | lat (float64)
+# The sorted time column is the per-vehicle index: files are memory-mapped and
+# searched with bisection, so a time-window lookup is O(log n) and parses nothing.
+MAGIC = b"SDVEVT01"
+HEADER_SIZE = 16
+RECORD = struct.Struct("<qB3xfdd")
+RECORD_SIZE = RECORD.size
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+EVENT_TYPES = ("sudden_acceleration", "max_speed", "sudden_deceleration")
+EVENT_TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+_VEHICLE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+_TIME = struct.Struct("<q")
+
+
+def parse_event_time(value: str, end_of_day: bool = False) -> int:
+    """
+    Convert an event time string into seconds since epoch.
+
+    Args:
+        value (str): 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD'
+        end_of_day (bool): For date-only values, return the last second of that day
+
+    Returns:
+        int: The timestamp used by the store
+    """
+    value = value.strip()
+    dt = datetime.fromisoformat(value)
+    ts = calendar.timegm(dt.timetuple())
+    if end_of_day and len(value) <= 10:
+        ts += 86399
+    return ts
+
+
+def validate_vehicle_id(vehicle_id: str) -> str:
+    """
+    Raises:
+        ValueError: If `vehicle_id` cannot name a store file
+    """
+    if not isinstance(vehicle_id, str) or not _VEHICLE_ID_RE.match(vehicle_id):
+        raise ValueError(f"Invalid vehicle id '{vehicle_id}'")
+    return vehicle_id
+
+
+def format_event_time(ts: int) -> str:
+    return time.strftime(TIME_FORMAT, time.gmtime(ts))
+
+
+def encode_event(event: dict) -> bytes:
+    """
+    Encode one behaviour event (as found in `data/vehicle_*.json`) into a store record.
+
+    Raises:
+        ValueError: If the event type is unknown or a field is malformed
+    """
+    event_type = event.get("type")
+    if event_type not in EVENT_TYPE_CODES:
+        raise ValueError(f"Unknown event type '{event_type}'")
+    lng, lat = (float(v) for v in event["location"].split(","))
+    speed = event.get("speed")
+    speed = float(str(speed).lower().removesuffix("km/h")) if speed not in (None, "") else float("nan")
+    return RECORD.pack(parse_event_time(event["time"]), EVENT_TYPE_CODES[event_type], speed, lng, lat)
+
+
+def decode_event(ts: int, type_code: int, speed: float, lng: float, lat: float) -> dict:
+    event = {
+        "time": format_event_time(ts),
+        "type": EVENT_TYPES[type_code],
+        "location": f"{lng:.6f},{lat:.6f}",
+    }
+    if speed == speed:
+        event["speed"] = f"{speed:g}km/h"
+    return event
+
+
+class _Segment:
+    """A memory-mapped, read-only view over one vehicle file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not an event store file: {path}")
+        self.key = (stat.st_size, stat.st_mtime_ns)
+        self.count = (stat.st_size - HEADER_SIZE) // RECORD_SIZE
+
+    def time_at(self, index: int) -> int:
+        return _TIME.unpack_from(self.mm, HEADER_SIZE + index * RECORD_SIZE)[0]
+
+    def bisect(self, ts: int, right: bool = False) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self.time_at(mid)
+            if t < ts or (right and t == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, start: Optional[int], end: Optional[int]) -> range:
+        lo = 0 if start is None else self.bisect(start)
+        hi = self.count if end is None else self.bisect(end, right=True)
+        return range(lo, max(lo, hi))
+
+    def record(self, index: int) -> tuple:
+        return RECORD.unpack_from(self.mm, HEADER_SIZE + index * RECORD_SIZE)
+
+
+class EventStore:
+    """
+    On-disk, per-vehicle store of driving behaviour events.
+
+    Args:
+        root (str): Directory holding the `<vehicle_id>.evt` files
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._segments: Dict[str, _Segment] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, vehicle_id: str) -> str:
+        return os.path.join(self.root, f"{validate_vehicle_id(vehicle_id)}.evt")
+
+    def has_vehicle(self, vehicle_id: str) -> bool:
+        return os.path.exists(self.path(vehicle_id))
+
+    def vehicles(self) -> List[str]:
+        return sorted(name[:-4] for name in os.listdir(self.root) if name.endswith(".evt"))
+
+    def _segment(self, vehicle_id: str) -> _Segment:
+        path = self.path(vehicle_id)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                raise ValueError(f"Vehicle '{vehicle_id}' not found") from None
+            segment = self._segments.get(vehicle_id)
+            if segment is None or segment.key != (stat.st_size, stat.st_mtime_ns):
+                segment = _Segment(path)
+                self._segments[vehicle_id] = segment
+            return segment
+
+    def build(self, vehicle_id: str, events: Iterable[dict]) -> int:
+        """
+        Replace the stored history of a vehicle with `events`.
+
+        Returns:
+            int: Number of records written
+        """
+        records = sorted((encode_event(e) for e in events), key=lambda r: _TIME.unpack_from(r)[0])
+        path = self.path(vehicle_id)
+        tmp = f"{path}.tmp"
+        with self._lock:
+            with open(tmp, "wb") as f:
+                f.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+                f.writelines(records)
+            os.replace(tmp, path)
+            self._segments.pop(vehicle_id, None)
+        return len(records)
+
+    def append(self, vehicle_id: str, events: Iterable[dict]) -> int:
+        """
+        Append events to a vehicle's history, keeping the file sorted by time.
+
+        In-order batches are appended in place; a batch reaching back before the
+        last stored event triggers a merge rewrite of the file.
+
+        Returns:
+            int: Number of records appended
+        """
+        records = sorted((encode_event(e) for e in events), key=lambda r: _TIME.unpack_from(r)[0])
+        if not records:
+            return 0
+        with self._lock:
+            if not self.has_vehicle(vehicle_id):
+                self.build(vehicle_id, [])
+            segment = self._segment(vehicle_id)
+            last = segment.time_at(segment.count - 1) if segment.count else None
+            if last is not None and _TIME.unpack_from(records[0])[0] < last:
+                existing = [segment.mm[HEADER_SIZE + i * RECORD_SIZE:HEADER_SIZE + (i + 1) * RECORD_SIZE]
+                            for i in range(segment.count)]
+                merged = sorted(existing + records, key=lambda r: _TIME.unpack_from(r)[0])
+                path = self.path(vehicle_id)
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(MAGIC.ljust(HEADER_SIZE, b"\0"))
+                    f.writelines(merged)
+                os.replace(f"{path}.tmp", path)
+            else:
+                with open(self.path(vehicle_id), "ab") as f:
+                    f.writelines(records)
+            self._segments.pop(vehicle_id, None)
+        return len(records)
+
+    def count(self, vehicle_id: str, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        segment = self._segment(vehicle_id)
+        return len(segment.window(*self._bounds(start, end)))
+
+    def query(
+        self,
+        vehicle_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        types: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """
+        Return the events of a vehicle within [start, end], in time order.
+
+        Args:
+            vehicle_id (str): The vehicle to query
+            start (str, optional): Inclusive lower bound, 'YYYY-MM-DD[ HH:MM:SS]'
+            end (str, optional): Inclusive upper bound; a bare date covers the whole day
+            types (list, optional): Only return events of these types
+            limit (int, optional): Maximum number of events to return
+
+        Raises:
+            ValueError: If the vehicle is unknown or an argument is invalid
+        """
+        segment = self._segment(vehicle_id)
+        codes = None
+        if types:
+            unknown = [t for t in types if t not in EVENT_TYPE_CODES]
+            if unknown:
+                raise ValueError(f"Unknown event types: {unknown}")
+            codes = {EVENT_TYPE_CODES[t] for t in types}
+
+        events = []
+        for index in segment.window(*self._bounds(start, end)):
+            if limit is not None and len(events) >= limit:
+                break
+            record = segment.record(index)
+            if codes is None or record[1] in codes:
+                events.append(decode_event(*record))
+        return events
+
+    def iter_records(self, vehicle_id: str, start: Optional[str] = None, end: Optional[str] = None):
+        """Yield the undecoded `(time, type_code, speed, lng, lat)` tuples of a vehicle within [start, end]."""
+        segment = self._segment(vehicle_id)
+        for index in segment.window(*self._bounds(start, end)):
+            yield segment.record(index)
+
+    def record_slice(self, vehicle_id: str, start: Optional[str] = None, end: Optional[str] = None) -> memoryview:
+        """
+        Return the raw records of a vehicle within [start, end] without decoding them.
+        The buffer layout is `RECORD`, suitable for `numpy.frombuffer`.
+        """
+        segment = self._segment(vehicle_id)
+        window = segment.window(*self._bounds(start, end))
+        offset = HEADER_SIZE + window.start * RECORD_SIZE
+        return memoryview(segment.mm)[offset:offset + len(window) * RECORD_SIZE]
+
+    @staticmethod
+    def _bounds(start: Optional[str], end: Optional[str]):
+        return (
+            parse_event_time(start) if start else None,
+            parse_event_time(end, end_of_day=True) if end else None,
+        )
+
+
+def import_json_file(store: EventStore, vehicle_id: str, json_path: str) -> int:
+    """Load a `{"data": [...]}` behaviour file into the store for `vehicle_id`."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        return store.build(vehicle_id, json.load(f)["data"])
@@ -0,0 +1,137 @@
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .driver_behavior import ensure_vehicle_indexed
+from .event_store import format_event_time
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+_metrics_lock = threading.Lock()
+_metrics = {"points": 0, "clusters": 0, "calls": 0}
+
+
+def parse_location(location: str) -> Tuple[float, float]:
+    """Parse a `"lng,lat"` string into floats."""
+    lng, lat = location.split(",")
+    return float(lng), float(lat)
+
+
+def haversine_m(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    """Great-circle distance between two points, in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridClusterIndex:
+    """
+    Snaps points into clusters of a given radius using a uniform lat/lng grid.
+
+    A point joins the nearest existing cluster whose anchor (first point) lies within
+    `radius_m`, otherwise it starts a new cluster. Only the grid cells around a point
+    are searched, so adding a point costs O(1) on average.
+
+    Args:
+        radius_m (float): Cluster radius in metres
+    """
+
+    def __init__(self, radius_m: float = 200):
+        if radius_m <= 0:
+            raise ValueError("radius_m must be positive")
+        self.radius_m = radius_m
+        self.cell_deg = radius_m / METERS_PER_DEGREE
+        self.anchors: List[Tuple[float, float]] = []
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lng / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def add(self, lng: float, lat: float) -> int:
+        """
+        Add a point and return the id of the cluster it belongs to.
+        """
+        cx, cy = self._cell(lng, lat)
+        # A degree of longitude shrinks with latitude, so look further along x
+        span_x = math.ceil(1 / max(math.cos(math.radians(lat)), 1e-6))
+        best, best_dist = None, self.radius_m
+        for x in range(cx - span_x, cx + span_x + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for cluster_id in self._cells.get((x, y), ()):
+                    dist = haversine_m(lng, lat, *self.anchors[cluster_id])
+                    if dist <= best_dist:
+                        best, best_dist = cluster_id, dist
+        if best is not None:
+            return best
+        self.anchors.append((lng, lat))
+        self._cells.setdefault((cx, cy), []).append(len(self.anchors) - 1)
+        return len(self.anchors) - 1
+
+
+def cluster_vehicle_locations(
+    vehicle_id: str,
+    radius_m: float = 200,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> dict:
+    """
+    Group the event locations of a vehicle into clusters of `radius_m`, so that each cluster
+    only needs to be reverse-geocoded once.
+
+    Args:
+        vehicle_id (str): The vehicle to query
+        radius_m (float): Cluster radius in metres
+        start (str, optional): Only cluster events at or after this time
+        end (str, optional): Only cluster events at or before this time
+
+    Returns:
+        dict: `clusters` with their anchor `location`, event count, time span and the distinct
+        `dates` with events (to join with daily weather), plus the collapse ratio
+        (events per cluster) of this call and of the process so far.
+
+    Raises:
+        ValueError: If the vehicle is unknown or an argument is invalid
+    """
+    store = ensure_vehicle_indexed(vehicle_id)
+    index = GridClusterIndex(radius_m)
+    clusters: List[dict] = []
+    events = 0
+    for ts, _type, _speed, lng, lat in store.iter_records(vehicle_id, start=start, end=end):
+        events += 1
+        cluster_id = index.add(lng, lat)
+        if cluster_id == len(clusters):
+            clusters.append({"cluster_id": cluster_id, "location": f"{lng:.6f},{lat:.6f}",
+                             "events": 0, "first_time": ts, "last_time": ts, "dates": []})
+        cluster = clusters[cluster_id]
+        cluster["events"] += 1
+        cluster["last_time"] = ts
+        date = format_event_time(ts)[:10]
+        if not cluster["dates"] or cluster["dates"][-1] != date:
+            cluster["dates"].append(date)
+
+    for cluster in clusters:
+        cluster["first_time"] = format_event_time(cluster["first_time"])
+        cluster["last_time"] = format_event_time(cluster["last_time"])
+
+    with _metrics_lock:
+        _metrics["calls"] += 1
+        _metrics["points"] += events
+        _metrics["clusters"] += len(clusters)
+    return {
+        "vehicle_id": vehicle_id,
+        "radius_m": radius_m,
+        "events": events,
+        "collapse_ratio": round(events / len(clusters), 2) if clusters else None,
+        "clusters": clusters,
+        "totals": cluster_metrics(),
+    }
+
+
+def cluster_metrics() -> dict:
+    """Process-wide clustering counters, to tune the cluster radius."""
+    with _metrics_lock:
+        points, clusters = _metrics["points"], _metrics["clusters"]
+        return dict(_metrics, collapse_ratio=round(points / clusters, 2) if clusters else None)
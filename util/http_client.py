@@ -0,0 +1,101 @@
+import os
+import random
+import asyncio
+import logging
+import weakref
+from typing import Optional
+
+import anyio
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AsyncHttpClient:
+    """
+    Shared asynchronous HTTP client with keep-alive pooling, bounded concurrency,
+    timeouts and retries with exponential backoff.
+
+    Args:
+        timeout (float): Per-request timeout in seconds
+        max_connections (int): Size of the keep-alive connection pool
+        max_concurrency (int): Maximum number of requests in flight at once
+        retries (int): Retries after a transport error, timeout or retryable status code
+        backoff (float): Base delay of the exponential backoff, in seconds
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._limiter = anyio.CapacityLimiter(max_concurrency)
+
+    async def get(self, url: str, params: Optional[dict] = None) -> httpx.Response:
+        """
+        Send a GET request, retrying transient failures.
+
+        Raises:
+            httpx.HTTPError: If the request still fails after all retries
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._limiter:
+                    response = await self._client.get(url, params=params)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return response
+                logger.warning(f"GET {url} returned {response.status_code}, retrying")
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning(f"GET {url} failed: {str(e)}, retrying")
+            attempt += 1
+            await anyio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random() / 2))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+# One client per event loop: its connections and limiter are bound to the loop that
+# created them, and fleet runs and benchmarks start a new loop per `anyio.run`
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHttpClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> AsyncHttpClient:
+    """
+    Return the HTTP client of the running event loop, configured from `HTTP_TIMEOUT`,
+    `HTTP_MAX_CONNECTIONS`, `HTTP_MAX_CONCURRENCY` and `HTTP_RETRIES`.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncHttpClient(
+            timeout=float(os.getenv('HTTP_TIMEOUT', '10')),
+            max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '20')),
+            max_concurrency=int(os.getenv('HTTP_MAX_CONCURRENCY', '10')),
+            retries=int(os.getenv('HTTP_RETRIES', '3')),
+        )
+        # `asyncio.run` and `anyio.run` close the loop's async generators on shutdown, which
+        # closes the client; the client holds the generator, as the loop only keeps a weak reference
+        client._closer = _close_at_shutdown(client)
+        asyncio.ensure_future(client._closer.asend(None))
+    return client
+
+
+async def _close_at_shutdown(client: AsyncHttpClient):
+    try:
+        yield
+    finally:
+        await client.aclose()
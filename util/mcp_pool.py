@@ -0,0 +1,276 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import anyio
+
+from .mqtt_mcp_client import MQTTMCPClient
+from .sharding import route_sharded_tools, shard_server_name
+from .tracing import traced_tool
+
+logger = logging.getLogger(__name__)
+
+
+VEHICLE_SERVER = "sdv/devices/vehicle"
+DEFAULT_REQUIRED_SERVERS = f"{VEHICLE_SERVER},sdv/system_tools/weather"
+
+
+def default_mcp_servers() -> List[dict]:
+    """
+    The MCP servers used by the report workflow: all `sdv/#` servers over MQTT, plus Gaode over SSE.
+
+    MQTT discovery waits for the servers listed in `MCP_REQUIRED_SERVERS` for at most
+    `MCP_DISCOVERY_TIMEOUT` seconds. `MQTT_PORT` and `GAODE_MCP_URL` point the pool at
+    other endpoints, e.g. the local stand-ins of `bench/`.
+    """
+    gaode_url = os.getenv("GAODE_MCP_URL") or f'https://mcp.amap.com/sse?key={os.getenv("GAODE_KEY")}'
+    return [
+        {"command_or_url": f"mqtt://{os.getenv('MQTT_BROKER', 'localhost')}:{os.getenv('MQTT_PORT', '1883')}", "args": []},
+        {"command_or_url": gaode_url, "args": []},
+    ]
+
+
+def required_servers() -> List[str]:
+    """
+    MQTT servers that discovery waits for: `MCP_REQUIRED_SERVERS`, with the vehicle server
+    expanded to each of its `VEHICLE_SHARD_COUNT` shards.
+    """
+    count = int(os.getenv("VEHICLE_SHARD_COUNT", "1"))
+    names = []
+    for name in os.getenv("MCP_REQUIRED_SERVERS", DEFAULT_REQUIRED_SERVERS).split(","):
+        if name == VEHICLE_SERVER:
+            names.extend(shard_server_name(name, index, count) for index in range(count))
+        else:
+            names.append(name)
+    return names
+
+
+def transport_of(command_or_url: str) -> str:
+    """The transport used for an MCP server: 'mqtt', 'sse', 'http' or 'stdio'."""
+    if command_or_url.startswith("mqtt"):
+        return "mqtt"
+    if command_or_url.startswith(("http://", "https://")):
+        return "sse" if command_or_url.split("?")[0].rstrip("/").endswith("/sse") else "http"
+    return "stdio"
+
+
+class McpToolPool:
+    """
+    Long-lived MCP connections and tool lists, shared by every `DriverBehaviorFlow` of the process.
+
+    Servers are connected concurrently on first use; later callers get the cached tools.
+    Every `health_check_interval` seconds the servers are probed with `list_tools`, and a
+    server that fails the probe (or failed to connect) is closed and reconnected. Each MQTT
+    connection lives in a task of its own, which closes it on `aclose`. Tool calls are traced
+    with their transport, see `traced_tool`. The tools of sharded vehicle servers are merged
+    into router tools, see `route_sharded_tools`.
+
+    Args:
+        servers (list): `{"command_or_url": ..., "args": [...]}` entries, see `default_mcp_servers`
+        health_check_interval (float): Minimum seconds between two health checks
+        connect_timeout (float): Timeout of connecting to and listing the tools of one server
+    """
+
+    def __init__(self, servers: Optional[List[dict]] = None, health_check_interval: float = 30, connect_timeout: float = 60):
+        self.servers = servers or default_mcp_servers()
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self._entries: Dict[str, dict] = {}
+        self._lock = anyio.Lock()
+        self._last_check = 0.0
+        self._stats = {"acquires": 0, "reconnects": 0, "cold_start_sec": None, "last_acquire_sec": None}
+
+    async def get_tools(self) -> list:
+        """
+        Return the tools of all connected servers, connecting or reconnecting servers as needed.
+
+        Raises:
+            RuntimeError: If no server could be connected
+        """
+        started = time.perf_counter()
+        async with self._lock:
+            cold = not self._entries
+            if cold:
+                await self._connect_all(self.servers)
+            elif time.monotonic() - self._last_check >= self.health_check_interval:
+                await self._check_health()
+            # One tool per name, the agent cannot tell duplicates apart
+            by_name = {}
+            for entry in self._entries.values():
+                if entry["healthy"]:
+                    for tool in entry["tools"]:
+                        by_name.setdefault(tool.metadata.name, tool)
+            tools = list(by_name.values())
+        if not tools:
+            raise RuntimeError("No MCP server could be connected")
+
+        elapsed = time.perf_counter() - started
+        self._stats["acquires"] += 1
+        self._stats["last_acquire_sec"] = round(elapsed, 4)
+        if cold:
+            self._stats["cold_start_sec"] = round(elapsed, 4)
+        return tools
+
+    async def _connect_all(self, servers: List[dict]):
+        async with anyio.create_task_group() as tg:
+            for server in servers:
+                tg.start_soon(self._connect, server)
+        self._last_check = time.monotonic()
+
+    async def _connect(self, server: dict):
+        from llama_index.tools.mcp import BasicMCPClient, McpToolSpec
+
+        command_or_url = server["command_or_url"]
+        started = time.perf_counter()
+        entry = {"server": server, "clients": {}, "server_tools": [], "tools": [], "healthy": False, "connect_sec": None, "error": None}
+        try:
+            with anyio.fail_after(self.connect_timeout):
+                if command_or_url.startswith("mqtt"):
+                    mqtt_mcp_client = MQTTMCPClient(
+                        uri=command_or_url,
+                        client_desc="sdv app",
+                        server_name_filter="sdv/#",
+                        required_servers=required_servers(),
+                        discovery_timeout=float(os.getenv("MCP_DISCOVERY_TIMEOUT", "10")),
+                        on_server_added=lambda name, session: self._add_session(entry, name, session),
+                    )
+                    entry["mqtt_client"] = mqtt_mcp_client
+                    await self._start_mqtt_client(entry, mqtt_mcp_client)
+                    named_clients = mqtt_mcp_client.named_sessions()
+                else:
+                    named_clients = [(None, BasicMCPClient(command_or_url=command_or_url, args=server["args"]))]
+                entry["clients"] = dict(named_clients)
+                for server_name, client in named_clients:
+                    tools = await McpToolSpec(client=client).to_tool_list_async()
+                    entry["server_tools"].extend((server_name, traced_tool(tool, transport_of(command_or_url))) for tool in tools)
+                entry["tools"] = route_sharded_tools(entry["server_tools"])
+            entry["healthy"] = True
+        except Exception as e:
+            entry["error"] = str(e) or type(e).__name__
+            logger.error(f"Failed to connect to MCP server {command_or_url.split('?')[0]}: {entry['error']}")
+        finally:
+            if not entry["healthy"]:
+                await self._close_entry(entry)
+        entry["connect_sec"] = round(time.perf_counter() - started, 4)
+        self._entries[command_or_url] = entry
+
+    async def _start_mqtt_client(self, entry: dict, client: MQTTMCPClient):
+        """
+        Connect `client` in a task of its own and wait until discovery returned.
+
+        The MQTT connection's task group and cancel scopes are bound to the task that enters
+        them, so a task of its own connects, holds and finally closes the client, rather than
+        the caller's task or its timeout scope. See `_close_entry`.
+        """
+        connected, stop = anyio.Event(), anyio.Event()
+        failure = []
+
+        async def own():
+            try:
+                await client.connect()
+            except BaseException as e:
+                # Failed, or cancelled by `_close_entry` on a timeout: close what was opened
+                if isinstance(e, Exception):
+                    failure.append(e)
+                connected.set()
+                await _aclose_quietly(client)
+                if not isinstance(e, Exception):
+                    raise
+                return
+            connected.set()
+            await stop.wait()
+            await _aclose_quietly(client)
+
+        entry["owner"], entry["connected"], entry["stop"] = asyncio.ensure_future(own()), connected, stop
+        await connected.wait()
+        if failure:
+            raise failure[0]
+
+    @staticmethod
+    async def _close_entry(entry: dict):
+        """Close the connection of an entry, if it has a task of its own, and wait until it is closed."""
+        owner = entry.get("owner")
+        if owner is None or owner.done():
+            return
+        entry["stop"].set()
+        if not entry["connected"].is_set():
+            owner.cancel()
+        with anyio.CancelScope(shield=True):
+            await asyncio.wait({owner})
+
+    async def _add_session(self, entry: dict, server_name: str, session):
+        """Add the tools of an MQTT server discovered after startup to the live tool set."""
+        from llama_index.tools.mcp import McpToolSpec
+
+        try:
+            tools = await McpToolSpec(client=session).to_tool_list_async()
+        except Exception as e:
+            logger.error(f"Failed to list the tools of MCP server {server_name}: {str(e)}")
+            return
+        # A server seen before (e.g. restarted) replaces its session and tools
+        entry["clients"][server_name] = session
+        entry["server_tools"] = [(name, tool) for name, tool in entry["server_tools"] if name != server_name]
+        entry["server_tools"].extend((server_name, traced_tool(tool, "mqtt")) for tool in tools)
+        entry["tools"] = route_sharded_tools(entry["server_tools"])
+        logger.info(f"Added {len(tools)} tools of MCP server {server_name}")
+
+    async def _check_health(self):
+        unhealthy = []
+
+        async def probe(entry: dict):
+            try:
+                with anyio.fail_after(self.connect_timeout):
+                    for client in entry["clients"].values():
+                        await client.list_tools()
+            except Exception as e:
+                entry["healthy"] = False
+                entry["error"] = str(e) or type(e).__name__
+            if not entry["healthy"]:
+                unhealthy.append(entry)
+
+        async with anyio.create_task_group() as tg:
+            for entry in self._entries.values():
+                tg.start_soon(probe, entry)
+        if unhealthy:
+            self._stats["reconnects"] += len(unhealthy)
+            # Close the old connections first, a new client is created for each server
+            for entry in unhealthy:
+                await self._close_entry(entry)
+            await self._connect_all([entry["server"] for entry in unhealthy])
+        self._last_check = time.monotonic()
+
+    async def aclose(self):
+        """Close all connections; the next `get_tools` connects again."""
+        async with self._lock:
+            for entry in self._entries.values():
+                await self._close_entry(entry)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Cold start and acquire latency of the pool, and connection state of each server."""
+        servers = {}
+        for url, entry in self._entries.items():
+            servers[url.split("?")[0]] = {k: entry[k] for k in ("healthy", "connect_sec", "error")} | {"tools": len(entry["tools"])}
+            if "mqtt_client" in entry:
+                servers[url.split("?")[0]]["mqtt_servers"] = entry["mqtt_client"].server_stats()
+        return dict(self._stats, servers=servers)
+
+
+async def _aclose_quietly(client: MQTTMCPClient):
+    try:
+        await client.aclose()
+    except Exception as e:
+        logger.warning(f"Failed to close MQTT client: {str(e)}")
+
+
+_pool = None
+
+
+def get_mcp_tool_pool() -> McpToolPool:
+    """Return the process-wide tool pool over `default_mcp_servers`."""
+    global _pool
+    if _pool is None:
+        _pool = McpToolPool()
+    return _pool
@@ -1,22 +1,45 @@
 from contextlib import asynccontextmanager
 from contextlib import AsyncExitStack
-from typing import Optional, List, Dict
+from typing import Awaitable, Callable, Optional, List, Dict
 from urllib.parse import urlparse
+import time
 import anyio
 
 from mcp.client.mqtt import MqttTransportClient, MqttOptions
 
 class MQTTMCPClient():
+    """
+    Discovers and connects to MCP servers over MQTT.
+
+    `connect` returns as soon as every server in `required_servers` (or
+    `max_servers_to_discover` servers) is initialized, or when `discovery_timeout`
+    expires, whichever comes first. Discovery keeps running afterwards: servers
+    that show up later are initialized too, and reported to `on_server_added`.
+
+    Args:
+        uri: mqtt://host:port of the broker
+        client_desc: Description of this MCP client
+        server_name_filter: Topic filter of the server names to discover, e.g. 'sdv/#'
+        max_servers_to_discover: Return once this many servers are initialized
+        required_servers: Return once a server matching each of these names is initialized;
+            a name also matches its sub-names, e.g. 'sdv/devices/vehicle' matches 'sdv/devices/vehicle/shard/0-of-2'
+        discovery_timeout: Seconds to wait for discovery before returning what is there
+        on_server_added: `async on_server_added(server_name, session)`, called for servers
+            initialized after `connect` returned
+    """
 
     def __init__(
         self,
         uri: str,
         client_desc: str,
         server_name_filter: str,
-        max_servers_to_discover: int,
+        max_servers_to_discover: Optional[int] = None,
         args: Optional[List[str]] = None,
         env: Optional[Dict[str, str]] = None,
         timeout: int = 30,
+        required_servers: Optional[List[str]] = None,
+        discovery_timeout: float = 10,
+        on_server_added: Optional[Callable[[str, object], Awaitable[None]]] = None,
     ):
         parse_uri = urlparse(uri)
         self.host = parse_uri.hostname
@@ -24,16 +47,21 @@ class MQTTMCPClient():
         self.client_desc = client_desc
         self.server_name_filter = server_name_filter
         self.max_servers_to_discover = max_servers_to_discover
-        send_stream, receive_stream = anyio.create_memory_object_stream()
-        self.server_discover_finish_snd = send_stream
-        self.server_discover_finish_rcv = receive_stream
+        self.required_servers = required_servers or []
+        self.discovery_timeout = discovery_timeout
+        self.on_server_added = on_server_added
+        self.server_discover_finished = anyio.Event()
         self.mcp_servers = []
         self.args = args or []
         self.env = env or {}
         self.timeout = timeout
         self.exit_stack: AsyncExitStack = AsyncExitStack()
+        self.connect_started = None
+        self.connect_returned = False
+        self.discovered_at: Dict[str, float] = {}
 
     async def connect(self):
+        self.connect_started = time.monotonic()
         mqtt_client = await self.exit_stack.enter_async_context(
             MqttTransportClient(
                 self.client_desc,
@@ -49,26 +77,74 @@ class MQTTMCPClient():
         )
         mqtt_client.start()
         self.mqtt_client = mqtt_client
-        async with self.server_discover_finish_rcv:
-            async for item in self.server_discover_finish_rcv:
-                if item == 'discovery_finished':
-                    break
+        with anyio.move_on_after(self.discovery_timeout) as scope:
+            await self.server_discover_finished.wait()
+        if scope.cancelled_caught:
+            missing = [name for name in self.required_servers if not self._has_server(name)]
+            print(f"Discovery deadline of {self.discovery_timeout}s expired, missing MCP/MQTT servers: {missing}")
+        self.connect_returned = True
         for server in self.mcp_servers:
             if not server['success']:
                 print(f"Failed to initalize with MCP server: {server['server_name']}")
-            print(f"Initalized with MCP/MQTT server: {server['server_name']}")
-        return [mqtt_client.get_session(server['server_name']) for server in self.mcp_servers if server['success']]
+            else:
+                print(f"Initalized with MCP/MQTT server: {server['server_name']}")
+        return self.sessions()
+
+    async def aclose(self):
+        """
+        Close the MQTT connection and its tasks. Must be called from the task that called
+        `connect`, which owns the connection's task group.
+        """
+        await self.exit_stack.aclose()
+
+    def sessions(self):
+        """Sessions of all servers initialized so far, including those that appeared after `connect` returned."""
+        return [self.mqtt_client.get_session(server['server_name']) for server in self.mcp_servers if server['success']]
+
+    def named_sessions(self):
+        """`(server_name, session)` of all servers initialized so far."""
+        return [(server['server_name'], self.mqtt_client.get_session(server['server_name'])) for server in self.mcp_servers if server['success']]
+
+    def server_stats(self) -> List[dict]:
+        """Discovery latency (since `connect` started) and initialize latency of each server."""
+        return [
+            {k: server[k] for k in ('server_name', 'success', 'discover_sec', 'initialize_sec')}
+            for server in self.mcp_servers
+        ]
+
+    def _has_server(self, name: str) -> bool:
+        return any(
+            server['success'] and (server['server_name'] == name or server['server_name'].startswith(name + '/'))
+            for server in self.mcp_servers
+        )
+
+    def _discovery_done(self) -> bool:
+        successful = sum(1 for server in self.mcp_servers if server['success'])
+        if self.max_servers_to_discover is not None and successful >= self.max_servers_to_discover:
+            return True
+        return bool(self.required_servers) and all(self._has_server(name) for name in self.required_servers)
 
     async def on_mcp_server_discovered(self, client, server_name):
         print(f"Discovered {server_name}, connecting ...")
+        self.discovered_at[server_name] = time.monotonic()
         await client.initialize_mcp_server(server_name)
 
     async def on_mcp_connect(self, client, server_name, connect_result):
         success, _init_result = connect_result
-        self.mcp_servers.append({'server_name': server_name, 'success': success})
+        now = time.monotonic()
+        discovered_at = self.discovered_at.get(server_name, now)
+        self.mcp_servers = [server for server in self.mcp_servers if server['server_name'] != server_name]
+        self.mcp_servers.append({
+            'server_name': server_name,
+            'success': success,
+            'discover_sec': round(discovered_at - self.connect_started, 3),
+            'initialize_sec': round(now - discovered_at, 3),
+        })
 
-        print(f"Server Names now: {self.mcp_servers}")
-        if len(self.mcp_servers) >= self.max_servers_to_discover:
-            ## We stop the discovery if we have got at least 2 MCP/MQTT servers
-            print(f"Now that got {self.max_servers_to_discover} MCP/MQTT servers, stop discovery.")
-            await self.server_discover_finish_snd.send('discovery_finished')
+        print(f"Server Names now: {[server['server_name'] for server in self.mcp_servers]}")
+        if self.connect_returned:
+            if success and self.on_server_added is not None:
+                await self.on_server_added(server_name, client.get_session(server_name))
+        elif self._discovery_done():
+            print("Got the required MCP/MQTT servers, connect returns while discovery continues.")
+            self.server_discover_finished.set()
@@ -0,0 +1,154 @@
+import os
+import json
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .geo_cluster import haversine_m, parse_location
+from .weather_util import get_region_index
+
+
+class OfflineGeocoder:
+    """
+    Maps coordinates to the nearest known city centroid, without any network call.
+
+    Centroids are bucketed in a uniform lat/lng grid; a lookup only visits the cells
+    that can hold a centroid within `max_distance_km`. The centroids only cover the main
+    cities, so lookups far from them or near a border are left to the online geocoder,
+    see `locate`.
+
+    Args:
+        centroid_file (str): JSON file with `{"cities": [{"province", "city", "lng", "lat", "parent"?}, ...]}`
+        cell_deg (float): Grid cell size in degrees
+    """
+
+    def __init__(self, centroid_file: str, cell_deg: float = 0.5):
+        with open(centroid_file, "r", encoding="utf-8") as f:
+            self.cities: List[dict] = json.load(f)["cities"]
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, city in enumerate(self.cities):
+            self._cells.setdefault(self._cell(city["lng"], city["lat"]), []).append(i)
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lng / self.cell_deg), math.floor(lat / self.cell_deg)
+
+    def candidates(self, lng: float, lat: float, max_distance_km: float) -> List[Tuple[float, dict]]:
+        """`(distance_km, city)` of the centroids within `max_distance_km`, nearest first."""
+        cx, cy = self._cell(lng, lat)
+        span_y = math.ceil(max_distance_km / 111.2 / self.cell_deg)
+        span_x = math.ceil(span_y / max(math.cos(math.radians(min(abs(lat) + span_y * self.cell_deg, 89.0))), 1e-6))
+        found = []
+        for x in range(cx - span_x, cx + span_x + 1):
+            for y in range(cy - span_y, cy + span_y + 1):
+                for i in self._cells.get((x, y), ()):
+                    city = self.cities[i]
+                    dist = haversine_m(lng, lat, city["lng"], city["lat"]) / 1000
+                    if dist <= max_distance_km:
+                        found.append((dist, i))
+        return [(dist, self.cities[i]) for dist, i in sorted(found)]
+
+    def nearest(self, lng: float, lat: float, max_distance_km: float = 25) -> Optional[Tuple[dict, float]]:
+        """
+        Returns:
+            tuple: `(city, distance_km)` of the nearest centroid, or None if none is within `max_distance_km`
+        """
+        found = self.candidates(lng, lat, max_distance_km)
+        return (found[0][1], found[0][0]) if found else None
+
+    def locate(self, lng: float, lat: float, max_distance_km: float = 25, margin: float = 1.5) -> Tuple[Optional[dict], Optional[float], Optional[str]]:
+        """
+        The nearest centroid, if it is clearly the closest weather city.
+
+        The centroids are sparse, so a point near a border may be nearer to the centroid of
+        the neighbouring city than to its own. A match is only trusted when every centroid
+        of another weather city (`parent`, or `city` itself) is at least `margin` times
+        farther away.
+
+        Returns:
+            tuple: `(city, distance_km, error)`, city None with the reason in `error` if the
+            point should be resolved online instead
+        """
+        found = self.candidates(lng, lat, max_distance_km * margin)
+        if not found or found[0][0] > max_distance_km:
+            return None, None, f"No known city within {max_distance_km} km"
+        distance_km, city = found[0]
+        region = _weather_region(city)
+        for other_km, other in found[1:]:
+            if _weather_region(other) != region:
+                if other_km < distance_km * margin:
+                    return None, None, (
+                        f"Ambiguous location, {city['city']} is {distance_km:.1f} km and {other['city']} "
+                        f"{other_km:.1f} km away"
+                    )
+                break
+        return city, distance_km, None
+
+
+def _weather_region(city: dict) -> Tuple[str, str]:
+    return city["province"], city.get("parent") or city["city"]
+
+
+_geocoder = None
+
+
+def get_offline_geocoder() -> OfflineGeocoder:
+    """Return the geocoder over the bundled `data/city_centroids.json`, loaded once per process."""
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = OfflineGeocoder(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'city_centroids.json')
+        )
+    return _geocoder
+
+
+async def resolve_city_ids(locations: List[str], max_distance_km: float = 25) -> List[dict]:
+    """
+    Resolve `"lng,lat"` locations to Juhe weather city IDs in-process.
+
+    Only the first lookup in a province may call the Juhe city list API; the region
+    index persists it for later runs.
+
+    Args:
+        locations (list): Locations as found in the vehicle data
+        max_distance_km (float): Locations farther than this from every known city are left unresolved,
+            as are locations about as close to the centroids of two weather cities
+
+    Returns:
+        list: One entry per location, in order, with `province`, `city`, `city_id` and `distance_km`,
+        or an `error` if the location could not be resolved offline.
+    """
+    geocoder = get_offline_geocoder()
+    regions = get_region_index()
+    resolved: Dict[str, dict] = {}
+    results = []
+    for location in locations:
+        try:
+            lng, lat = parse_location(location)
+        except ValueError:
+            results.append({"location": location, "error": "Invalid location, expected 'lng,lat'"})
+            continue
+        city, distance_km, error = geocoder.locate(lng, lat, max_distance_km=max_distance_km)
+        if city is None:
+            results.append({"location": location, "error": error})
+            continue
+        key = f"{city['province']}/{city['city']}"
+        if key not in resolved:
+            resolved[key] = await _lookup_city_id(regions, city)
+        results.append({"location": location, **resolved[key], "distance_km": round(distance_km, 2)})
+    return results
+
+
+async def _lookup_city_id(regions, city: dict) -> dict:
+    try:
+        province_id = regions.province_id(city["province"])
+    except ValueError as e:
+        return {"province": city["province"], "city": city["city"], "error": str(e)}
+    error = None
+    for name in filter(None, (city["city"], city.get("parent"))):
+        try:
+            return {"province": city["province"], "city": name, "city_id": await regions.city_id(province_id, name)}
+        except ValueError as e:
+            error = str(e)
+        except Exception as e:
+            return {"province": city["province"], "city": city["city"], "error": str(e)}
+    return {"province": city["province"], "city": city["city"], "error": error}
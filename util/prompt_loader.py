@@ -1,45 +1,153 @@
 import os
-from typing import Dict, Optional
+import time
+import string
+import hashlib
+import threading
+from typing import Dict, List, Union
 import json
 
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prompts')
+
+
+def validate_template(template: str, source: str) -> List[str]:
+    """
+    Check that a template formats with `.format(ev=ev)`: braces are balanced, and every
+    placeholder is an attribute or item of `ev`.
+
+    Returns:
+        list: The placeholders of the template, e.g. ['ev.user_input']
+
+    Raises:
+        ValueError: On a malformed template or a placeholder other than `{ev.*}`
+    """
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"Malformed prompt template {source}: {str(e)}")
+    for field in fields:
+        if field != "ev" and not field.startswith(("ev.", "ev[")):
+            raise ValueError(f"Unsupported placeholder {{{field}}} in prompt template {source}, only {{ev.*}} is available")
+    return fields
+
+
+class PromptRegistry:
+    """
+    All prompt templates of `prompts/<lang>/`, loaded and validated once and served from memory.
+
+    `.txt` files are single templates, `.json` files map names to templates. Files are
+    re-checked by mtime at most every `reload_interval` seconds, so edited templates are
+    picked up by long-running services; a template that fails validation on reload is
+    reported and the last good version keeps being served.
+
+    Args:
+        base_dir (str): The `prompts` directory
+        reload_interval (float): Minimum seconds between two mtime checks of a file
+    """
+
+    def __init__(self, base_dir: str = PROMPTS_DIR, reload_interval: float = 1.0):
+        self.base_dir = base_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        # (lang, filename) -> {"path", "mtime", "checked", "value", "version"}
+        self._entries: Dict[tuple, dict] = {}
+        # Languages with a prompts directory; any other language is served the English prompts
+        self._langs = self.languages()
+        for lang in self._langs:
+            for filename in sorted(os.listdir(os.path.join(base_dir, lang))):
+                if filename.endswith(('.txt', '.json')):
+                    self._entries[(lang, filename)] = self._load(os.path.join(base_dir, lang, filename))
+
+    def languages(self) -> List[str]:
+        return sorted(d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d)))
+
+    def _load(self, path: str) -> dict:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            raw = f.read()
+        text = raw.decode('utf-8')
+        if path.endswith('.json'):
+            value = json.loads(text)
+            for key, template in value.items():
+                if not isinstance(template, str):
+                    raise ValueError(f"Prompt template {path}[{key}] is not a string")
+                validate_template(template, f"{path}[{key}]")
+        else:
+            value = text.strip()
+            validate_template(value, path)
+        return {"path": path, "mtime": mtime, "checked": time.monotonic(), "value": value, "version": hashlib.sha256(raw).hexdigest()}
+
+    def _entry(self, filename: str, lang: str) -> dict:
+        key = (lang, filename)
+        entry = self._entries.get(key)
+        if entry is None:
+            path = os.path.join(self.base_dir, lang, filename)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Prompt file not found at {path}")
+            with self._lock:
+                entry = self._entries[key] = self._load(path)
+            return entry
+        now = time.monotonic()
+        if now - entry["checked"] >= self.reload_interval:
+            entry["checked"] = now
+            try:
+                mtime = os.stat(entry["path"]).st_mtime_ns
+                if mtime != entry["mtime"]:
+                    # Not retried until the file changes again
+                    entry["mtime"] = mtime
+                    with self._lock:
+                        entry = self._entries[key] = self._load(entry["path"])
+                    print(f"Reloaded prompt file {entry['path']}")
+            except (OSError, ValueError) as e:
+                print(f"Failed to reload prompt file {entry['path']}, keeping the loaded version: {str(e)}")
+        return entry
+
+    def get(self, filename: str, lang: str = 'zh') -> Union[str, dict]:
+        """
+        Raises:
+            FileNotFoundError: If the prompt file does not exist
+        """
+        return self._entry(filename, self._lang(lang))["value"]
+
+    def version(self, filename: str, lang: str = 'zh') -> str:
+        """SHA-256 of the prompt file, for keying anything derived from its templates."""
+        return self._entry(filename, self._lang(lang))["version"]
+
+    def _lang(self, lang: str) -> str:
+        lang = lang.lower()
+        return lang if lang in self._langs else 'en'
+
+
+_registry = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """
+    Return the process-wide prompt registry. Creating it loads and validates every template,
+    so call it at startup to surface template errors early.
+    """
+    global _registry
+    if _registry is None:
+        _registry = PromptRegistry(reload_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "1")))
+    return _registry
+
+
 def load_system_prompt(prompt_filename: str ="", lang: str = 'zh') -> str:
     """
     Load system prompt from files based on specified text file name and language
-    
+
     Args:
         prompt_filename: The prompt file name
         lang: Language code ('en' or 'zh'), defaults to 'zh'
-        
+
     Returns:
         Combined prompt string
-        
+
     Raises:
         FileNotFoundError: If prompt files are not found
         Exception: For other loading errors
     """
     try:
-        # Get base directory for prompts
-        current_file = os.path.abspath(__file__)
-        base_dir = os.path.join(os.path.dirname(current_file), '..', 'prompts')
-        
-        # Validate and normalize language code
-        lang = lang.lower()
-        if lang not in ['en', 'zh']:
-            lang = 'en'
-            
-        # Construct language-specific directory path
-        lang_dir = os.path.join(base_dir, lang)
-        
-        # Load base prompt
-        promptfile = os.path.join(lang_dir, prompt_filename)
-        if not os.path.exists(promptfile):
-            print(f"Prompt file does not exist at: {promptfile}")
-            raise FileNotFoundError(f"Base prompt file not found at {promptfile}")
-
-        with open(promptfile, 'r', encoding='utf-8') as f:
-            prompt = f.read().strip()
-            return prompt
-
+        return get_prompt_registry().get(prompt_filename, lang)
     except Exception as e:
         print(f"Error loading prompt: {str(e)}")
         raise Exception(f"Failed to load prompt: {str(e)}")
@@ -47,44 +155,25 @@ def load_system_prompt(prompt_filename: str ="", lang: str = 'zh') -> str:
 def load_json_prompt(prompt_filename: str = "", lang: str = 'zh') -> dict:
     """
     Load JSON prompt from files based on specified JSON file name and language
-    
+
     Args:
         prompt_filename: The JSON prompt file name
         lang: Language code ('en' or 'zh'), defaults to 'zh'
-        
+
     Returns:
         dict: Parsed JSON content
-        
+
     Raises:
         FileNotFoundError: If JSON prompt files are not found
         JSONDecodeError: If JSON parsing fails
         Exception: For other loading errors
     """
     try:
-        # Get base directory for prompts
-        current_file = os.path.abspath(__file__)
-        base_dir = os.path.join(os.path.dirname(current_file), '..', 'prompts')
-        
-        # Validate and normalize language code
-        lang = lang.lower()
-        if lang not in ['en', 'zh']:
-            lang = 'en'
-            
-        # Construct language-specific directory path
-        lang_dir = os.path.join(base_dir, lang)
-        
-        # Load JSON prompt
-        promptfile = os.path.join(lang_dir, prompt_filename)
-        if not os.path.exists(promptfile):
-            print(f"JSON prompt file does not exist at: {promptfile}")
-            raise FileNotFoundError(f"JSON prompt file not found at {promptfile}")
-
-        with open(promptfile, 'r', encoding='utf-8') as f:
-            return json.load(f)
-
+        # A copy, so callers cannot modify the cached templates
+        return dict(get_prompt_registry().get(prompt_filename, lang))
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON: {str(e)}")
         raise
     except Exception as e:
         print(f"Error loading JSON prompt: {str(e)}")
-        raise Exception(f"Failed to load JSON prompt: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to load JSON prompt: {str(e)}")
@@ -0,0 +1,130 @@
+import os
+import json
+import asyncio
+import difflib
+import weakref
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Longest first, so that e.g. "自治区" is stripped before "区"
+_SUFFIXES = sorted(
+    ["特别行政区", "维吾尔自治区", "壮族自治区", "回族自治区", "自治区", "自治州", "自治县",
+     "地区", "新区", "林区", "省", "市", "区", "县", "盟", "旗"],
+    key=len, reverse=True,
+)
+
+
+def normalize_region_name(name: str) -> str:
+    """
+    Normalise an administrative region name for matching, e.g. '北京市' -> '北京', '海淀区' -> '海淀'.
+    Suffixes are only stripped while at least two characters remain.
+    """
+    name = "".join(name.split())
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in _SUFFIXES:
+            if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+                name = name[:-len(suffix)]
+                stripped = True
+                break
+    return name
+
+
+def _match(names: Dict[str, str], query: str) -> Optional[str]:
+    """Return the value for `query` in `names` (keyed by normalised name), matching loosely."""
+    key = normalize_region_name(query)
+    if key in names:
+        return names[key]
+    # '北京市海淀区' -> '海淀': the most specific known name contained in the query
+    contained = [(len(k), key.rfind(k), k) for k in names if k in key]
+    if contained:
+        return names[max(contained)[2]]
+    close = difflib.get_close_matches(key, names.keys(), n=1, cutoff=0.75)
+    return names[close[0]] if close else None
+
+
+class RegionIndex:
+    """
+    In-memory index of Juhe province and city IDs.
+
+    Provinces are loaded once from `province_file`. The cities of a province are loaded on
+    first use from `<city_dir>/<province_id>.json`, or fetched with `fetch_cities` and saved
+    there, so each province costs at most one API call ever. Concurrent first lookups
+    of a province share that call.
+
+    Args:
+        province_file (str): `province_ids.json`
+        city_dir (str): Directory where city lists are persisted
+        fetch_cities (callable): `async fetch_cities(province_id) -> [{"id": ..., "city_name": ...}, ...]`
+    """
+
+    def __init__(self, province_file: str, city_dir: str, fetch_cities: Callable[[str], Awaitable[List[dict]]]):
+        with open(province_file, "r", encoding="utf-8") as f:
+            provinces = json.load(f)["provinces"]
+        self.provinces: Dict[str, str] = {normalize_region_name(p["province"]): p["id"] for p in provinces}
+        self.province_names: Dict[str, str] = {p["id"]: p["province"] for p in provinces}
+        self.city_dir = city_dir
+        self.fetch_cities = fetch_cities
+        self._cities: Dict[str, Dict[str, str]] = {}
+        # Loads in progress by province, per event loop
+        self._loading: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+
+    def province_id(self, province: str) -> str:
+        """
+        Raises:
+            ValueError: If no province matches, listing the closest names
+        """
+        province_id = _match(self.provinces, province)
+        if province_id is None:
+            raise ValueError(f"Province '{province}' not found, known provinces: {sorted(self.province_names.values())}")
+        return province_id
+
+    async def cities(self, province_id: str) -> Dict[str, str]:
+        """
+        Normalised city name -> city ID for a province, loading it on first use.
+
+        Raises:
+            ValueError: If `province_id` is not a known province, it also names the cache file
+        """
+        province_id = str(province_id).strip()
+        if province_id not in self.province_names:
+            raise ValueError(f"Unknown province_id: {province_id!r}, use query_province_id to look it up")
+        cities = self._cities.get(province_id)
+        if cities is not None:
+            return cities
+        in_progress = self._loading.setdefault(asyncio.get_running_loop(), {})
+        loading = in_progress.get(province_id)
+        if loading is None:
+            loading = in_progress[province_id] = asyncio.ensure_future(self._load_cities(province_id))
+        try:
+            cities = await asyncio.shield(loading)
+        finally:
+            in_progress.pop(province_id, None)
+        self._cities[province_id] = {normalize_region_name(c["city_name"]): c["id"] for c in cities}
+        return self._cities[province_id]
+
+    async def _load_cities(self, province_id: str) -> List[dict]:
+        path = os.path.join(self.city_dir, f"{province_id}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        cities = [{"id": c["id"], "city_name": c["city_name"]} for c in await self.fetch_cities(province_id)]
+        os.makedirs(self.city_dir, exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(cities, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        return cities
+
+    async def city_id(self, province_id: str, city_name: str) -> str:
+        """
+        Raises:
+            ValueError: If no city of the province matches, listing the closest names
+        """
+        cities = await self.cities(province_id)
+        city_id = _match(cities, city_name)
+        if city_id is None:
+            candidates = difflib.get_close_matches(normalize_region_name(city_name), cities.keys(), n=5, cutoff=0.0)
+            raise ValueError(
+                f"City '{city_name}' cannot be found in province_id: {province_id}, closest cities: {candidates}"
+            )
+        return city_id
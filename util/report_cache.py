@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+from typing import Iterator, List, Optional
+
+from .disk_cache import DiskCache
+from .prompt_loader import get_prompt_registry
+
+PROMPT_FILES = ("system.txt", "data_analysis.json")
+
+_report_cache = None
+
+
+def get_report_cache() -> DiskCache:
+    """
+    Return the persistent report cache (`REPORT_CACHE_PATH`, defaults to `data/cache/reports.sqlite`),
+    keeping at most `REPORT_CACHE_MAX_ENTRIES` reports.
+    """
+    global _report_cache
+    if _report_cache is None:
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'reports.sqlite')
+        _report_cache = DiskCache(
+            os.getenv('REPORT_CACHE_PATH', default_path),
+            max_entries=int(os.getenv('REPORT_CACHE_MAX_ENTRIES', '1000')),
+        )
+    return _report_cache
+
+
+def prompt_versions(lang: str = "zh") -> dict:
+    """SHA-256 of each prompt template file the report depends on."""
+    registry = get_prompt_registry()
+    return {filename: registry.version(filename, lang) for filename in PROMPT_FILES}
+
+
+def report_cache_key(chat_history: List, model: str, lang: str = "zh", **llm_options) -> str:
+    """
+    Content address of a report: a SHA-256 over the chat history sent to the LLM (which
+    carries the enriched data), the prompt template versions, the model name and any
+    sampling options that change the output.
+
+    Args:
+        chat_history (list): `ChatMessage`s, or `{"role": ..., "content": ...}` dicts
+        model (str): LLM model name
+        lang (str): Language of the prompt templates
+    """
+    messages = []
+    for message in chat_history:
+        if isinstance(message, dict):
+            role, content = message["role"], message["content"]
+        else:
+            role, content = getattr(message.role, "value", message.role), message.content
+        messages.append([str(role), content])
+    payload = {
+        "messages": messages,
+        "prompts": prompt_versions(lang),
+        "model": model,
+        "options": llm_options,
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def cached_report(key: str) -> Optional[str]:
+    if os.getenv("REPORT_CACHE", "1") == "0":
+        return None
+    return get_report_cache().get(key)
+
+
+def store_report(key: str, report: str):
+    if os.getenv("REPORT_CACHE", "1") == "0" or not report:
+        return
+    get_report_cache().put(key, report)
+
+
+def replay_chunks(report: str, chunk_size: int = 64) -> Iterator[str]:
+    """Split a cached report into stream-sized chunks, so consumers see the same events as for a fresh completion."""
+    for i in range(0, len(report), chunk_size):
+        yield report[i:i + chunk_size]
+
+
+def report_cache_stats() -> dict:
+    """Hit/miss counters and size of the report cache."""
+    return get_report_cache().stats()
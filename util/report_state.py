@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+_report_state_store = None
+
+
+class StaleReportState(RuntimeError):
+    """The stored state of a vehicle moved on while a report was being enriched."""
+
+
+class ReportStateStore:
+    """
+    Per-vehicle state of incremental reports, in SQLite: the watermark (time of the last
+    enriched event and how many events share that time), the running aggregates of
+    `update_aggregates`, and the enriched event rows, so a report only fetches and enriches
+    the events added since the previous one. Rows whose location or weather could not be
+    resolved keep their event, so later reports can enrich them again.
+
+    Args:
+        path (str): Database file, created if missing
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vehicles (vehicle_id TEXT PRIMARY KEY, last_time TEXT, at_last_time INTEGER NOT NULL,"
+            " events INTEGER NOT NULL, aggregates TEXT NOT NULL, unresolved TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enriched_events (vehicle_id TEXT NOT NULL, seq INTEGER NOT NULL, row TEXT NOT NULL,"
+            " pending TEXT, PRIMARY KEY (vehicle_id, seq)) WITHOUT ROWID"
+        )
+
+    def load(self, vehicle_id: str) -> Optional[dict]:
+        """The watermark, event count, running aggregates and unresolved counts of a vehicle, None if it has no state yet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_time, at_last_time, events, aggregates, unresolved FROM vehicles WHERE vehicle_id = ?", (vehicle_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"last_time": row[0], "at_last_time": row[1], "events": row[2], "aggregates": json.loads(row[3]), "unresolved": json.loads(row[4])}
+
+    def rows(self, vehicle_id: str) -> List[list]:
+        """The enriched event rows of a vehicle, in time order."""
+        with self._lock:
+            return [json.loads(row) for (row,) in self._conn.execute(
+                "SELECT row FROM enriched_events WHERE vehicle_id = ? ORDER BY seq", (vehicle_id,)
+            )]
+
+    def pending(self, vehicle_id: str) -> List[Tuple[int, dict]]:
+        """`(seq, pending)` of the rows of a vehicle still to be enriched again, see `save`."""
+        with self._lock:
+            return [(seq, json.loads(pending)) for seq, pending in self._conn.execute(
+                "SELECT seq, pending FROM enriched_events WHERE vehicle_id = ? AND pending IS NOT NULL ORDER BY seq", (vehicle_id,)
+            )]
+
+    def save(
+        self,
+        vehicle_id: str,
+        state: dict,
+        new_rows: List[list],
+        replace: bool = False,
+        expected: Optional[dict] = None,
+        pending: Optional[List[Optional[dict]]] = None,
+        retried: Optional[dict] = None,
+    ) -> List[list]:
+        """
+        Append newly enriched rows and move the watermark, atomically, unless another report
+        saved the vehicle since `expected` was loaded.
+
+        Args:
+            vehicle_id (str): The vehicle
+            state (dict): `last_time`, `at_last_time`, `events`, `aggregates` and `unresolved`
+            new_rows (list): Rows enriched since the previous state
+            replace (bool): Drop the stored rows first, after the history was rebuilt
+            expected (dict, optional): The state the new one was computed from, None if there was none
+            pending (list, optional): For each new row, `{"event": ..., "unresolved": [...]}` to
+                enrich it again on the next run, or None once it is resolved
+            retried (dict, optional): seq -> `(row, pending)` of stored pending rows enriched again
+
+        Returns:
+            list: All enriched event rows of the vehicle, in time order
+
+        Raises:
+            StaleReportState: If the stored watermark is no longer the one of `expected`
+        """
+        pending = pending or [None] * len(new_rows)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._conn.execute("SELECT last_time, events FROM vehicles WHERE vehicle_id = ?", (vehicle_id,)).fetchone()
+                if current != (None if expected is None else (expected["last_time"], expected["events"])):
+                    raise StaleReportState(f"Report state of vehicle {vehicle_id} changed while enriching it")
+                if replace:
+                    self._conn.execute("DELETE FROM enriched_events WHERE vehicle_id = ?", (vehicle_id,))
+                    first = 0
+                else:
+                    first = self._conn.execute(
+                        "SELECT COALESCE(MAX(seq) + 1, 0) FROM enriched_events WHERE vehicle_id = ?", (vehicle_id,)
+                    ).fetchone()[0]
+                    self._conn.executemany(
+                        "UPDATE enriched_events SET row = ?, pending = ? WHERE vehicle_id = ? AND seq = ?",
+                        ((_dumps(row), _dumps(retry), vehicle_id, seq) for seq, (row, retry) in (retried or {}).items()),
+                    )
+                self._conn.executemany(
+                    "INSERT INTO enriched_events (vehicle_id, seq, row, pending) VALUES (?, ?, ?, ?)",
+                    ((vehicle_id, first + i, _dumps(row), _dumps(retry)) for i, (row, retry) in enumerate(zip(new_rows, pending))),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO vehicles (vehicle_id, last_time, at_last_time, events, aggregates, unresolved, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (vehicle_id, state["last_time"], state["at_last_time"], state["events"],
+                     _dumps(state["aggregates"]), _dumps(state["unresolved"]), time.time()),
+                )
+                rows = [json.loads(row) for (row,) in self._conn.execute(
+                    "SELECT row FROM enriched_events WHERE vehicle_id = ? ORDER BY seq", (vehicle_id,)
+                )]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def reset(self, vehicle_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM enriched_events WHERE vehicle_id = ?", (vehicle_id,))
+            self._conn.execute("DELETE FROM vehicles WHERE vehicle_id = ?", (vehicle_id,))
+
+
+def _dumps(value) -> Optional[str]:
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def get_report_state_store() -> Optional[ReportStateStore]:
+    """
+    Return the incremental report state (`REPORT_STATE_PATH`, defaults to
+    `data/cache/report_state.sqlite`), or None when disabled with `INCREMENTAL_REPORTS=0`.
+    """
+    global _report_state_store
+    if os.getenv("INCREMENTAL_REPORTS", "1") == "0":
+        return None
+    if _report_state_store is None:
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'report_state.sqlite')
+        _report_state_store = ReportStateStore(os.getenv('REPORT_STATE_PATH', default_path))
+    return _report_state_store
@@ -0,0 +1,157 @@
+"""
+Hash partitioning of vehicles over replicas of the vehicle MCP server.
+
+A replica started with `VEHICLE_SHARD_INDEX=i` and `VEHICLE_SHARD_COUNT=n` serves the
+vehicles with `crc32(vehicle_id) % n == i` and registers as
+`sdv/devices/vehicle/shard/<i>-of-<n>`. Clients merge the replicas' tools into one router
+tool per name that forwards each call to the replica owning its `vehicle_id`.
+"""
+import os
+import re
+import json
+import zlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import anyio
+
+from .enrichment import tool_output_text
+
+logger = logging.getLogger(__name__)
+
+SHARD_NAME = re.compile(r"/shard/(\d+)-of-(\d+)$")
+
+
+def shard_of(vehicle_id: str, shard_count: int) -> int:
+    """The shard owning `vehicle_id`, stable across processes and hosts."""
+    return zlib.crc32(str(vehicle_id).encode("utf-8")) % shard_count
+
+
+def vehicle_shard() -> Tuple[int, int]:
+    """
+    `(index, count)` of this replica, from `VEHICLE_SHARD_INDEX` and `VEHICLE_SHARD_COUNT`
+    (defaults to the single shard `(0, 1)`).
+
+    Raises:
+        ValueError: If the index is not within [0, count)
+    """
+    index = int(os.getenv("VEHICLE_SHARD_INDEX", "0"))
+    count = int(os.getenv("VEHICLE_SHARD_COUNT", "1"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid vehicle shard {index} of {count}")
+    return index, count
+
+
+def shard_server_name(base: str, index: int, count: int) -> str:
+    """MCP server name of a shard, `base` itself when there is a single shard."""
+    return base if count == 1 else f"{base}/shard/{index}-of-{count}"
+
+
+def parse_shard(server_name: Optional[str]) -> Optional[Tuple[int, int]]:
+    """`(index, count)` of a shard server name, None for an unsharded server."""
+    match = SHARD_NAME.search(server_name or "")
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def check_vehicle_shard(vehicle_id: str, shard: Tuple[int, int]):
+    """
+    Raises:
+        ValueError: If `vehicle_id` belongs to another shard than `shard`
+    """
+    index, count = shard
+    owner = shard_of(vehicle_id, count)
+    if owner != index:
+        raise ValueError(f"Vehicle '{vehicle_id}' belongs to shard {owner}-of-{count}, this server is shard {index}-of-{count}")
+
+
+def _has_vehicle_id(tool) -> bool:
+    schema = tool.metadata.fn_schema
+    return schema is not None and "vehicle_id" in getattr(schema, "model_fields", {})
+
+
+def route_sharded_tools(server_tools: List[Tuple[Optional[str], object]]) -> list:
+    """
+    Merge the tools of sharded servers into one tool per name.
+
+    Tools taking a `vehicle_id` are routed to the replica owning the vehicle; other tools
+    (e.g. ingest stats) are called on every replica and return `{"shards": {"<i>-of-<n>": ...}}`.
+    Tools of unsharded servers are passed through, the last one listed for a name that more
+    than one server offers. If replicas advertise different shard counts (while resharding),
+    the most complete set of shards is used, and a complete set of shards takes over a name
+    from an unsharded server.
+
+    Args:
+        server_tools (list): `(server_name, tool)` pairs, server_name None for non-MQTT servers
+
+    Returns:
+        list: The tools, with one router per sharded tool name
+    """
+    unsharded, sharded = {}, {}
+    for server_name, tool in server_tools:
+        shard = parse_shard(server_name)
+        if shard is None:
+            name = tool.metadata.name
+            if name in unsharded:
+                logger.warning(f"Tool {name} is served by more than one MCP server, using the one of {server_name}")
+            unsharded[name] = tool
+        else:
+            index, count = shard
+            sharded.setdefault(tool.metadata.name, {}).setdefault(count, {})[index] = tool
+    routers = []
+    for name, by_count in sharded.items():
+        count = max(by_count, key=lambda n: (len(by_count[n]) / n, n))
+        if len(by_count) > 1:
+            logger.warning(f"Tool {name} is served with shard counts {sorted(by_count)}, routing over {count} shards")
+        if name in unsharded:
+            # Moving between a single server and shards: use the shards once they are all up
+            if len(by_count[count]) < count:
+                continue
+            logger.warning(f"Tool {name} is served by an unsharded server and by {count} shards, routing over the shards")
+            del unsharded[name]
+        routers.append(_router_tool(by_count[count], count))
+    return list(unsharded.values()) + routers
+
+
+def _router_tool(shards: Dict[int, object], count: int):
+    from llama_index.core.tools import FunctionTool
+
+    any_tool = next(iter(shards.values()))
+    name = any_tool.metadata.name
+
+    def owner(index: int):
+        tool = shards.get(index)
+        if tool is None:
+            raise ValueError(f"No MCP server for shard {index}-of-{count} of tool {name}, is it running?")
+        return tool
+
+    if _has_vehicle_id(any_tool):
+        async def route(**kwargs):
+            if kwargs.get("vehicle_id") is None:
+                raise ValueError(f"Missing argument 'vehicle_id' for tool {name}")
+            output = await owner(shard_of(kwargs["vehicle_id"], count)).acall(**kwargs)
+            return output.raw_output
+    else:
+        async def route(**kwargs):
+            tools = {index: owner(index) for index in range(count)}
+            results, errors = {}, {}
+
+            async def call(index: int):
+                key = f"{index}-of-{count}"
+                try:
+                    text = tool_output_text(await tools[index].acall(**kwargs))
+                except Exception as e:
+                    errors[key] = str(e)
+                    return
+                try:
+                    results[key] = json.loads(text)
+                except ValueError:
+                    results[key] = text
+
+            async with anyio.create_task_group() as tg:
+                for index in range(count):
+                    tg.start_soon(call, index)
+            if errors:
+                raise RuntimeError(f"Tool {name} failed on shards {dict(sorted(errors.items()))}")
+            return json.dumps({"shards": dict(sorted(results.items()))}, ensure_ascii=False)
+
+    return FunctionTool.from_defaults(async_fn=route, tool_metadata=any_tool.metadata)
@@ -0,0 +1,98 @@
+"""
+Coalescing of token streams into fewer, larger chunks for remote consumers.
+"""
+import time
+from typing import List, Optional
+
+import anyio
+from anyio.streams.memory import MemoryObjectSendStream
+
+
+class ChunkCoalescer:
+    """
+    Buffer text deltas and forward them to a bounded stream as joined chunks.
+
+    A chunk is sent once `min_chars` characters are buffered or `max_delay` seconds have
+    passed since the last send. Sends never block the producer: while the stream is full
+    (the consumer is slower than the LLM), deltas keep accumulating into one larger chunk,
+    so a slow client gets fewer, bigger chunks instead of stalling the report or queueing
+    one message per token. Run `flush_on_timer` in a task next to the producer so that
+    held text also goes out when no further delta arrives.
+
+    Args:
+        send_stream (MemoryObjectSendStream): Bounded stream read by the consumer
+        min_chars (int): Buffered characters that trigger a send
+        max_delay (float): Seconds after which buffered text is sent regardless of its size
+    """
+
+    def __init__(self, send_stream: MemoryObjectSendStream, min_chars: int = 256, max_delay: float = 0.05):
+        self.send_stream = send_stream
+        self.min_chars = min_chars
+        self.max_delay = max_delay
+        self._buffer: List[str] = []
+        self._size = 0
+        self._last_send = time.monotonic()
+        self._held_since = self._last_send
+        # Held by `flush` while it waits for room, so chunks keep their order
+        self._sending = anyio.Lock()
+        self._wakeup: Optional[anyio.Event] = None
+        self.chunks = 0
+        self.deltas = 0
+
+    def push(self, text: str):
+        if not text:
+            return
+        if not self._buffer:
+            self._held_since = time.monotonic()
+        self._buffer.append(text)
+        self._size += len(text)
+        self.deltas += 1
+        if self._size >= self.min_chars or time.monotonic() - self._last_send >= self.max_delay:
+            # Only join when the chunk can go out: joining a growing backlog on every delta is quadratic
+            if not self._sending.locked() and self._has_room():
+                try:
+                    self.send_stream.send_nowait("".join(self._buffer))
+                except anyio.WouldBlock:
+                    pass
+                else:
+                    self._clear()
+                    self._sent()
+                    return
+        # Held: the timer sends it once `max_delay` has passed
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _has_room(self) -> bool:
+        stats = self.send_stream.statistics()
+        return stats.current_buffer_used < stats.max_buffer_size or stats.tasks_waiting_receive > 0
+
+    async def flush(self):
+        """Send whatever is buffered, waiting for room in the stream."""
+        async with self._sending:
+            if self._buffer:
+                text = "".join(self._buffer)
+                # Deltas pushed while waiting for room belong to the next chunk
+                self._clear()
+                await self.send_stream.send(text)
+                self._sent()
+
+    async def flush_on_timer(self):
+        """Flush held text once `max_delay` has passed since it was first held, until cancelled."""
+        while True:
+            if not self._buffer:
+                self._wakeup = anyio.Event()
+                await self._wakeup.wait()
+                continue
+            delay = self._held_since + self.max_delay - time.monotonic()
+            if delay > 0:
+                await anyio.sleep(delay)
+                continue
+            await self.flush()
+
+    def _clear(self):
+        self._buffer = []
+        self._size = 0
+
+    def _sent(self):
+        self._last_send = time.monotonic()
+        self.chunks += 1
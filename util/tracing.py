@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import random
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+# Latency buckets, in seconds, from a cache hit to a full report
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        # name -> labels -> [count per bucket..., sum, count]; values above the last bucket are only in count
+        self._histograms: Dict[str, Dict[Tuple, list]] = {}
+        self._buckets: Dict[str, tuple] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1, labels: Optional[dict] = None, help: str = ""):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None, buckets: tuple = DURATION_BUCKETS, help: str = ""):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            buckets = self._buckets.setdefault(name, buckets)
+            series = self._histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(buckets) + 2)
+            i = bisect.bisect_left(buckets, value)
+            if i < len(buckets):
+                state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(key)} {value:g}" for key, value in series.items()]
+            for name, series in sorted(self._histograms.items()):
+                buckets = self._buckets[name]
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} histogram"]
+                for key, state in series.items():
+                    cumulative = 0
+                    for bound, count in zip(buckets, state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key, le=f'{bound:g}')} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key, le='+Inf')} {state[-1]}")
+                    lines.append(f"{name}_sum{_labels(key)} {state[-2]:.6f}")
+                    lines.append(f"{name}_count{_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: Tuple, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Span:
+    """
+    A timed operation. `labels` are low-cardinality attributes that also label its
+    duration metric; `attributes` are exported with the span only.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], labels: dict, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.labels = labels
+        self.attributes = dict(labels, **attributes)
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.start_ns + int(self.duration * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items() if v is not None],
+            "status": {"code": 1} if self.status == "ok" else {"code": 2, "message": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    Minimal tracer: spans nest through a context variable, so they follow asyncio tasks,
+    and each finished span is
+
+    - observed in `sdv_span_duration_seconds{span=<name>, <labels>}`, and
+    - appended to `trace_file` as one OTLP/JSON `ExportTraceServiceRequest` per line, the
+      format of the OpenTelemetry collector file exporter, if a file is configured.
+
+    Args:
+        metrics (MetricsRegistry): Where span durations are recorded
+        trace_file (str, optional): OTLP/JSON lines file; spans are not exported if empty
+        service_name (str): `service.name` resource attribute
+    """
+
+    def __init__(self, metrics: MetricsRegistry, trace_file: Optional[str] = None, service_name: str = "sdv-mcp-demo"):
+        self.metrics = metrics
+        self.trace_file = trace_file
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._file = None
+        if trace_file:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+            self._file = open(trace_file, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name: str, labels: Optional[dict] = None, parent: Optional[Span] = None, **attributes) -> Iterator[Span]:
+        """
+        Time the enclosed block as a span, child of `parent` or of the current span.
+        An exception marks the span as failed and is re-raised.
+        """
+        parent = parent or _current_span.get()
+        span = Span(
+            name,
+            trace_id=parent.trace_id if parent else "%032x" % random.getrandbits(128),
+            parent_id=parent.span_id if parent else None,
+            labels=labels or {},
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span.started
+            self._end(span)
+
+    def _end(self, span: Span):
+        self.metrics.observe(
+            "sdv_span_duration_seconds", span.duration, dict(span.labels, span=span.name, status="ok" if span.status == "ok" else "error"),
+            help="Duration of traced operations",
+        )
+        if self._file is None:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "sdv"}, "spans": [span.to_otlp()]}],
+        }]}
+        line = json.dumps(request, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+
+def record_llm_call(span: Span, ttft: Optional[float], prompt_tokens: Optional[int], completion_tokens: int, model: str):
+    """
+    Attach LLM stream latency and token counts to `span` and to the LLM metrics.
+    `prompt_tokens` may be None when the prompt is built elsewhere, e.g. inside the agent.
+    """
+    elapsed = time.perf_counter() - span.started
+    generation = elapsed - (ttft or 0)
+    tokens_per_sec = completion_tokens / generation if generation > 0 else None
+    span.set(
+        ttft_sec=round(ttft, 4) if ttft is not None else None,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        tokens_per_sec=round(tokens_per_sec, 2) if tokens_per_sec else None,
+    )
+    metrics = get_metrics()
+    labels = {"model": model}
+    if ttft is not None:
+        metrics.observe("sdv_llm_time_to_first_token_seconds", ttft, labels, help="Time from request to first streamed token")
+    if tokens_per_sec:
+        metrics.observe("sdv_llm_tokens_per_second", tokens_per_sec, labels, buckets=RATE_BUCKETS, help="Completion tokens per second after the first token")
+    if prompt_tokens is not None:
+        metrics.inc("sdv_llm_tokens_total", prompt_tokens, dict(labels, kind="prompt"), help="LLM tokens")
+    metrics.inc("sdv_llm_tokens_total", completion_tokens, dict(labels, kind="completion"), help="LLM tokens")
+
+
+def traced_tool(tool, transport: str):
+    """
+    Wrap an MCP tool so each call is a `mcp.tool_call` span with its transport, tool name
+    and request/response payload sizes. The wrapper returns the same raw `CallToolResult`.
+    """
+    from llama_index.core.tools import FunctionTool
+
+    name = tool.metadata.name
+    labels = {"tool": name, "transport": transport}
+
+    async def call(**kwargs):
+        request_bytes = len(json.dumps(kwargs, ensure_ascii=False, default=str).encode("utf-8"))
+        with get_tracer().span("mcp.tool_call", labels=labels, request_bytes=request_bytes) as span:
+            output = await tool.acall(**kwargs)
+            raw = output.raw_output
+            content = getattr(raw, "content", None)
+            if content is None:
+                response_bytes = len(str(output.content).encode("utf-8"))
+            else:
+                response_bytes = sum(len(getattr(block, "text", "").encode("utf-8")) for block in content)
+            if getattr(raw, "isError", False):
+                span.status = "tool error"
+            span.set(response_bytes=response_bytes)
+        metrics = get_metrics()
+        metrics.inc("sdv_tool_payload_bytes_total", request_bytes, dict(labels, direction="request"), help="MCP tool call payload bytes")
+        metrics.inc("sdv_tool_payload_bytes_total", response_bytes, dict(labels, direction="response"), help="MCP tool call payload bytes")
+        return raw
+
+    return FunctionTool.from_defaults(async_fn=call, tool_metadata=tool.metadata)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve the Prometheus text endpoint `/metrics` from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving Prometheus metrics at http://{host}:{port}/metrics")
+    return server
+
+
+_metrics = None
+_tracer = None
+
+
+def get_metrics() -> MetricsRegistry:
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
+
+
+def get_tracer() -> Tracer:
+    """
+    Return the process-wide tracer. Spans are exported to `TRACE_FILE` (OTLP/JSON lines)
+    when it is set, and always recorded in the metrics.
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(get_metrics(), trace_file=os.getenv("TRACE_FILE") or None, service_name=os.getenv("OTEL_SERVICE_NAME", "sdv-mcp-demo"))
+    return _tracer
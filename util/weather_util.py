@@ -1,66 +1,216 @@
-import requests
 from dotenv import load_dotenv
-from .driver_behavior import load_json_file
+from .disk_cache import DiskCache
+from .http_client import get_http_client
+from .region_index import RegionIndex
+from .tracing import get_tracer
+from datetime import date as Date
+import asyncio
+import weakref
+import anyio
+import json
+import time
 import os
 
 load_dotenv()
 
 
 apiKey = os.getenv('JUHE_API_KEY') 
+# Overridable for benchmarks against a local mock
+apiBase = os.getenv('JUHE_API_BASE', 'http://v.juhe.cn')
+
+_weather_cache = None
+_region_index = None
+# In-flight upstream requests by key, per event loop (futures cannot be awaited from another loop)
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+_weather_stats = {"upstream_calls": 0, "upstream_errors": 0, "coalesced": 0,
+                  "upstream_latency_sec_total": 0.0, "upstream_latency_sec_max": 0.0,
+                  "hit_latency_sec_total": 0.0}
+
+
+def get_weather_cache() -> DiskCache:
+    """
+    Return the persistent historical weather cache (`WEATHER_CACHE_PATH`, defaults to `data/cache/weather.sqlite`).
+    """
+    global _weather_cache
+    if _weather_cache is None:
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache', 'weather.sqlite')
+        _weather_cache = DiskCache(
+            os.getenv('WEATHER_CACHE_PATH', default_path),
+            max_entries=int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '50000')),
+        )
+    return _weather_cache
+
+def get_region_index() -> RegionIndex:
+    """
+    Return the province/city ID index, loaded once per process. City lists fetched from
+    the API are persisted under `CITY_CACHE_DIR` (defaults to `data/cache/cities/`).
+    """
+    global _region_index
+    if _region_index is None:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+        _region_index = RegionIndex(
+            province_file=os.path.join(data_dir, 'province_ids.json'),
+            city_dir=os.getenv('CITY_CACHE_DIR', os.path.join(data_dir, 'cache', 'cities')),
+            fetch_cities=_fetch_cities,
+        )
+    return _region_index
 
 def query_province_id(province: str) -> str:
-    provinces = load_json_file("province_ids.json")["provinces"]
-    for p in provinces:
-        if p["province"] == province:
-            return p["id"]
-    
-    raise ValueError(f"Province '{province}' not found")
+    return get_region_index().province_id(province)
+
+async def query_city_id(province_id: str, city_name: str) -> str:
+    return await get_region_index().city_id(province_id, city_name)
 
-def query_city_id(province_id: str, city_name: str) -> str:
+async def _fetch_cities(province_id: str) -> list:
     requestParams = {
         'key': apiKey,
         'province_id': province_id
     }
-    apiUrl = 'http://v.juhe.cn/historyWeather/citys' 
-    response = requests.get(apiUrl, params=requestParams)
+    apiUrl = f'{apiBase}/historyWeather/citys' 
+    with get_tracer().span("juhe.request", labels={"endpoint": "citys"}, province_id=province_id) as span:
+        response = await get_http_client().get(apiUrl, params=requestParams)
+        span.set(http_status=response.status_code, response_bytes=len(response.content))
     if response.status_code == 200:
         data = response.json()
         if data['error_code'] == 0 and 'result' in data:
-            for city in data['result']:
-                if city['city_name'] == city_name:
-                    return city['id']
+            return data['result']
         else:
             raise Exception(f"API Error: {data.get('reason', 'Unknown error')}")
     
-    raise ValueError(f"City '{city_name}' cannot be found in province_id: {province_id}")
+    raise Exception(f"Failed to get the cities of province_id: {province_id}")
+
 
+async def query_weather_by_city_id(city_id: str, date: str) -> dict:
+    """
+    Query the historical weather of a city on a date, served from the persistent cache when possible.
 
-def query_weather_by_city_id(city_id: str, date: str) -> str:
-    apiUrl = 'http://v.juhe.cn/historyWeather/weather' 
+    Weather of a past day never changes, so successful responses for dates before today
+    are cached. Concurrent identical requests share a single upstream call. The SQLite
+    cache is read and written in a worker thread, off the event loop.
+    """
+    cache = get_weather_cache()
+    key = f"{city_id}:{date}"
+    started = time.perf_counter()
+    cached = await anyio.to_thread.run_sync(cache.get, key)
+    if cached is not None:
+        _weather_stats["hit_latency_sec_total"] += time.perf_counter() - started
+        return json.loads(cached)
+
+    inflight = _inflight.setdefault(asyncio.get_running_loop(), {})
+    flight = inflight.get(key)
+    if flight is not None:
+        _weather_stats["coalesced"] += 1
+        return await asyncio.shield(flight)
+
+    flight = inflight[key] = asyncio.ensure_future(_fetch_weather(city_id, date))
+    try:
+        result = await asyncio.shield(flight)
+    finally:
+        inflight.pop(key, None)
+    if result.get('error_code') == 0 and date < Date.today().isoformat():
+        await anyio.to_thread.run_sync(cache.put, key, json.dumps(result, ensure_ascii=False))
+    return result
+
+
+async def _fetch_weather(city_id: str, date: str) -> dict:
+    apiUrl = f'{apiBase}/historyWeather/weather' 
     requestParams = {
         'key': apiKey,
         'city_id': city_id,
         'weather_date': date,
     }
-    response = requests.get(apiUrl, params=requestParams)
+    started = time.perf_counter()
+    _weather_stats["upstream_calls"] += 1
+    try:
+        with get_tracer().span("juhe.request", labels={"endpoint": "weather"}, city_id=city_id, date=date) as span:
+            response = await get_http_client().get(apiUrl, params=requestParams)
+            span.set(http_status=response.status_code, response_bytes=len(response.content))
+    except Exception:
+        _weather_stats["upstream_errors"] += 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _weather_stats["upstream_latency_sec_total"] += elapsed
+        _weather_stats["upstream_latency_sec_max"] = max(_weather_stats["upstream_latency_sec_max"], elapsed)
 
     if response.status_code == 200:
         return response.json()
     else:
+        _weather_stats["upstream_errors"] += 1
         raise Exception(f"Failed to get the weather info for {city_id} at {date}")
 
-def main():
+
+WEATHER_FIELDS = ("day_weather", "night_weather", "day_temp", "night_temp", "day_wind", "day_wind_comp")
+
+
+def compact_weather(payload: dict) -> dict:
+    """
+    Keep only the fields of a Juhe history weather response that the report uses.
+
+    Returns:
+        dict: `WEATHER_FIELDS` of the result, or `error` with the API reason
+    """
+    if payload.get('error_code') != 0 or not isinstance(payload.get('result'), dict):
+        return {"error": payload.get('reason', 'Unknown error')}
+    return {field: payload['result'].get(field) for field in WEATHER_FIELDS}
+
+
+async def query_weather_batch(queries: list) -> dict:
+    """
+    Query the historical weather of many (city_id, date) pairs concurrently.
+
+    Duplicate pairs are fetched once. Each pair still goes through the cache and
+    the single-flight coalescing of `query_weather_by_city_id`.
+
+    Args:
+        queries (list): `[{"city_id": ..., "date": "YYYY-MM-DD"}, ...]`
+
+    Returns:
+        dict: A table with `columns` and one row per distinct pair, in first-seen order;
+        pairs that failed are listed in `errors`.
+    """
+    pairs = list(dict.fromkeys((str(q["city_id"]), str(q["date"])) for q in queries))
+    results = await asyncio.gather(
+        *(query_weather_by_city_id(city_id, date) for city_id, date in pairs), return_exceptions=True
+    )
+    rows, errors = [], []
+    for (city_id, date), result in zip(pairs, results):
+        weather = {"error": str(result)} if isinstance(result, Exception) else compact_weather(result)
+        if "error" in weather:
+            errors.append({"city_id": city_id, "date": date, "error": weather["error"]})
+        else:
+            rows.append([city_id, date, *(weather[field] for field in WEATHER_FIELDS)])
+    return {"columns": ["city_id", "date", *WEATHER_FIELDS], "rows": rows, "errors": errors}
+
+
+def weather_cache_stats() -> dict:
+    """
+    Hit/miss counters of the weather cache, plus upstream call counts and latencies.
+    """
+    stats = get_weather_cache().stats()
+    upstream_calls = _weather_stats["upstream_calls"]
+    stats.update(
+        coalesced=_weather_stats["coalesced"],
+        upstream_calls=upstream_calls,
+        upstream_errors=_weather_stats["upstream_errors"],
+        upstream_latency_sec_avg=round(_weather_stats["upstream_latency_sec_total"] / upstream_calls, 3) if upstream_calls else None,
+        upstream_latency_sec_max=round(_weather_stats["upstream_latency_sec_max"], 3),
+        hit_latency_ms_avg=round(_weather_stats["hit_latency_sec_total"] * 1000 / stats["hits"], 3) if stats["hits"] else None,
+    )
+    return stats
+
+async def main():
     try:
         # city_id = "87"
         # date = "2023-01-12"
-        # result = query_weather_by_city_id(city_id, date)
+        # result = await query_weather_by_city_id(city_id, date)
         # print(f"Weather data for city {city_id} on {date}:")
         # print(result)
         result = query_province_id("北京")
-        # result = query_city_id("3", "延庆")
+        # result = await query_city_id("3", "延庆")
         print(result)
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,26 +1,50 @@
 from mcp.server.fastmcp import FastMCP
-from util import query_driver_behavior_data
+from util import query_driver_behavior_data, count_driver_behavior_events, cluster_vehicle_locations, EventIngestor
+from util import vehicle_shard, shard_server_name, shard_of, check_vehicle_shard
 from dotenv import load_dotenv
+from typing import List, Optional
 import os
 
 load_dotenv()
 
+# This replica serves the vehicles with crc32(vehicle_id) % VEHICLE_SHARD_COUNT == VEHICLE_SHARD_INDEX
+shard = vehicle_shard()
+shard_description = "" if shard[1] == 1 else f" Shard {shard[0]} of {shard[1]}: serves the vehicles whose crc32(vehicle_id) % {shard[1]} == {shard[0]}."
+
 mcp = FastMCP(
-    name = "sdv/devices/vehicle",
+    name = shard_server_name("sdv/devices/vehicle", *shard),
     log_level="DEBUG",
-    mqtt_server_description = "An MCP server that contains tools to query vehicle driving behavior data.",
+    mqtt_server_description = "An MCP server that contains tools to query vehicle driving behavior data." + shard_description,
     mqtt_options={
         "host": os.getenv('MQTT_BROKER', 'localhost'),
+        "port": int(os.getenv('MQTT_PORT', '1883')),
     }
 )
 
+ingestor = EventIngestor(
+    host=os.getenv('MQTT_BROKER', 'localhost'),
+    port=int(os.getenv('MQTT_PORT', '1883')),
+    topic=os.getenv('VEHICLE_EVENTS_TOPIC', 'sdv/vehicles/+/events'),
+    accept_vehicle=lambda vehicle_id: shard_of(vehicle_id, shard[1]) == shard[0],
+)
+
 @mcp.tool()
-async def query_vehicle_driving_behaviour_data(vehicle_id: str) -> str:
+async def query_vehicle_driving_behaviour_data(
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    types: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+) -> str:
     """
     Asynchronously queries and retrieves driving behavior data for a specific vehicle.
 
     Args:
         vehicle_id (str): The unique identifier of the vehicle to query.
+        start (str, optional): Only return events at or after this time, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
+        end (str, optional): Only return events at or before this time; a bare date covers the whole day.
+        types (list[str], optional): Only return events of these types (see `type` below).
+        limit (int, optional): Maximum number of events to return, oldest first.
 
     Returns:
         str: The driving behavior data for the specified vehicle. The data is similar as following.
@@ -44,10 +68,112 @@ async def query_vehicle_driving_behaviour_data(vehicle_id: str) -> str:
     }
 
     This function uses the query_driver_behavior_data utility to fetch
-    behavioral data associated with the given vehicle ID.
+    behavioral data associated with the given vehicle ID. Events are returned in time order.
+    """
+    check_vehicle_shard(vehicle_id, shard)
+    return query_driver_behavior_data(vehicle_id, start=start, end=end, types=types, limit=limit)
+
+@mcp.tool()
+async def query_vehicle_driving_behaviour_summary(
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> dict:
+    """
+    Get a compact statistical summary of a vehicle's driving behaviour events.
+    Prefer this tool over query_vehicle_driving_behaviour_data for counts, speeds and trends:
+    its size stays the same however many events the vehicle has.
+
+    Args:
+        vehicle_id (str): The unique identifier of the vehicle to query.
+        start (str, optional): Only summarize events at or after this time, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
+        end (str, optional): Only summarize events at or before this time; a bare date covers the whole day.
+
+    Returns:
+        dict: The summary, with the following fields.
+        - `events`: total number of events; `period`: first and last event time; `active_days`: days with events.
+        - `by_type`: number of events per type (sudden_acceleration, max_speed, sudden_deceleration).
+        - `speed_kmh`: max / mean / p90 of the `max_speed` events and a histogram of them in km/h bins.
+        - `by_hour`: 24 event counts, one per hour of day; `by_weekday`: event counts per weekday.
+        - `busiest_days`: days with the most events, with counts per type.
+        - `bursts`: runs of at least 3 events less than `gap_sec` apart, with the largest ones and their location.
+    """
+    # Loads pandas on the first summary instead of at server startup
+    from util import summarize_vehicle_events
+    check_vehicle_shard(vehicle_id, shard)
+    return summarize_vehicle_events(vehicle_id, start=start, end=end)
+
+@mcp.tool()
+async def query_vehicle_event_count(
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> dict:
+    """
+    Count the driving behaviour events of a vehicle, without returning them.
+
+    Args:
+        vehicle_id (str): The unique identifier of the vehicle to query.
+        start (str, optional): Only count events at or after this time, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
+        end (str, optional): Only count events at or before this time; a bare date covers the whole day.
+
+    Returns:
+        dict: `vehicle_id` and the number of `events`.
+    """
+    check_vehicle_shard(vehicle_id, shard)
+    return count_driver_behavior_events(vehicle_id, start=start, end=end)
+
+@mcp.tool()
+async def query_vehicle_location_clusters(
+    vehicle_id: str,
+    radius_m: float = 200,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> dict:
+    """
+    Group the event locations of a vehicle into clusters, so that nearby events share one location lookup.
+    Resolve the administrative region of each cluster `location` once, instead of once per event.
+
+    Args:
+        vehicle_id (str): The unique identifier of the vehicle to query.
+        radius_m (float, optional): Cluster radius in metres, defaults to 200.
+        start (str, optional): Only cluster events at or after this time, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
+        end (str, optional): Only cluster events at or before this time; a bare date covers the whole day.
+
+    Returns:
+        dict: `clusters`, each with `cluster_id`, `location` ("lng,lat"), number of `events`,
+        `first_time`/`last_time` and the distinct `dates` with events there;
+        `collapse_ratio` is the number of events per cluster.
+    """
+    check_vehicle_shard(vehicle_id, shard)
+    return cluster_vehicle_locations(vehicle_id, radius_m=radius_m, start=start, end=end)
+
+@mcp.tool()
+async def query_vehicle_behaviour_aggregates(vehicle_id: str) -> dict:
+    """
+    Get running aggregates of a vehicle's driving behaviour, kept up to date as events are ingested.
+
+    Args:
+        vehicle_id (str): The unique identifier of the vehicle to query.
+
+    Returns:
+        dict: `events` (total count), `by_type` (count per event type), `max_speed_kmh`,
+        `first_time` and `last_time` of the recorded events.
+    """
+    check_vehicle_shard(vehicle_id, shard)
+    return ingestor.aggregates(vehicle_id)
+
+@mcp.tool()
+async def query_vehicle_ingest_stats() -> dict:
+    """
+    Get live ingestion metrics of this server: total events, events per second over the last minute,
+    and freshness lag (seconds from an event being sent until it is queryable).
     """
-    return query_driver_behavior_data(vehicle_id)
+    return ingestor.stats()
 
 if __name__ == "__main__":
+    # Ingest live events unless disabled with an empty VEHICLE_EVENTS_TOPIC
+    if ingestor.topic:
+        ingestor.start()
     # Initialize and run the server
     mcp.run(transport='mqtt')
\ No newline at end of file
@@ -1,6 +1,7 @@
 from mcp.server.fastmcp import FastMCP
-from util import query_city_id,query_province_id,query_weather_by_city_id
+from util import query_city_id,query_province_id,query_weather_by_city_id,query_weather_batch,weather_cache_stats,get_region_index,resolve_city_ids,get_offline_geocoder,start_metrics_server
 from dotenv import load_dotenv
+from typing import Dict, List
 import os
 
 mcp = FastMCP(
@@ -9,6 +10,7 @@ mcp = FastMCP(
     mqtt_server_description = "An MCP server that contains tools to query weather data.",
     mqtt_options={
         "host": os.getenv('MQTT_BROKER', 'localhost'),
+        "port": int(os.getenv('MQTT_PORT', '1883')),
     }
 )
 
@@ -18,7 +20,7 @@ async def query_by_province_id(province: str) -> str:
     Query the province ID by province name.
 
     Args:
-        province (str): The name of the province in Chinese (e.g., '安徽', '北京')
+        province (str): The name of the province in Chinese (e.g., '安徽', '北京'); suffixes such as '省'/'市' are optional
 
     Returns:
         str: The ID of the province as a string
@@ -29,22 +31,39 @@ async def query_by_province_id(province: str) -> str:
     return query_province_id(province)
 
 @mcp.tool()
-def query_by_city_id(province_id: str, city_name: str) -> str:
+async def query_by_city_id(province_id: str, city_name: str) -> str:
     """
     Query the city ID by province ID and city name from the weather API.
 
     Args:
         province_id (str): The ID of the province (obtained from query_province_id)
-        city_name (str): The name of the city in Chinese (e.g., '海淀', '北京')
+        city_name (str): The name of the city in Chinese (e.g., '海淀', '北京'); suffixes such as '市'/'区' are optional
 
     Returns:
         str: The ID of the city as a string
 
     Raises:
-        ValueError: If the city name is not found in the specified province
+        ValueError: If the city name is not found in the specified province, with the closest city names
         Exception: If the API request fails
     """
-    return query_city_id(province_id=province_id, city_name=city_name)
+    return await query_city_id(province_id=province_id, city_name=city_name)
+
+@mcp.tool()
+async def query_city_ids_by_locations(locations: List[str], max_distance_km: float = 25) -> dict:
+    """
+    Resolve many locations to weather city IDs in one call, offline (no map service needed).
+    Prefer this tool over looking up the province and city of each location one by one.
+
+    Args:
+        locations (list[str]): Locations as "longitude,latitude" strings, e.g. ["116.456963,39.962918"]
+        max_distance_km (float, optional): Maximum distance to the nearest known city, defaults to 25
+
+    Returns:
+        dict: `cities`, one entry per location in the same order, with `location`, `province`, `city`,
+        `city_id` and `distance_km` to the city centre. Entries that cannot be resolved
+        offline carry an `error` instead; resolve those with the map service and query_by_city_id.
+    """
+    return {"cities": await resolve_city_ids(locations, max_distance_km=max_distance_km)}
 
 @mcp.tool()
 async def query_history_weather_by_city_id_and_date(city_id:str, date_to_query:str) -> str:
@@ -61,8 +80,39 @@ async def query_history_weather_by_city_id_and_date(city_id:str, date_to_query:s
     Raises:
         Exception: If the API request fails or returns an error status code
     """
-    return query_weather_by_city_id(city_id=city_id, date=date_to_query)
+    return await query_weather_by_city_id(city_id=city_id, date=date_to_query)
+
+@mcp.tool()
+async def query_history_weather_batch(queries: List[Dict[str, str]]) -> dict:
+    """
+    Query historical weather for many cities and dates in one call.
+    Prefer this tool over calling query_history_weather_by_city_id_and_date once per event.
+
+    Args:
+        queries (list[dict]): Pairs to query, e.g. [{"city_id": "11", "date": "2023-01-12"}, ...];
+            duplicates are fetched only once
+
+    Returns:
+        dict: A table with `columns` (city_id, date, day_weather, night_weather, day_temp,
+        night_temp, day_wind, day_wind_comp) and one row per distinct pair; failed pairs
+        are listed in `errors` with the reason.
+    """
+    return await query_weather_batch(queries)
+
+@mcp.tool()
+async def query_weather_cache_stats() -> dict:
+    """
+    Get statistics of the historical weather cache: entries, hits, misses, hit rate, evictions,
+    coalesced duplicate requests and upstream API call counts and latencies.
+    """
+    return weather_cache_stats()
 
 if __name__ == "__main__":
+    # Load the region index and offline geocoder before serving requests
+    get_region_index()
+    get_offline_geocoder()
+    # Juhe request spans and latencies of this server
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
     # Initialize and run the server
     mcp.run(transport='mqtt')
\ No newline at end of file